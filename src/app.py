@@ -6,19 +6,54 @@ Author: Gabriel Demetrios Lafis
 """
 
 import os
+import json
 import uuid
+import hmac
+import base64
+import hashlib
+import mmap
+import tempfile
 import logging
-from datetime import datetime
-from typing import Optional, Dict, List, Any
-from dataclasses import dataclass
+import heapq
+import itertools
+import functools
+import threading
+import mimetypes
+import multiprocessing
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, List, Any, Callable, Iterator, Mapping, Tuple, Union, TYPE_CHECKING
+from dataclasses import dataclass, replace
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlsplit, unquote
 
 import pyodbc
-from azure.storage.blob import BlobServiceClient, BlobClient
+from azure.storage.blob import BlobServiceClient, BlobClient, BlobSasPermissions, ContentSettings, generate_blob_sas
 from azure.identity import DefaultAzureCredential
+from azure.keyvault.secrets import SecretClient
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceNotModifiedError
 
 from dotenv import load_dotenv
 
+from secret_provider import SecretProvider, env_source
+from image_cache import ImageCache
+from image_variants import (VARIANTS, ORIGINAL_STEM, IMMUTABLE_CACHE_CONTROL, variants_available, is_image,
+                            render_variants, variant_folder, variant_urls)
+from sql_statements import (Statement, MSSQL_STATEMENTS, GET_MANY_BATCH_SIZES, FIELD_COLUMNS, PROJECTIONS,
+                            render_statements, requested_columns, projection_for)
+from shard_map import ShardMap, ShardConfig, ShardMapWatcher
+from catalog_stats import CatalogStats
+from bulkhead import Bulkhead, GuardedBackend
+from shared_cache import SharedCache, default_cache_path
+from connection_pool import ConnectionPool, PooledConnection
+from query_tracer import QueryTracer
+
+if TYPE_CHECKING:
+    from catalog_import import ImportReport
+
 # Load environment variables
 load_dotenv(dotenv_path=Path(__file__).resolve().parent / ".env")
 
@@ -36,14 +71,210 @@ class Product:
     image_url: str = ""
     created_at: Optional[datetime] = None
 
+    @property
+    def image_variants(self) -> Dict[str, str]:
+        """Resized copies of the image by variant name (e.g. thumb, medium_webp); empty if none were made"""
+        return variant_urls(self.image_url)
+
+# Inverse of FIELD_COLUMNS: Product attribute for each column
+_COLUMN_FIELDS = {column: name for name, column in FIELD_COLUMNS.items()}
+
+class _LazyField:
+    """Product field that a projection left out; fetched from the database on first access"""
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        if self.name not in obj.__dict__:
+            obj._load_missing_fields()
+        return obj.__dict__[self.name]
+
+    def __set__(self, obj, value):
+        obj.__dict__[self.name] = value
+
+class LazyProduct(Product):
+    """Product read with a projection (e.g. the summary listing).
+
+    Fields that were not selected load together, with one get_product call, the
+    first time any of them is read. Callers that need them for every row should
+    request them up front instead; every lazy load is logged and counted in
+    ``lazy_loads()`` so such N+1 callers show up.
+    """
+
+    _loads = 0
+    _loads_lock = threading.Lock()
+
+    name = _LazyField()
+    description = _LazyField()
+    price = _LazyField()
+    image_url = _LazyField()
+    created_at = _LazyField()
+
+    @classmethod
+    def partial(cls, loader: Callable[[int], Optional[Product]], **loaded: Any) -> "LazyProduct":
+        product = cls.__new__(cls)
+        product.__dict__.update(loaded)
+        product._loader = loader
+        return product
+
+    @classmethod
+    def lazy_loads(cls) -> int:
+        """Number of lazy loads since the process started"""
+        return LazyProduct._loads
+
+    def bind(self, loader: Callable[[int], Optional[Product]]):
+        """Load the missing fields through ``loader`` instead"""
+        self._loader = loader
+
+    def _load_missing_fields(self):
+        with LazyProduct._loads_lock:
+            LazyProduct._loads += 1
+        missing = [name for name in FIELD_COLUMNS if name not in self.__dict__]
+        logger.debug(f"Lazy load of {', '.join(missing)} for product {self.__dict__['product_id']}")
+        full = self._loader(self.__dict__["product_id"])
+        if full is None:
+            # Deleted since it was listed; fall back to the defaults rather than failing the page
+            logger.warning(f"Product {self.__dict__['product_id']} disappeared before its fields were loaded")
+            full = Product(product_id=self.__dict__["product_id"])
+        for name in FIELD_COLUMNS:
+            self.__dict__.setdefault(name, getattr(full, name))
+
+    def __repr__(self) -> str:
+        loaded = ", ".join(f"{name}={self.__dict__[name]!r}" for name in FIELD_COLUMNS if name in self.__dict__)
+        return f"LazyProduct({loaded})"
+
+@dataclass
+class UploadSlot:
+    """A pending direct-to-blob upload authorized by a write-only SAS URL.
+
+    ``token`` is a signed copy of the slot that the client hands back to
+    finalize_upload, so any worker can verify the upload without shared state.
+    """
+    product_id: int
+    blob_name: str
+    upload_url: str
+    content_type: str
+    max_bytes: int
+    expires_at: datetime
+    token: str = ""
+
+class AzureKeyVaultManager:
+    """Retrieves secrets from Azure Key Vault"""
+
+    def __init__(self, vault_url: str):
+        self.vault_url = vault_url
+        self.credential = DefaultAzureCredential()
+        self.client = SecretClient(vault_url=vault_url, credential=self.credential)
+
+    def get_secret(self, secret_name: str) -> str:
+        """Retrieve a secret value by name"""
+        try:
+            secret = self.client.get_secret(secret_name)
+            return secret.value
+        except Exception as e:
+            logger.error(f"Error retrieving secret {secret_name}: {str(e)}")
+            raise
+
+    def secret_source(self, name: str) -> Optional[str]:
+        """Resolve an environment-style name (SQL_CONNECTION_STRING) to its Key Vault secret (sql-connection-string)"""
+        return self.get_secret(name.lower().replace("_", "-"))
+
 class DatabaseManager:
     """Manages Azure SQL Database operations"""
+
+    # Statement registry; subclasses targeting another SQL dialect override it
+    statements: Dict[str, Statement] = MSSQL_STATEMENTS
     
-    def __init__(self, connection_string: str, mock_mode: bool = False):
+    def __init__(self, connection_string: str, mock_mode: bool = False, pool_size: int = 10,
+                 tracer: Optional[QueryTracer] = None, identity_seed: int = 1, identity_increment: int = 1):
         self.connection_string = connection_string
         self.mock_mode = mock_mode
+        # New ProductIds are identity_seed + k * identity_increment (shards use this to encode their slot)
+        self._statements = render_statements(self.statements, identity_seed, identity_increment)
+        self.tracer = tracer or QueryTracer(
+            slow_threshold_ms=float(os.getenv("SLOW_QUERY_MS", "500")),
+            plan_sample_rate=float(os.getenv("QUERY_PLAN_SAMPLE_RATE", "0"))
+        )
+        self.pool = ConnectionPool(self._connect, max_size=pool_size,
+                                   tracer=self.tracer, plan_capturer=self._capture_plan)
         if not self.mock_mode:
             self.init_database()
+
+    def _connect(self):
+        """Open a new raw connection for the pool"""
+        return pyodbc.connect(self.connection_string)
+
+    def _execute(self, conn: PooledConnection, statement_id: str, *params: Any):
+        """Execute a registered statement on a pooled connection"""
+        return conn.execute(self._statements[statement_id], params)
+
+    def rotate_connection_string(self, connection_string: str):
+        """Switch to a new connection string and retire pooled connections opened with the old one"""
+        self.connection_string = connection_string
+        self.pool.reset()
+        logger.info("Database connection string rotated")
+
+    def statement_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-statement prepare (first execution on a connection) and execute timings"""
+        return self.pool.stats.snapshot()
+
+    def slow_queries(self) -> List[Dict[str, Any]]:
+        """Recent statements that exceeded the slow-query threshold"""
+        return self.tracer.recent_slow()
+
+    def _capture_plan(self, statement: Statement, params) -> Optional[str]:
+        """Re-run a read-only statement with STATISTICS XML to capture its actual execution plan.
+
+        Called from the tracer's background thread, on a connection outside the pool
+        so capturing never holds a request's connection or pool slot.
+        """
+        if not statement.sql.lstrip().upper().startswith("SELECT"):
+            return None
+        raw_conn = self._connect()
+        cursor = raw_conn.cursor()
+        try:
+            cursor.execute("SET STATISTICS XML ON")
+            if params:
+                cursor.execute(statement.sql, tuple(params))
+            else:
+                cursor.execute(statement.sql)
+            cursor.fetchall()
+            plan = None
+            # The plan is returned as an extra single-column result set after the query rows
+            if cursor.nextset():
+                row = cursor.fetchone()
+                plan = row[0] if row else None
+            return plan
+        finally:
+            cursor.close()
+            raw_conn.close()
+
+    @staticmethod
+    def _row_to_product(row) -> Product:
+        return Product(
+            product_id=row[0],
+            name=row[1],
+            description=row[2],
+            price=float(row[3]),
+            image_url=row[4],
+            created_at=row[5]
+        )
+
+    def _row_to_projection(self, row, projection: str) -> Product:
+        """Product from a row of a projection; columns it left out load lazily"""
+        if projection == "full":
+            return self._row_to_product(row)
+        loaded = {_COLUMN_FIELDS[column]: value for column, value in zip(PROJECTIONS[projection], row)}
+        if "price" in loaded:
+            loaded["price"] = float(loaded["price"])
+        return LazyProduct.partial(self.get_product, **loaded)
+
+    @staticmethod
+    def _statement_for(base: str, projection: str) -> str:
+        return base if projection == "full" else f"{base}_{projection}"
     
     def init_database(self):
         """Initialize database schema"""
@@ -51,33 +282,11 @@ class DatabaseManager:
             logger.info("Database initialization skipped in mock mode.")
             return
         try:
-            with pyodbc.connect(self.connection_string) as conn:
-                cursor = conn.cursor()
-                
-                # Create Products table if it doesn't exist
-                create_table_sql = """
-                IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='Products' AND xtype='U')
-                CREATE TABLE Products (
-                    ProductId INT PRIMARY KEY IDENTITY(1,1),
-                    Name NVARCHAR(100) NOT NULL,
-                    Description NVARCHAR(MAX),
-                    Price DECIMAL(18,2) NOT NULL,
-                    ImageUrl NVARCHAR(255),
-                    CreatedAt DATETIME DEFAULT GETDATE()
-                );
-                """
-                cursor.execute(create_table_sql)
-
-                
-                # Create indexes for better performance
-                index_sql = """
-                IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_Products_Name')
-                CREATE INDEX IX_Products_Name ON Products(Name);
-                
-                IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_Products_Price')
-                CREATE INDEX IX_Products_Price ON Products(Price);
-                """
-                cursor.execute(index_sql)
+            with self.pool.connection() as conn:
+                # Create the Products table and its indexes if they don't exist
+                for statement_id in self._statements:
+                    if statement_id.startswith("schema."):
+                        self._execute(conn, statement_id)
                 
                 conn.commit()
                 logger.info("Database schema initialized successfully")
@@ -92,17 +301,9 @@ class DatabaseManager:
             logger.info(f"Adding product {product.name} in mock mode.")
             return 1 # Simulate a product ID
         try:
-            with pyodbc.connect(self.connection_string) as conn:
-                cursor = conn.cursor()
-                
-                insert_sql = """
-                INSERT INTO Products (Name, Description, Price, ImageUrl)
-                OUTPUT INSERTED.ProductId
-                VALUES (?, ?, ?, ?)
-                """
-                
-                cursor.execute(insert_sql, product.name, product.description, 
-                             product.price, product.image_url)
+            with self.pool.connection() as conn:
+                cursor = self._execute(conn, "products.insert", product.name, product.description,
+                                       product.price, product.image_url)
                 
                 product_id = cursor.fetchone()[0]
                 conn.commit()
@@ -113,7 +314,44 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"Error adding product: {str(e)}")
             raise
-    
+
+    def import_products(self, products: List[Product], import_keys: List[str]) -> List[Tuple[int, bool]]:
+        """Add products that no earlier transaction imported under the same key, all in one transaction.
+
+        Returns (ProductId, inserted) per product in order; rows whose key is already
+        recorded return the existing ProductId with inserted=False.
+        """
+        if len(products) != len(import_keys):
+            raise ValueError("Every imported product needs exactly one import key")
+        if self.mock_mode:
+            logger.info(f"Importing {len(products)} products in mock mode.")
+            return [(product_id, True) for product_id in range(1, len(products) + 1)]
+        if not products:
+            return []
+        try:
+            with self.pool.connection() as conn:
+                results = []
+                for product, import_key in zip(products, import_keys):
+                    row = self._execute(conn, "imports.find", import_key).fetchone()
+                    if row:
+                        results.append((row[0], False))
+                        continue
+                    cursor = self._execute(conn, "products.insert", product.name, product.description,
+                                           product.price, product.image_url)
+                    product_id = cursor.fetchone()[0]
+                    # Same transaction as the insert: the key exists exactly when the product does
+                    self._execute(conn, "imports.record", import_key, product_id)
+                    results.append((product_id, True))
+                conn.commit()
+
+                inserted = sum(1 for _, new in results if new)
+                logger.info(f"{inserted} of {len(products)} imported products added in one batch")
+                return results
+
+        except Exception as e:
+            logger.error(f"Error importing {len(products)} products: {str(e)}")
+            raise
+
     def get_product(self, product_id: int) -> Optional[Product]:
         """Retrieve a product by ID"""
         if self.mock_mode:
@@ -122,27 +360,12 @@ class DatabaseManager:
                 return Product(product_id=1, name="Sample Laptop (Mock)", description="A high-performance laptop for professionals (Mock)", price=1299.99, image_url="http://mockimage.com/mock.jpg", created_at=datetime.now())
             return None
         try:
-            with pyodbc.connect(self.connection_string) as conn:
-                cursor = conn.cursor()
-                
-                select_sql = """
-                SELECT ProductId, Name, Description, Price, ImageUrl, CreatedAt
-                FROM Products
-                WHERE ProductId = ?
-                """
-                
-                cursor.execute(select_sql, product_id)
+            with self.pool.connection() as conn:
+                cursor = self._execute(conn, "products.get", product_id)
                 row = cursor.fetchone()
                 
                 if row:
-                    return Product(
-                        product_id=row[0],
-                        name=row[1],
-                        description=row[2],
-                        price=float(row[3]),
-                        image_url=row[4],
-                        created_at=row[5]
-                    )
+                    return self._row_to_product(row)
                 
                 return None
                 
@@ -150,61 +373,88 @@ class DatabaseManager:
             logger.error(f"Error retrieving product {product_id}: {str(e)}")
             raise
     
-    def list_products(self, limit: int = 50) -> List[Product]:
-        """List all products with optional limit"""
+    def get_products(self, product_ids: List[int], fields: Union[str, List[str], None] = None) -> List[Product]:
+        """Retrieve several products by ID, in the order requested; missing IDs are skipped.
+
+        ``fields`` is a projection name ("summary") or a list of field names;
+        only the smallest projection containing them is fetched.
+        """
+        if self.mock_mode:
+            logger.info(f"Retrieving {len(product_ids)} products in mock mode.")
+            return [p for p in (self.get_product(product_id) for product_id in product_ids) if p]
+        wanted = list(dict.fromkeys(product_ids))
+        if not wanted:
+            return []
+        projection = projection_for(fields)
+        found: Dict[int, Product] = {}
+        try:
+            with self.pool.connection() as conn:
+                largest = GET_MANY_BATCH_SIZES[-1]
+                for start in range(0, len(wanted), largest):
+                    batch = wanted[start:start + largest]
+                    # Pad to a fixed IN-list size so all multi-gets share a handful of plans
+                    size = next(n for n in GET_MANY_BATCH_SIZES if n >= len(batch))
+                    params = batch + [batch[-1]] * (size - len(batch))
+                    statement_id = f"{self._statement_for('products.get_many', projection)}.{size}"
+                    cursor = self._execute(conn, statement_id, *params)
+                    for row in cursor.fetchall():
+                        product = self._row_to_projection(row, projection)
+                        found[product.product_id] = product
+                return [found[product_id] for product_id in product_ids if product_id in found]
+                
+        except Exception as e:
+            logger.error(f"Error retrieving products {product_ids}: {str(e)}")
+            raise
+    
+    def list_products(self, limit: int = 50, fields: Union[str, List[str], None] = None) -> List[Product]:
+        """List all products with optional limit; ``fields`` selects a projection as in get_products"""
         if self.mock_mode:
             logger.info("Listing products in mock mode.")
             return [
                 Product(product_id=1, name="Sample Laptop (Mock)", description="A high-performance laptop for professionals (Mock)", price=1299.99, image_url="http://mockimage.com/mock.jpg", created_at=datetime.now()),
                 Product(product_id=2, name="Sample Smartphone (Mock)", description="A powerful smartphone with great camera (Mock)", price=799.99, image_url="http://mockimage.com/mock_phone.jpg", created_at=datetime.now())
             ]
+        projection = projection_for(fields)
         try:
-            with pyodbc.connect(self.connection_string) as conn:
-                cursor = conn.cursor()
-                
-                select_sql = f"""
-                SELECT TOP {limit} ProductId, Name, Description, Price, ImageUrl, CreatedAt
-                FROM Products
-                ORDER BY CreatedAt DESC
-                """
-                
-                cursor.execute(select_sql)
+            with self.pool.connection() as conn:
+                cursor = self._execute(conn, self._statement_for("products.list", projection), int(limit))
                 rows = cursor.fetchall()
                 
-                products = []
-                for row in rows:
-                    products.append(Product(
-                        product_id=row[0],
-                        name=row[1],
-                        description=row[2],
-                        price=float(row[3]),
-                        image_url=row[4],
-                        created_at=row[5]
-                    ))
-                
-                return products
+                return [self._row_to_projection(row, projection) for row in rows]
                 
         except Exception as e:
             logger.error(f"Error listing products: {str(e)}")
             raise
     
+    def scan_prices(self, batch_size: int = 10000) -> Iterator[float]:
+        """Stream every product price, e.g. to seed catalog statistics"""
+        if self.mock_mode:
+            logger.info("Scanning prices in mock mode.")
+            yield from (p.price for p in self.list_products())
+            return
+        try:
+            with self.pool.connection() as conn:
+                cursor = self._execute(conn, "products.prices")
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield float(row[0])
+                
+        except Exception as e:
+            logger.error(f"Error scanning prices: {str(e)}")
+            raise
+    
     def update_product(self, product: Product) -> bool:
         """Update an existing product"""
         if self.mock_mode:
             logger.info(f"Updating product {product.product_id} in mock mode.")
             return True
         try:
-            with pyodbc.connect(self.connection_string) as conn:
-                cursor = conn.cursor()
-                
-                update_sql = """
-                UPDATE Products
-                SET Name = ?, Description = ?, Price = ?, ImageUrl = ?
-                WHERE ProductId = ?
-                """
-                
-                cursor.execute(update_sql, product.name, product.description,
-                             product.price, product.image_url, product.product_id)
+            with self.pool.connection() as conn:
+                cursor = self._execute(conn, "products.update", product.name, product.description,
+                                       product.price, product.image_url, product.product_id)
                 
                 rows_affected = cursor.rowcount
                 conn.commit()
@@ -226,11 +476,8 @@ class DatabaseManager:
             logger.info(f"Deleting product {product_id} in mock mode.")
             return True
         try:
-            with pyodbc.connect(self.connection_string) as conn:
-                cursor = conn.cursor()
-                
-                delete_sql = "DELETE FROM Products WHERE ProductId = ?"
-                cursor.execute(delete_sql, product_id)
+            with self.pool.connection() as conn:
+                cursor = self._execute(conn, "products.delete", product_id)
                 
                 rows_affected = cursor.rowcount
                 conn.commit()
@@ -246,16 +493,265 @@ class DatabaseManager:
             logger.error(f"Error deleting product {product_id}: {str(e)}")
             raise
 
+class ShardedDatabaseManager:
+    """Hash-sharded product storage with the same interface as DatabaseManager.
+
+    Each shard is a DatabaseManager whose IDENTITY column only allocates IDs in
+    the shard's home slot (seed = slot, increment = stride), so a ProductId
+    encodes the shard that owns it. Listings and multi-gets fan out to all
+    shards in parallel and are merged back in order.
+    """
+
+    def __init__(self, shard_map: Union[ShardMap, str],
+                 manager_factory: Optional[Callable[[ShardConfig, ShardMap], DatabaseManager]] = None,
+                 max_workers: Optional[int] = None, check_interval: float = 5.0,
+                 secrets: Optional[SecretProvider] = None):
+        # A path enables online reconfiguration: the file is re-read when it changes
+        self._watcher = ShardMapWatcher(shard_map, check_interval) if isinstance(shard_map, str) else None
+        initial_map = self._watcher.current() if self._watcher else shard_map
+        self._map: Optional[ShardMap] = None
+        self.manager_factory = manager_factory or self._default_manager
+        self._managers: Dict[str, DatabaseManager] = {}
+        self._lock = threading.Lock()
+        # Serializes reloads; routing only takes _lock, for the swap
+        self._reload_lock = threading.Lock()
+        self._attempted_map: Optional[ShardMap] = None
+        # Shard connection secrets are resolved and kept fresh by the provider, like SQL_CONNECTION_STRING
+        self.secrets = secrets
+        self._subscribed_secrets: set = set()
+        self._next_writer = itertools.count()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or 2 * len(initial_map.shards),
+                                            thread_name_prefix="shard")
+        self._sync_managers(initial_map)
+
+    @staticmethod
+    def _default_manager(shard: ShardConfig, shard_map: ShardMap) -> DatabaseManager:
+        return DatabaseManager(
+            connection_string=shard.connection_string,
+            identity_seed=shard_map.identity_seed(shard.name),
+            identity_increment=shard_map.stride
+        )
+
+    @property
+    def shard_map(self) -> ShardMap:
+        return self._routing()[0]
+
+    def _routing(self) -> Tuple[ShardMap, Dict[str, DatabaseManager]]:
+        """The shard map and the managers built for it, read together so a concurrent reload cannot split them.
+
+        A changed map file is applied in the background; requests keep routing
+        with the current map until every shard of the new one is ready.
+        """
+        current = self._watcher.current() if self._watcher else None
+        with self._lock:
+            if current is not None and current is not self._map and current is not self._attempted_map:
+                self._attempted_map = current
+                threading.Thread(target=self._reload_in_background, args=(current,),
+                                 name="shard-map-reload", daemon=True).start()
+            return self._map, self._managers
+
+    def _reload_in_background(self, shard_map: ShardMap):
+        try:
+            self._sync_managers(shard_map)
+        except Exception as e:
+            logger.error(f"Shard map not applied, routing stays on the previous map: {str(e)}")
+
+    def reload_shard_map(self, shard_map: ShardMap):
+        """Switch routing to a new shard map without restarting; raises and keeps the old map if a shard fails"""
+        self._sync_managers(shard_map)
+
+    def _resolve(self, shard: ShardConfig) -> ShardConfig:
+        """The shard with its connection string filled in from its secret"""
+        if not shard.connection_secret:
+            return shard
+        if self.secrets is None:
+            raise ValueError(f"Shard {shard.name} names secret {shard.connection_secret} but no secret provider is set")
+        connection_string = self.secrets.get(shard.connection_secret)
+        if not connection_string:
+            raise ValueError(f"Secret {shard.connection_secret} for shard {shard.name} is not set")
+        return replace(shard, connection_string=connection_string)
+
+    def _on_secret_rotated(self, secret_name: str, connection_string: str):
+        """Apply a rotated shard connection string to every shard that uses the secret"""
+        shard_map, managers = self._routing()
+        for name, shard in shard_map.shards.items():
+            if shard.connection_secret == secret_name and name in managers:
+                managers[name].rotate_connection_string(connection_string)
+
+    def _sync_managers(self, shard_map: ShardMap):
+        with self._reload_lock:
+            with self._lock:
+                if shard_map is self._map:
+                    return
+                managers = dict(self._managers)
+            # Secret lookups and new shard databases are slow; build them before routing sees the map
+            resolved = {name: self._resolve(shard) for name, shard in shard_map.shards.items()}
+            built: Dict[str, DatabaseManager] = {}
+            try:
+                for name, shard in resolved.items():
+                    if name not in managers:
+                        built[name] = self.manager_factory(shard, shard_map)
+            except Exception:
+                for manager in built.values():
+                    manager.pool.close()
+                raise
+            for name, shard in resolved.items():
+                if name in managers and managers[name].connection_string != shard.connection_string:
+                    managers[name].rotate_connection_string(shard.connection_string)
+            managers.update(built)
+            removed = [managers.pop(name) for name in set(managers) - set(shard_map.shards)]
+            # Copy on write: readers keep using the dict they took with the map it was built for
+            with self._lock:
+                self._map, self._managers = shard_map, managers
+            new_secrets = {shard.connection_secret for shard in shard_map.shards.values()
+                           if shard.connection_secret} - self._subscribed_secrets
+            self._subscribed_secrets |= new_secrets
+        for secret_name in new_secrets:
+            self.secrets.subscribe(secret_name, functools.partial(self._on_secret_rotated, secret_name))
+        for manager in removed:
+            manager.pool.close()
+        logger.info(f"Shard map applied: {len(shard_map.shards)} shards, stride {shard_map.stride}")
+
+    def manager_for_id(self, product_id: int) -> Optional[DatabaseManager]:
+        """The shard database that owns a ProductId, or None if no shard owns its slot"""
+        shard_map, managers = self._routing()
+        if shard_map.slot_for_id(product_id) not in shard_map.routes:
+            return None
+        return managers[shard_map.shard_for_id(product_id)]
+
+    def _fan_out(self, calls: Dict[str, Callable[[], Any]]) -> Dict[str, Any]:
+        """Run one call per shard in parallel and collect the results by shard name"""
+        futures = {name: self._executor.submit(call) for name, call in calls.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+    def init_database(self):
+        """Initialize the schema on every shard"""
+        self._fan_out({name: manager.init_database for name, manager in self._routing()[1].items()})
+
+    def add_product(self, product: Product) -> int:
+        """Insert on a writable shard, rotating between them"""
+        shard_map, managers = self._routing()
+        writable = shard_map.writable_shards()
+        name = writable[next(self._next_writer) % len(writable)]
+        return managers[name].add_product(product)
+
+    def import_products(self, products: List[Product], import_keys: List[str]) -> List[Tuple[int, bool]]:
+        """Import a batch on the writable shard chosen by its run, as a single transaction.
+
+        Import keys are "<run>:<row>"; every batch of a run, including a replayed
+        one, lands on the same shard while the set of writable shards is unchanged.
+        """
+        runs = {import_key.rpartition(":")[0] for import_key in import_keys}
+        if len(runs) > 1:
+            raise ValueError("A sharded import batch must come from a single import run")
+        shard_map, managers = self._routing()
+        writable = sorted(shard_map.writable_shards())
+        digest = hashlib.sha256(next(iter(runs), "").encode()).digest()
+        name = writable[int.from_bytes(digest[:8], "big") % len(writable)]
+        return managers[name].import_products(products, import_keys)
+
+    def get_product(self, product_id: int) -> Optional[Product]:
+        manager = self.manager_for_id(product_id)
+        return manager.get_product(product_id) if manager else None
+
+    def get_products(self, product_ids: List[int], fields: Union[str, List[str], None] = None) -> List[Product]:
+        """Retrieve several products across shards, in the order requested"""
+        shard_map, managers = self._routing()
+        by_shard: Dict[str, List[int]] = {}
+        for product_id in dict.fromkeys(product_ids):
+            if shard_map.slot_for_id(product_id) not in shard_map.routes:
+                continue
+            by_shard.setdefault(shard_map.shard_for_id(product_id), []).append(product_id)
+        results = self._fan_out({
+            name: (lambda manager=managers[name], ids=ids: manager.get_products(ids, fields))
+            for name, ids in by_shard.items()
+        })
+        found = {p.product_id: p for products in results.values() for p in products}
+        return [found[product_id] for product_id in product_ids if product_id in found]
+
+    def list_products(self, limit: int = 50, fields: Union[str, List[str], None] = None) -> List[Product]:
+        """Newest products across all shards, merged from per-shard sorted pages"""
+        shard_map, managers = self._routing()
+        results = self._fan_out({
+            name: (lambda manager=managers[name]: manager.list_products(limit, fields))
+            for name in shard_map.shards
+        })
+        # Each shard returns CreatedAt DESC, ProductId DESC; a k-way merge keeps that order
+        merged = heapq.merge(*results.values(), key=self._listing_key, reverse=True)
+        return list(itertools.islice(merged, limit))
+
+    def scan_prices(self) -> Iterator[float]:
+        """Stream every product price from all shards, one shard after another"""
+        shard_map, managers = self._routing()
+        for name in shard_map.shards:
+            yield from managers[name].scan_prices()
+
+    @staticmethod
+    def _listing_key(product: Product):
+        return (product.created_at or datetime.min, product.product_id)
+
+    def update_product(self, product: Product) -> bool:
+        manager = self.manager_for_id(product.product_id)
+        return manager.update_product(product) if manager else False
+
+    def delete_product(self, product_id: int) -> bool:
+        manager = self.manager_for_id(product_id)
+        return manager.delete_product(product_id) if manager else False
+
+    def statement_stats(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Statement timings per shard"""
+        return {name: manager.statement_stats() for name, manager in self._routing()[1].items()}
+
+    def slow_queries(self) -> List[Dict[str, Any]]:
+        """Recent slow statements from all shards, tagged with the shard name"""
+        return [dict(record, shard=name)
+                for name, manager in self._routing()[1].items()
+                for record in manager.slow_queries()]
+
 class BlobStorageManager:
     """Manages Azure Blob Storage operations for product images"""
+
+    ALLOWED_UPLOAD_TYPES = {"image/jpeg", "image/png", "image/webp", "image/gif"}
+    MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+    UPLOAD_SLOT_TTL = timedelta(minutes=15)
+    # Direct uploads land under this prefix so unfinalized ones can be found and swept
+    PENDING_UPLOAD_PREFIX = "uploads/"
+    FINALIZED_METADATA = {"upload_finalized": "true"}
+    # Seconds to wait for the resize workers before storing an upload original-only
+    VARIANT_TIMEOUT = 30.0
     
-    def __init__(self, connection_string: str, container_name: str = "product-images", mock_mode: bool = False):
+    def __init__(self, connection_string: str, container_name: str = "product-images", mock_mode: bool = False,
+                 image_cache_dir: Optional[str] = None, image_cache_max_bytes: int = 512 * 1024 * 1024,
+                 blob_service_client: Optional[Any] = None, generate_variants: Optional[bool] = None,
+                 variant_workers: Optional[int] = None):
         self.connection_string = connection_string
         self.container_name = container_name
         self.mock_mode = mock_mode
+        self.image_cache_dir = image_cache_dir or os.getenv(
+            "IMAGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "ecommerce-image-cache"))
+        self.image_cache_max_bytes = image_cache_max_bytes
+        self._image_cache: Optional[ImageCache] = None
+        if generate_variants is None:
+            generate_variants = os.getenv("IMAGE_VARIANTS", "1") != "0"
+        self.generate_variants = generate_variants and variants_available()
+        if generate_variants and not self.generate_variants:
+            logger.warning("Pillow is not installed; images will be stored without resized variants")
+        self.variant_workers = variant_workers or int(os.getenv("IMAGE_VARIANT_WORKERS", "0")) or os.cpu_count() or 1
+        self._variant_pool: Optional[ProcessPoolExecutor] = None
+        self._variant_pool_lock = threading.Lock()
+        self._next_upload_sweep = 0.0
+        self._upload_sweep_lock = threading.Lock()
         if not self.mock_mode:
-            self.blob_service_client = BlobServiceClient.from_connection_string(connection_string)
+            self.blob_service_client = blob_service_client or BlobServiceClient.from_connection_string(connection_string)
             self.init_container()
+
+    def rotate_connection_string(self, connection_string: str):
+        """Replace the blob service client after the storage connection string changes"""
+        if self.mock_mode:
+            return
+        self.blob_service_client = BlobServiceClient.from_connection_string(connection_string)
+        self.connection_string = connection_string
+        logger.info("Blob storage connection string rotated")
     
     def init_container(self):
         """Initialize blob container"""
@@ -282,138 +778,669 @@ class BlobStorageManager:
             logger.info(f"Uploading image for product {product_id} in mock mode.")
             return f"http://mockimage.com/product-{product_id}-mock.jpg"
         try:
-            # Generate unique blob name
+            with open(image_path, 'rb') as f:
+                data = f.read()
+            variants = self._render_variants(data, image_path)
+
+            # Blob names are unique per upload, so every blob can be cached as immutable
             file_extension = Path(image_path).suffix
-            blob_name = f"product-{product_id}-{uuid.uuid4()}{file_extension}"
-            
-            # Upload file
-            blob_client = self.blob_service_client.get_blob_client(
-                container=self.container_name, 
-                blob=blob_name
-            )
-            
-            with open(image_path, 'rb') as data:
-                blob_client.upload_blob(
-                    data, 
-                    content_settings={'content_type': content_type},
-                    overwrite=True
-                )
-            
-            # Return the public URL
-            image_url = blob_client.url
+            if variants:
+                folder = f"product-{product_id}-{uuid.uuid4()}"
+                try:
+                    for spec in VARIANTS:
+                        self._upload_blob(f"{folder}/{spec.filename}", variants[spec.name], spec.content_type)
+                    image_url = self._upload_blob(f"{folder}/{ORIGINAL_STEM}{file_extension}", data, content_type)
+                except Exception:
+                    # Nothing refers to the folder yet; don't leave half of it behind
+                    self._delete_folder(folder)
+                    raise
+            else:
+                image_url = self._upload_blob(f"product-{product_id}-{uuid.uuid4()}{file_extension}", data,
+                                              content_type)
+
             logger.info(f"Image uploaded successfully: {image_url}")
             return image_url
             
         except Exception as e:
             logger.error(f"Error uploading image: {str(e)}")
             raise
+
+    def _upload_blob(self, blob_name: str, data: bytes, content_type: str) -> str:
+        blob_client = self.blob_service_client.get_blob_client(
+            container=self.container_name,
+            blob=blob_name
+        )
+        blob_client.upload_blob(
+            data,
+            content_settings=ContentSettings(content_type=content_type, cache_control=IMMUTABLE_CACHE_CONTROL),
+            overwrite=True
+        )
+        return blob_client.url
+
+    def _delete_folder(self, folder: str):
+        """Best-effort removal of every blob under an upload folder"""
+        try:
+            container_client = self.blob_service_client.get_container_client(self.container_name)
+            for blob in container_client.list_blobs(name_starts_with=f"{folder}/"):
+                self.blob_service_client.get_blob_client(container=self.container_name, blob=blob.name).delete_blob()
+        except Exception as e:
+            logger.error(f"Error removing partial upload {folder}: {str(e)}")
+
+    def _render_variants(self, data: bytes, image_path: str) -> Optional[Dict[str, bytes]]:
+        """Resize in the worker pool; None keeps the upload original-only when variants are off or fail"""
+        if not self.generate_variants:
+            return None
+        if not is_image(data):
+            # Checked here so unreadable uploads never start the worker processes
+            logger.warning(f"Storing {image_path} without variants: not a readable image")
+            return None
+        # One retry, for when another upload's timeout replaced the pool this render was queued on
+        for attempt in range(2):
+            pool, future = self.variant_pool, None
+            try:
+                future = pool.submit(render_variants, data)
+                return future.result(timeout=self.VARIANT_TIMEOUT)
+            except FutureTimeoutError:
+                future.cancel()
+                logger.warning(f"Storing {image_path} without variants: resizing took over {self.VARIANT_TIMEOUT}s")
+                self._reset_variant_pool(pool)
+                return None
+            except BrokenProcessPool as e:
+                # A worker died (out of memory, a crashing codec); later uploads need a working pool
+                replaced_elsewhere = not self._reset_variant_pool(pool)
+                # Retry unless this render may be what broke it
+                if attempt == 0 and (future is None or replaced_elsewhere):
+                    continue
+                logger.warning(f"Storing {image_path} without variants: {str(e)}")
+                return None
+            except Exception as e:
+                logger.warning(f"Storing {image_path} without variants: {str(e)}")
+                return None
+        return None
+
+    def _reset_variant_pool(self, pool: ProcessPoolExecutor) -> bool:
+        """Replace a broken or stuck pool and kill its workers; False if it was already replaced"""
+        with self._variant_pool_lock:
+            if self._variant_pool is not pool:
+                return False
+            self._variant_pool = None
+        # shutdown() alone leaves a stuck worker running; renders still queued on it fail and retry
+        for process in list((getattr(pool, "_processes", None) or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False)
+        return True
+
+    @property
+    def variant_pool(self) -> ProcessPoolExecutor:
+        """Worker processes for resizing, started on first upload; spawned so they never inherit locks or sockets"""
+        with self._variant_pool_lock:
+            if self._variant_pool is None:
+                self._variant_pool = ProcessPoolExecutor(max_workers=self.variant_workers,
+                                                         mp_context=multiprocessing.get_context("spawn"))
+            return self._variant_pool
+
+    def close(self):
+        """Stop the resize worker processes and release the image cache directory"""
+        with self._variant_pool_lock:
+            if self._variant_pool is not None:
+                self._variant_pool.shutdown()
+                self._variant_pool = None
+        if self._image_cache is not None:
+            self._image_cache.close()
+            self._image_cache = None
     
+    def create_upload_slot(self, product_id: int, content_type: str, max_bytes: int) -> UploadSlot:
+        """Authorize a client to upload one image straight to blob storage.
+
+        Returns a write-only SAS URL for a fresh blob name; the upload must be
+        confirmed with finalize_upload before the image is attached to a product.
+        """
+        if content_type not in self.ALLOWED_UPLOAD_TYPES:
+            raise ValueError(f"Unsupported image content type: {content_type}")
+        if max_bytes <= 0 or max_bytes > self.MAX_UPLOAD_BYTES:
+            raise ValueError(f"max_bytes must be between 1 and {self.MAX_UPLOAD_BYTES}")
+
+        file_extension = mimetypes.guess_extension(content_type) or ""
+        blob_name = f"{self.PENDING_UPLOAD_PREFIX}product-{product_id}-{uuid.uuid4()}{file_extension}"
+        expires_at = datetime.now(timezone.utc).replace(microsecond=0) + self.UPLOAD_SLOT_TTL
+
+        if self.mock_mode:
+            logger.info(f"Creating upload slot for product {product_id} in mock mode.")
+            upload_url = f"http://mockimage.com/{blob_name}?sig=mock"
+        else:
+            try:
+                blob_client = self.blob_service_client.get_blob_client(
+                    container=self.container_name,
+                    blob=blob_name
+                )
+                # Create-only: the token cannot read, list or overwrite existing blobs
+                sas_token = generate_blob_sas(
+                    account_name=self.blob_service_client.account_name,
+                    container_name=self.container_name,
+                    blob_name=blob_name,
+                    account_key=self.blob_service_client.credential.account_key,
+                    permission=BlobSasPermissions(create=True),
+                    expiry=expires_at
+                )
+                upload_url = f"{blob_client.url}?{sas_token}"
+            except Exception as e:
+                logger.error(f"Error creating upload slot: {str(e)}")
+                raise
+
+        slot = UploadSlot(product_id=product_id, blob_name=blob_name, upload_url=upload_url,
+                          content_type=content_type, max_bytes=max_bytes, expires_at=expires_at)
+        slot.token = self._sign_slot(slot)
+        logger.info(f"Upload slot created for product {product_id}: {blob_name}")
+        self._maybe_sweep_uploads()
+        return slot
+
+    def finalize_upload(self, product_id: int, upload_token: str) -> str:
+        """Verify a direct upload against its signed slot token and return the image URL.
+
+        Uploads that exceed the slot's size limit or have the wrong content type are deleted,
+        as are uploads finalized after the slot expired.
+        """
+        slot = self._verify_slot(upload_token)
+        if slot is None or slot.product_id != product_id:
+            raise ValueError(f"Invalid upload token for product {product_id}")
+        blob_name = slot.blob_name
+
+        if self.mock_mode:
+            logger.info(f"Finalizing upload {blob_name} in mock mode.")
+            if slot.expires_at < datetime.now(timezone.utc):
+                raise ValueError(f"Upload slot for {blob_name} has expired")
+            return f"http://mockimage.com/{blob_name}"
+
+        blob_client = self.blob_service_client.get_blob_client(
+            container=self.container_name,
+            blob=blob_name
+        )
+        try:
+            properties = blob_client.get_blob_properties()
+        except Exception as e:
+            logger.error(f"Uploaded blob {blob_name} not found: {str(e)}")
+            raise ValueError(f"Upload {blob_name} has not completed") from e
+
+        problem = None
+        if slot.expires_at < datetime.now(timezone.utc):
+            problem = f"slot expired at {slot.expires_at.isoformat()}"
+        elif properties.size <= 0 or properties.size > slot.max_bytes:
+            problem = f"size {properties.size} outside 1..{slot.max_bytes} bytes"
+        elif properties.content_settings.content_type != slot.content_type:
+            problem = f"content type {properties.content_settings.content_type} != {slot.content_type}"
+
+        if problem:
+            logger.warning(f"Rejecting upload {blob_name}: {problem}")
+            blob_client.delete_blob()
+            raise ValueError(f"Upload {blob_name} rejected: {problem}")
+
+        # Marks the blob as in use so sweep_expired_uploads leaves it alone
+        blob_client.set_blob_metadata(self.FINALIZED_METADATA)
+        logger.info(f"Upload finalized: {blob_client.url}")
+        return blob_client.url
+
+    def sweep_expired_uploads(self, older_than: Optional[timedelta] = None) -> int:
+        """Delete direct uploads that were never finalized and whose slot has expired.
+
+        Finalizing is refused once the slot expires, and an upload cannot start
+        after that either, so anything unfinalized and older than twice the slot
+        lifetime is an orphan. Returns the number of blobs deleted.
+        """
+        if self.mock_mode:
+            return 0
+        cutoff = datetime.now(timezone.utc) - (2 * self.UPLOAD_SLOT_TTL if older_than is None else older_than)
+        container_client = self.blob_service_client.get_container_client(self.container_name)
+        deleted = 0
+        try:
+            for blob in container_client.list_blobs(name_starts_with=self.PENDING_UPLOAD_PREFIX,
+                                                    include=["metadata"]):
+                if (blob.metadata or {}).get("upload_finalized") or blob.last_modified > cutoff:
+                    continue
+                self.blob_service_client.get_blob_client(container=self.container_name, blob=blob.name).delete_blob()
+                deleted += 1
+        except Exception as e:
+            logger.error(f"Error sweeping expired uploads: {str(e)}")
+            raise
+        if deleted:
+            logger.info(f"Deleted {deleted} abandoned direct uploads")
+        return deleted
+
+    def _maybe_sweep_uploads(self):
+        """Start a background sweep at most once per slot lifetime in this process"""
+        if self.mock_mode:
+            return
+        with self._upload_sweep_lock:
+            now = time.monotonic()
+            if now < self._next_upload_sweep:
+                return
+            self._next_upload_sweep = now + self.UPLOAD_SLOT_TTL.total_seconds()
+
+        def sweep():
+            try:
+                self.sweep_expired_uploads()
+            except Exception:
+                pass  # Already logged; the next sweep retries
+        threading.Thread(target=sweep, name="upload-sweeper", daemon=True).start()
+
+    def _slot_signing_key(self) -> bytes:
+        """HMAC key shared by every worker: derived from the storage account key that also signs the SAS"""
+        if self.mock_mode:
+            return b"mock-upload-slot-key"
+        account_key = self.blob_service_client.credential.account_key
+        return hashlib.sha256(b"upload-slot\0" + account_key.encode()).digest()
+
+    def _sign_slot(self, slot: UploadSlot) -> str:
+        payload = json.dumps({"p": slot.product_id, "b": slot.blob_name, "t": slot.content_type,
+                              "m": slot.max_bytes, "e": int(slot.expires_at.timestamp())},
+                             separators=(",", ":")).encode()
+        signature = hmac.new(self._slot_signing_key(), payload, hashlib.sha256).digest()
+        return f"{base64.urlsafe_b64encode(payload).decode()}.{base64.urlsafe_b64encode(signature).decode()}"
+
+    def _verify_slot(self, token: str) -> Optional[UploadSlot]:
+        """The slot a token was issued for, or None if it is malformed or not signed by this deployment"""
+        try:
+            encoded_payload, encoded_signature = token.split(".")
+            payload = base64.urlsafe_b64decode(encoded_payload)
+            signature = base64.urlsafe_b64decode(encoded_signature)
+        except (ValueError, AttributeError):
+            return None
+        expected = hmac.new(self._slot_signing_key(), payload, hashlib.sha256).digest()
+        if not hmac.compare_digest(signature, expected):
+            return None
+        fields = json.loads(payload)
+        return UploadSlot(product_id=fields["p"], blob_name=fields["b"], upload_url="",
+                          content_type=fields["t"], max_bytes=fields["m"],
+                          expires_at=datetime.fromtimestamp(fields["e"], timezone.utc), token=token)
+
     def delete_image(self, image_url: str) -> bool:
         """Delete image from blob storage"""
         if self.mock_mode:
             logger.info(f"Deleting image {image_url} in mock mode.")
             return True
         try:
-            # Extract blob name from URL
-            blob_name = image_url.split("/")[-1]
-            
-            blob_client = self.blob_service_client.get_blob_client(
-                container=self.container_name,
-                blob=blob_name
-            )
-            
-            blob_client.delete_blob()
-            logger.info(f"Image deleted successfully: {blob_name}")
+            blob_name = self._blob_name_from_url(image_url)
+            folder = variant_folder(blob_name)
+            if folder:
+                # The original and all of its variants share the upload's folder
+                container_client = self.blob_service_client.get_container_client(self.container_name)
+                blob_names = [blob.name for blob in container_client.list_blobs(name_starts_with=f"{folder}/")]
+            else:
+                blob_names = [blob_name]
+
+            for name in blob_names:
+                blob_client = self.blob_service_client.get_blob_client(
+                    container=self.container_name,
+                    blob=name
+                )
+                blob_client.delete_blob()
+                if self._image_cache:
+                    self._image_cache.invalidate(name)
+            logger.info(f"Image deleted successfully: {blob_name} ({len(blob_names)} blobs)")
             return True
             
         except Exception as e:
             logger.error(f"Error deleting image: {str(e)}")
             return False
 
+    def open_image(self, image_url: str) -> Optional[mmap.mmap]:
+        """Open an image through the local disk cache as a read-only memory map.
+
+        The caller owns the returned map and should close it (it is a context manager).
+        """
+        if self.mock_mode:
+            logger.info(f"Opening image {image_url} in mock mode.")
+            return None
+        try:
+            blob_name = self._blob_name_from_url(image_url)
+            return self.image_cache.open(blob_name, self._image_fetcher(blob_name))
+        except Exception as e:
+            logger.error(f"Error opening image {image_url}: {str(e)}")
+            raise
+
+    def read_image_range(self, image_url: str, start: int, end: Optional[int] = None) -> bytes:
+        """Read bytes [start, end) of an image through the local disk cache"""
+        if self.mock_mode:
+            logger.info(f"Reading image range {start}-{end} of {image_url} in mock mode.")
+            return b""
+        try:
+            blob_name = self._blob_name_from_url(image_url)
+            return self.image_cache.read_range(blob_name, start, end, self._image_fetcher(blob_name))
+        except Exception as e:
+            logger.error(f"Error reading image {image_url}: {str(e)}")
+            raise
+
+    @property
+    def image_cache(self) -> ImageCache:
+        """Local disk cache for image reads, created on first use"""
+        if self._image_cache is None:
+            self._image_cache = ImageCache(self.image_cache_dir, max_bytes=self.image_cache_max_bytes)
+        return self._image_cache
+
+    def _image_fetcher(self, blob_name: str):
+        """Build a fetcher that downloads the blob unless its ETag still matches"""
+        def fetch(etag: Optional[str]):
+            blob_client = self.blob_service_client.get_blob_client(
+                container=self.container_name,
+                blob=blob_name
+            )
+            try:
+                if etag:
+                    downloader = blob_client.download_blob(etag=etag, match_condition=MatchConditions.IfModified)
+                else:
+                    downloader = blob_client.download_blob()
+            except ResourceNotModifiedError:
+                return None
+            return downloader.readall(), downloader.properties.etag
+        return fetch
+
+    def _blob_name_from_url(self, image_url: str) -> str:
+        """Extract the blob name, which may contain slashes, from a blob URL"""
+        path = unquote(urlsplit(image_url).path)
+        marker = f"/{self.container_name}/"
+        if marker in path:
+            return path.split(marker, 1)[1]
+        return path.rsplit("/", 1)[-1]
+
 class ECommerceSystem:
     """Main e-commerce system class"""
-    def __init__(self, mock_mode: bool = False):
+
+    # Version key shared by every cached listing page; any product write invalidates them all
+    LISTING_CACHE_KEY = "products:list"
+
+    # Backend methods admitted through each bulkhead
+    SQL_READ_METHODS = ("get_product", "get_products", "list_products", "scan_prices")
+    SQL_WRITE_METHODS = ("add_product", "import_products", "update_product", "delete_product")
+    BLOB_METHODS = ("upload_image", "delete_image", "open_image", "read_image_range", "finalize_upload")
+    # Default (slots, queue deadline in ms); SQL slots add up to the default connection pool size
+    BULKHEAD_DEFAULTS = {"sql_read": (6, 1000), "sql_write": (4, 2000), "blob": (8, 5000)}
+    # Bulk work (imports, stats reconciliation) waits this long for capacity instead of being shed quickly
+    BULK_QUEUE_TIME = 60.0
+
+    def __init__(self, mock_mode: bool = False, db_manager: Optional[DatabaseManager] = None,
+                 blob_manager: Optional[BlobStorageManager] = None,
+                 bulkheads: Optional[Dict[str, Bulkhead]] = None):
         self.mock_mode = mock_mode
-        if self.mock_mode:
+        self.catalog_stats: Optional[CatalogStats] = None
+        self.product_cache: Optional[SharedCache] = None
+        if db_manager is not None and blob_manager is not None:
+            # Pre-built backends, e.g. the local stand-ins from local_backends
+            logger.info("E-Commerce system initialized with provided backends.")
+            self.key_vault = None
+            self.secrets = None
+            self.db_manager = db_manager
+            self.blob_manager = blob_manager
+        elif self.mock_mode:
             logger.info("E-Commerce system initialized in mock mode.")
+            self.key_vault = None
+            self.secrets = None
             self.db_manager = DatabaseManager(connection_string="mock_sql_connection_string", mock_mode=True)
             self.blob_manager = BlobStorageManager(connection_string="mock_blob_connection_string", container_name="mock_container", mock_mode=True)
         else:
+            # Connection strings come from Key Vault when KEY_VAULT_URL is set, falling back to the environment
+            key_vault_url = os.getenv("KEY_VAULT_URL")
+            self.key_vault = AzureKeyVaultManager(key_vault_url) if key_vault_url else None
+            sources = [self.key_vault.secret_source, env_source] if self.key_vault else [env_source]
+            self.secrets = SecretProvider(
+                sources=sources,
+                ttl_seconds=float(os.getenv("SECRET_CACHE_TTL", "300")),
+                disk_cache_path=os.getenv("SECRET_CACHE_PATH"),
+                disk_cache_key=os.getenv("SECRET_CACHE_KEY")
+            )
 
-            sql_connection_string = os.getenv("SQL_CONNECTION_STRING")
-            blob_connection_string = os.getenv("BLOB_CONNECTION_STRING")
+            sql_connection_string = self.secrets.get("SQL_CONNECTION_STRING")
+            blob_connection_string = self.secrets.get("BLOB_CONNECTION_STRING")
             blob_container_name = os.getenv("BLOB_CONTAINER_NAME", "ecommerce-images")
 
-            if not sql_connection_string or not blob_connection_string:
+            # SHARD_MAP_PATH points at a shard map JSON file (see shard_map.ShardMap)
+            shard_map_path = os.getenv("SHARD_MAP_PATH")
+
+            if not (sql_connection_string or shard_map_path) or not blob_connection_string:
                 logger.error("Missing environment variables for connection strings.")
                 raise ValueError("SQL_CONNECTION_STRING and BLOB_CONNECTION_STRING must be set.")
 
-            self.db_manager = DatabaseManager(connection_string=sql_connection_string)
+            if shard_map_path:
+                self.db_manager = ShardedDatabaseManager(shard_map_path, secrets=self.secrets)
+            else:
+                self.db_manager = DatabaseManager(connection_string=sql_connection_string)
             self.blob_manager = BlobStorageManager(connection_string=blob_connection_string, container_name=blob_container_name)
 
+            # Rotated secrets are applied in the background; request paths only ever read the cache
+            # (the sharded manager subscribes to each shard's own secret)
+            if not shard_map_path:
+                self.secrets.subscribe("SQL_CONNECTION_STRING", self.db_manager.rotate_connection_string)
+            self.secrets.subscribe("BLOB_CONNECTION_STRING", self.blob_manager.rotate_connection_string)
+            self.secrets.start()
+
+            # Product pages and listings shared by all worker processes on this host
+            if os.getenv("PRODUCT_CACHE_PATH"):
+                self.enable_product_cache(
+                    os.getenv("PRODUCT_CACHE_PATH"),
+                    max_bytes=int(os.getenv("PRODUCT_CACHE_MB", "64")) * 1024 * 1024,
+                    ttl=float(os.getenv("PRODUCT_CACHE_TTL", "60"))
+                )
+
+        # Separate concurrency limits so a slow backend or an upload burst cannot take every request thread
+        self.bulkheads = bulkheads or self._default_bulkheads()
+        self._db = self._guarded_db()
+        self._blob = self._guarded_blob()
+
         logger.info("E-Commerce system initialized successfully")
 
+    @classmethod
+    def _default_bulkheads(cls) -> Dict[str, Bulkhead]:
+        """Bulkheads sized from BULKHEAD_<NAME>_LIMIT and BULKHEAD_<NAME>_QUEUE_MS, e.g. BULKHEAD_SQL_READ_LIMIT"""
+        return {
+            name: Bulkhead(name,
+                           max_concurrent=int(os.getenv(f"BULKHEAD_{name.upper()}_LIMIT", limit)),
+                           max_queue_time=float(os.getenv(f"BULKHEAD_{name.upper()}_QUEUE_MS", queue_ms)) / 1000)
+            for name, (limit, queue_ms) in cls.BULKHEAD_DEFAULTS.items()
+        }
+
+    def _guarded_db(self, bulk: bool = False) -> GuardedBackend:
+        routes = {name: self.bulkheads["sql_read"] for name in self.SQL_READ_METHODS}
+        routes.update({name: self.bulkheads["sql_write"] for name in self.SQL_WRITE_METHODS})
+        return GuardedBackend(self.db_manager, routes, bulk=bulk,
+                              max_queue_time=self.BULK_QUEUE_TIME if bulk else None)
+
+    def _guarded_blob(self, bulk: bool = False) -> GuardedBackend:
+        routes = {name: self.bulkheads["blob"] for name in self.BLOB_METHODS}
+        return GuardedBackend(self.blob_manager, routes, bulk=bulk,
+                              max_queue_time=self.BULK_QUEUE_TIME if bulk else None)
+
+    def bulkhead_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Slots in use, queue depth, admitted and shed counts and queue times per bulkhead"""
+        return {name: bulkhead.stats() for name, bulkhead in self.bulkheads.items()}
+
     # Wrapper methods for DatabaseManager
     def add_product(self, name: str, description: str, price: float, image_path: Optional[str] = None) -> int:
         if image_path and os.path.exists(image_path):
-            image_url = self.blob_manager.upload_image(0, image_path) # Product ID will be updated after DB insert
+            image_url = self._blob.upload_image(0, image_path) # Product ID will be updated after DB insert
         else:
             image_url = ""
         product = Product(name=name, description=description, price=price, image_url=image_url)
-        product_id = self.db_manager.add_product(product)
+        product_id = self._db.add_product(product)
+        self._invalidate_cached()
         # Optionally update image_url with actual product_id if needed
+        if self.catalog_stats:
+            product.product_id = product_id
+            self.catalog_stats.on_add(product)
         return product_id
 
     def get_product(self, product_id: int) -> Optional[Product]:
-        return self.db_manager.get_product(product_id)
+        return self._db.get_product(product_id)
+
+    def get_products(self, product_ids: List[int], fields: Union[str, List[str], None] = None) -> List[Product]:
+        return self._bind_lazy(self._db.get_products(product_ids, fields))
 
-    def list_products(self, limit: int = 50) -> List[Product]:
-        return self.db_manager.list_products(limit)
+    def list_products(self, limit: int = 50, fields: Union[str, List[str], None] = None) -> List[Product]:
+        return self._bind_lazy(self._db.list_products(limit, fields))
+
+    def _bind_lazy(self, products: List[Product]) -> List[Product]:
+        """Send lazy loads through the read bulkhead like any other get_product"""
+        for product in products:
+            if isinstance(product, LazyProduct):
+                product.bind(self._db.get_product)
+        return products
 
     def update_product(self, product: Product) -> bool:
-        return self.db_manager.update_product(product)
+        # Catalog stats need the old price to move it out of the histogram
+        previous = self._db.get_product(product.product_id) if self.catalog_stats else None
+        updated = self._db.update_product(product)
+        if updated:
+            self._invalidate_cached(product.product_id)
+        if updated and previous:
+            self.catalog_stats.on_update(previous, product)
+        return updated
 
     def delete_product(self, product_id: int) -> bool:
         # First get the product to retrieve image_url
-        product = self.db_manager.get_product(product_id)
-        if product and self.db_manager.delete_product(product_id):
-            self.blob_manager.delete_image(product.image_url)
+        product = self._db.get_product(product_id)
+        if product and self._db.delete_product(product_id):
+            self._invalidate_cached(product_id)
+            self._blob.delete_image(product.image_url)
+            if self.catalog_stats:
+                self.catalog_stats.on_delete(product)
             return True
         return False
 
+    def import_catalog(self, csv_path: str, image_dir: str, **options: Any) -> "ImportReport":
+        """Bulk-import a supplier CSV and its images; options are passed to catalog_import.CatalogImporter"""
+        from catalog_import import CatalogImporter
+
+        def record(product: Product):
+            self._invalidate_cached()
+            if self.catalog_stats:
+                self.catalog_stats.on_add(product)
+
+        # Imports run as bulk work so they queue behind page reads and cannot fill a bulkhead
+        importer = CatalogImporter(self._guarded_db(bulk=True), self._guarded_blob(bulk=True),
+                                   on_added=record, **options)
+        return importer.run(csv_path, image_dir)
+
+    def enable_product_cache(self, path: Optional[str] = None, max_bytes: int = 64 * 1024 * 1024,
+                             ttl: float = 60.0) -> SharedCache:
+        """Cache product pages and listings as JSON in a memory-mapped file shared by every process on the host"""
+        if self.product_cache is None:
+            self.product_cache = SharedCache(path or default_cache_path(), max_bytes=max_bytes, default_ttl=ttl)
+        return self.product_cache
+
+    def _invalidate_cached(self, product_id: Optional[int] = None):
+        """Drop a changed product page and all listing pages from the shared cache"""
+        if self.product_cache:
+            if product_id is not None:
+                self.product_cache.invalidate(f"product:{product_id}")
+            self.product_cache.invalidate(self.LISTING_CACHE_KEY)
+
+    def enable_catalog_stats(self, newest_limit: int = 10, reconcile_interval: float = 300.0) -> CatalogStats:
+        """Seed catalog statistics from the database and keep them current on every write"""
+        if self.catalog_stats is None:
+            # Seeding and reconciling scan the whole table, so they run as bulk reads
+            stats = CatalogStats(self._guarded_db(bulk=True), newest_limit=newest_limit)
+            stats.seed()
+            stats.start(reconcile_interval)
+            self.catalog_stats = stats
+        return self.catalog_stats
+
+    def get_catalog_stats(self) -> Mapping[str, Any]:
+        """Dashboard statistics: counts, price aggregates and distribution, newest items (read-only)"""
+        return self.enable_catalog_stats().snapshot()
+
     # Wrapper methods for BlobStorageManager
     def upload_image(self, product_id: int, image_path: str, content_type: str = "image/jpeg") -> str:
-        return self.blob_manager.upload_image(product_id, image_path, content_type)
+        return self._blob.upload_image(product_id, image_path, content_type)
 
     def delete_image(self, image_url: str) -> bool:
-        return self.blob_manager.delete_image(image_url)
+        return self._blob.delete_image(image_url)
+
+    def open_image(self, image_url: str) -> Optional[mmap.mmap]:
+        return self._blob.open_image(image_url)
+
+    def create_upload_slot(self, product_id: int, content_type: str, max_bytes: int) -> UploadSlot:
+        return self.blob_manager.create_upload_slot(product_id, content_type, max_bytes)
+
+    def finalize_upload(self, product_id: int, upload_token: str) -> str:
+        """Attach a directly uploaded image to its product and return the image URL"""
+        image_url = self._blob.finalize_upload(product_id, upload_token)
+        product = self._db.get_product(product_id)
+        if product is None:
+            self._blob.delete_image(image_url)
+            raise ValueError(f"Product {product_id} not found")
+        previous_url = product.image_url
+        product.image_url = image_url
+        if not self._db.update_product(product):
+            # Deleted concurrently: nothing references the new image, and the old one was never replaced
+            self._blob.delete_image(image_url)
+            raise ValueError(f"Product {product_id} could not be updated with the uploaded image")
+        self._invalidate_cached(product_id)
+        if previous_url and previous_url != image_url:
+            self._blob.delete_image(previous_url)
+        return image_url
+
+    def read_image_range(self, image_url: str, start: int, end: Optional[int] = None) -> bytes:
+        return self._blob.read_image_range(image_url, start, end)
+
+    @staticmethod
+    def _product_dict(product: Product, columns: Optional[tuple] = None) -> Dict[str, Any]:
+        """API representation of a product, limited to ``columns`` so projected fields are never loaded"""
+        result = {}
+        for column in columns or PROJECTIONS["full"]:
+            value = getattr(product, _COLUMN_FIELDS[column])
+            if column == 'CreatedAt':
+                value = value.isoformat() if value else None
+            result[column] = value
+            if column == 'ImageUrl':
+                result['ImageVariants'] = product.image_variants
+        return result
 
     def get_product_dict(self, product_id: int) -> Optional[Dict[str, Any]]:
+        if self.product_cache:
+            data = self.get_product_json(product_id)
+            return json.loads(data) if data is not None else None
         product = self.get_product(product_id)
         if product:
-            return {
-                'ProductId': product.product_id,
-                'Name': product.name,
-                'Description': product.description,
-                'Price': product.price,
-                'ImageUrl': product.image_url,
-                'CreatedAt': product.created_at.isoformat() if product.created_at else None
-            }
+            return self._product_dict(product)
         return None
 
-    def list_products_dict(self, limit: int = 50) -> List[Dict[str, Any]]:
-        products = self.list_products(limit)
-        return [
-            {
-                'ProductId': p.product_id,
-                'Name': p.name,
-                'Description': p.description,
-                'Price': p.price,
-                'ImageUrl': p.image_url,
-                'CreatedAt': p.created_at.isoformat() if p.created_at else None
-            }
-            for p in products
-        ]
+    def list_products_dict(self, limit: int = 50, fields: Union[str, List[str], None] = None) -> List[Dict[str, Any]]:
+        """Listing with only the requested fields, e.g. fields="summary" for grid views"""
+        if self.product_cache:
+            return json.loads(self.list_products_json(limit, fields))
+        columns = requested_columns(fields)
+        products = self.list_products(limit, fields)
+        return [self._product_dict(p, columns) for p in products]
+
+    def get_product_json(self, product_id: int) -> Optional[bytes]:
+        """Product page as serialized JSON, straight from the shared product cache on a hit"""
+        def load():
+            product = self.get_product(product_id)
+            return self._product_dict(product) if product else None
+        key = f"product:{product_id}"
+        return self._cached_json(key, key, load)
+
+    def list_products_json(self, limit: int = 50, fields: Union[str, List[str], None] = None) -> bytes:
+        """Product listing as serialized JSON, straight from the shared product cache on a hit"""
+        columns = requested_columns(fields)
+        key = f"{self.LISTING_CACHE_KEY}:{int(limit)}"
+        if fields is not None:
+            key += ":" + ",".join(columns)
+        return self._cached_json(key, self.LISTING_CACHE_KEY,
+                                 lambda: [self._product_dict(p, columns) for p in self.list_products(limit, fields)])
+
+    def _cached_json(self, key: str, version_key: str, load: Callable[[], Any]) -> Optional[bytes]:
+        cache = self.product_cache
+        if cache is not None:
+            data = cache.get(key)
+            if data is not None:
+                return data
+            # Taken before the load so a write that lands meanwhile keeps our copy out of the cache
+            version = cache.version(version_key)
+        value = load()
+        if value is None:
+            return None
+        data = json.dumps(value).encode()
+        if cache is not None:
+            cache.put(key, data, version, version_key)
+        return data
 
 # Example usage and testing functions
 def main():
@@ -436,7 +1463,7 @@ def main():
         print(f"Retrieving product {product_id}...")
         product = ecommerce.get_product(product_id)
         if product:
-            print(f"Product found: {product['Name']} - ${product['Price']}")
+            print(f"Product found: {product.name} - ${product.price}")
         else:
             print("Product not found")
         
@@ -446,7 +1473,7 @@ def main():
         print(f"Found {len(products)} products")
         
         for p in products:
-            print(f"- {p['Name']}: ${p['Price']}")
+            print(f"- {p.name}: ${p.price}")
         
     except Exception as e:
         logger.error(f"Error in main: {str(e)}")
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Admission control for backend calls
+Bounded-concurrency bulkheads with queue deadlines, bulk-work priority and load shedding
+Author: Gabriel Demetrios Lafis
+"""
+
+import heapq
+import inspect
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class OverloadedError(RuntimeError):
+    """A call was shed because its bulkhead had no free slot before the queue deadline.
+
+    Nothing was sent to the backend; callers should fail fast (e.g. HTTP 503) and retry later.
+    """
+
+    def __init__(self, bulkhead: str, waited: float, queued: int, limit: int):
+        self.bulkhead = bulkhead
+        self.waited = waited
+        self.queued = queued
+        self.limit = limit
+        super().__init__(f"{bulkhead} is overloaded: no free slot out of {limit} after waiting "
+                         f"{waited * 1000:.0f} ms ({queued} calls queued); retry later")
+
+
+class _Waiter:
+    __slots__ = ("bulk", "event", "granted", "cancelled")
+
+    def __init__(self, bulk: bool):
+        self.bulk = bulk
+        self.event = threading.Event()
+        self.granted = False
+        self.cancelled = False
+
+
+class Bulkhead:
+    """Limits concurrent calls to one backend and sheds calls that queue too long.
+
+    At most ``max_concurrent`` calls run at once. Others wait in a queue where
+    interactive calls always go ahead of bulk work (imports, reconciliation
+    scans), and bulk work may hold at most ``max_bulk`` slots so pages keep
+    some capacity even during a large job. A call that has not been admitted
+    within ``max_queue_time`` seconds, or that finds ``max_queue`` calls
+    already waiting, raises OverloadedError instead of adding to the pile-up.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue_time: float,
+                 max_bulk: Optional[int] = None, max_queue: Optional[int] = None):
+        if max_concurrent < 1:
+            raise ValueError(f"Bulkhead {name} needs at least one slot")
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue_time = max_queue_time
+        self.max_bulk = max_bulk if max_bulk is not None else max(1, max_concurrent // 2)
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._waiters: List[Tuple[int, int, _Waiter]] = []
+        self._sequence = itertools.count()
+        self._in_use = 0
+        self._bulk_in_use = 0
+        self._queued = 0
+        self.admitted = 0
+        self.shed = 0
+        self.queue_time_total = 0.0
+        self.queue_time_max = 0.0
+
+    @contextmanager
+    def slot(self, bulk: bool = False, max_queue_time: Optional[float] = None) -> Iterator[None]:
+        """Hold one slot for the duration of the block"""
+        self._acquire(bulk, self.max_queue_time if max_queue_time is None else max_queue_time)
+        try:
+            yield
+        finally:
+            self._release(bulk)
+
+    def _acquire(self, bulk: bool, max_queue_time: float):
+        started = time.monotonic()
+        waiter = _Waiter(bulk)
+        with self._lock:
+            heapq.heappush(self._waiters, (1 if bulk else 0, next(self._sequence), waiter))
+            self._queued += 1
+            self._dispatch()
+            if not waiter.granted and self.max_queue is not None and self._queued > self.max_queue:
+                # The queue is already full: fail now rather than after the deadline
+                waiter.cancelled = True
+                self._queued -= 1
+                self.shed += 1
+                raise OverloadedError(self.name, 0.0, self._queued, self.max_concurrent)
+
+        waiter.event.wait(max_queue_time)
+        waited = time.monotonic() - started
+        with self._lock:
+            if not waiter.granted:
+                # Left in the heap and skipped by _dispatch
+                waiter.cancelled = True
+                self._queued -= 1
+                self.shed += 1
+                queued = self._queued
+            else:
+                self.admitted += 1
+                self.queue_time_total += waited
+                self.queue_time_max = max(self.queue_time_max, waited)
+                return
+        logger.warning(f"Shedding {'bulk ' if bulk else ''}call to {self.name} after {waited * 1000:.0f} ms in queue")
+        raise OverloadedError(self.name, waited, queued, self.max_concurrent)
+
+    def _release(self, bulk: bool):
+        with self._lock:
+            self._in_use -= 1
+            if bulk:
+                self._bulk_in_use -= 1
+            self._dispatch()
+
+    def _dispatch(self):
+        """Hand free slots to queued calls, interactive first then in arrival order"""
+        while self._waiters and self._in_use < self.max_concurrent:
+            _, _, waiter = self._waiters[0]
+            if waiter.cancelled:
+                heapq.heappop(self._waiters)
+                continue
+            if waiter.bulk and self._bulk_in_use >= self.max_bulk:
+                break
+            heapq.heappop(self._waiters)
+            self._queued -= 1
+            self._in_use += 1
+            if waiter.bulk:
+                self._bulk_in_use += 1
+            waiter.granted = True
+            waiter.event.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "limit": self.max_concurrent,
+                "bulk_limit": self.max_bulk,
+                "in_use": self._in_use,
+                "bulk_in_use": self._bulk_in_use,
+                "queued": self._queued,
+                "admitted": self.admitted,
+                "shed": self.shed,
+                "avg_queue_ms": self.queue_time_total / self.admitted * 1000 if self.admitted else 0.0,
+                "max_queue_ms": self.queue_time_max * 1000,
+            }
+
+
+class GuardedBackend:
+    """Proxy that runs the routed methods of a backend inside their bulkheads.
+
+    Other attributes pass straight through. Generator methods hold their slot
+    while the caller iterates, since that is when the backend does the work.
+    """
+
+    def __init__(self, target: Any, routes: Dict[str, Bulkhead], bulk: bool = False,
+                 max_queue_time: Optional[float] = None):
+        self._target = target
+        self._routes = routes
+        self._bulk = bulk
+        self._max_queue_time = max_queue_time
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._target, name)
+        bulkhead = self._routes.get(name)
+        if bulkhead is None or not callable(attr):
+            return attr
+        bulk, max_queue_time = self._bulk, self._max_queue_time
+        if inspect.isgeneratorfunction(attr):
+            def guarded_iter(*args, **kwargs):
+                with bulkhead.slot(bulk, max_queue_time):
+                    yield from attr(*args, **kwargs)
+            return guarded_iter
+
+        def guarded(*args, **kwargs):
+            with bulkhead.slot(bulk, max_queue_time):
+                return attr(*args, **kwargs)
+        return guarded
@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""
+Parallel CSV catalog import for supplier onboarding
+Streams a product CSV through validation, concurrent image uploads and batched inserts
+Author: Gabriel Demetrios Lafis
+"""
+
+import os
+import csv
+import sys
+import json
+import math
+import time
+import uuid
+import queue
+import hashlib
+import logging
+import argparse
+import mimetypes
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from app import Product
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ("name", "price")
+MAX_NAME_LENGTH = 100  # Products.Name is NVARCHAR(100)
+MAX_PRICE = 1e16  # Products.Price is DECIMAL(18,2)
+
+# End-of-stream marker passed from one stage to the next
+_DONE = object()
+
+
+class RowRejected(ValueError):
+    """A CSV row that cannot be imported; it is written to the dead-letter file"""
+
+
+class ImportAborted(RuntimeError):
+    """Another stage failed and the pipeline is shutting down"""
+
+
+@dataclass
+class ImportRow:
+    """A validated CSV row on its way through the pipeline"""
+    row_number: int
+    raw: Dict[str, str]
+    name: str
+    description: str
+    price: float
+    image_path: Optional[str] = None
+    content_type: Optional[str] = None
+    image_url: str = ""
+
+
+@dataclass
+class ImportReport:
+    """Outcome of one import run"""
+    rows_read: int = 0
+    rows_skipped: int = 0
+    rows_imported: int = 0
+    rows_rejected: int = 0
+    images_uploaded: int = 0
+    batches: int = 0
+    elapsed_seconds: float = 0.0
+    product_ids: List[int] = field(default_factory=list, repr=False)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_imported / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    @property
+    def images_per_second(self) -> float:
+        return self.images_uploaded / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+
+class ImportCheckpoint:
+    """Which data rows of a CSV are finished (inserted or dead-lettered).
+
+    Rows finish out of order because images upload concurrently, so the file
+    keeps a watermark (every row up to it is finished) plus the finished rows
+    beyond it, and a resumed import skips exactly those rows.
+
+    ``run_id`` identifies the import run across resumes; rows are inserted under
+    the key ``<run_id>:<row>``, so a batch that committed just before a crash,
+    but after the last save, is recognized instead of inserted again.
+
+    ``fingerprint`` is a hash of the CSV's contents: a new file delivered under
+    the same name starts a new run instead of skipping rows it never imported.
+    """
+
+    def __init__(self, path: str, source: str, fingerprint: str = ""):
+        self.path = path
+        self.source = source
+        self.fingerprint = fingerprint
+        self.run_id = uuid.uuid4().hex
+        self.watermark = 0
+        self.done: Set[int] = set()
+        self.complete = False
+
+    def load(self) -> bool:
+        """Pick up a saved run of the same file; False if there is none to resume"""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path) as f:
+            state = json.load(f)
+        if state.get("source") != self.source:
+            raise ValueError(f"Checkpoint {self.path} belongs to {state.get('source')}, not {self.source}")
+        if state.get("fingerprint", "") != self.fingerprint:
+            logger.warning(f"{self.source} changed since checkpoint {self.path} was saved; starting a new import")
+            return False
+        self.run_id = state.get("run_id") or self.run_id
+        self.watermark = int(state["watermark"])
+        self.done = {int(row) for row in state.get("done", [])}
+        self.complete = bool(state.get("complete"))
+        if self.complete:
+            logger.info(f"{self.source} was already imported completely")
+        else:
+            logger.info(f"Resuming import of {self.source} after row {self.watermark}")
+        return True
+
+    def is_done(self, row_number: int) -> bool:
+        return row_number <= self.watermark or row_number in self.done
+
+    def mark_done(self, row_numbers: List[int]):
+        self.done.update(row_numbers)
+        while self.watermark + 1 in self.done:
+            self.watermark += 1
+            self.done.discard(self.watermark)
+
+    def import_key(self, row_number: int) -> str:
+        return f"{self.run_id}:{row_number}"
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"source": self.source, "fingerprint": self.fingerprint, "run_id": self.run_id,
+                       "watermark": self.watermark, "done": sorted(self.done), "complete": self.complete}, f)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def fingerprint_of(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+
+class DeadLetterFile:
+    """CSV of rejected rows with their original columns plus row number and error.
+
+    It has the same columns as the input, so it can be fixed up and imported again.
+    """
+
+    def __init__(self, path: str, columns: List[str], append: bool):
+        self.path = path
+        self._lock = threading.Lock()
+        fresh = not append or not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'w' if fresh else 'a', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=["row", *columns, "error"], extrasaction='ignore')
+        if fresh:
+            self._writer.writeheader()
+
+    def write(self, row_number: int, raw: Dict[str, str], error: str):
+        with self._lock:
+            self._writer.writerow({**raw, "row": row_number, "error": error})
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class CatalogImporter:
+    """Imports a product CSV and its folder of images in three concurrent stages.
+
+    One thread parses and validates rows, ``upload_workers`` threads upload
+    images, and the calling thread inserts rows in batches of ``batch_size``,
+    one transaction per batch. The stages are joined by bounded queues, so a
+    slow database stalls the uploads and slow uploads stall the parser; memory
+    use stays flat however large the file is.
+
+    The CSV needs ``name`` and ``price`` columns; ``description`` and ``image``
+    (a path relative to the image directory) are optional. Invalid rows and
+    failed uploads go to the dead-letter file. The checkpoint is saved after
+    every committed batch; a failed run can be re-run with ``resume`` to pick
+    up where it stopped, unless the file has changed since. Inserts are keyed by run and row, so rows of a batch
+    that committed but missed its checkpoint save are not inserted twice. A
+    process killed mid-batch may leave orphaned images from rows that were
+    uploaded but never inserted.
+    """
+
+    def __init__(self, db_manager: Any, blob_manager: Any, upload_workers: int = 8, batch_size: int = 100,
+                 queue_size: Optional[int] = None, flush_interval: float = 1.0, report_interval: float = 5.0,
+                 checkpoint_path: Optional[str] = None, dead_letter_path: Optional[str] = None,
+                 resume: bool = True, on_added: Optional[Callable[[Product], None]] = None,
+                 emit: Callable[[str], None] = logger.info):
+        if upload_workers < 1 or batch_size < 1:
+            raise ValueError("upload_workers and batch_size must be at least 1")
+        self.db_manager = db_manager
+        self.blob_manager = blob_manager
+        self.upload_workers = upload_workers
+        self.batch_size = batch_size
+        self.upload_queue_size = queue_size or 4 * upload_workers
+        self.insert_queue_size = queue_size or 2 * batch_size
+        self.flush_interval = flush_interval
+        self.report_interval = report_interval
+        self.checkpoint_path = checkpoint_path
+        self.dead_letter_path = dead_letter_path
+        self.resume = resume
+        self.on_added = on_added
+        self.emit = emit
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._failure: Optional[BaseException] = None
+
+    def run(self, csv_path: str, image_dir: str) -> ImportReport:
+        """Import every row not already finished according to the checkpoint"""
+        checkpoint = ImportCheckpoint(self.checkpoint_path or f"{csv_path}.checkpoint.json",
+                                      os.path.abspath(csv_path), ImportCheckpoint.fingerprint_of(csv_path))
+        resumed = self.resume and checkpoint.load()
+        # The run id must be on disk before any row is inserted under it
+        checkpoint.save()
+        report = ImportReport()
+        self._stop.clear()
+        self._failure = None
+        started = time.monotonic()
+
+        with open(csv_path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            reader.fieldnames = [column.strip().lower() for column in reader.fieldnames or []]
+            missing = [column for column in REQUIRED_COLUMNS if column not in reader.fieldnames]
+            if missing:
+                raise ValueError(f"{csv_path} is missing required columns: {', '.join(missing)}")
+            dead_letter = DeadLetterFile(self.dead_letter_path or f"{csv_path}.rejected.csv",
+                                         reader.fieldnames, append=resumed)
+            uploads: "queue.Queue[Any]" = queue.Queue(self.upload_queue_size)
+            inserts: "queue.Queue[Any]" = queue.Queue(self.insert_queue_size)
+            finished = threading.Event()
+
+            stages = [threading.Thread(target=self._parse_stage, name="import-parse",
+                                       args=(reader, os.path.realpath(image_dir), checkpoint, dead_letter,
+                                             uploads, report))]
+            stages += [threading.Thread(target=self._upload_stage, name=f"import-upload-{i}",
+                                        args=(uploads, inserts, checkpoint, dead_letter, report))
+                       for i in range(self.upload_workers)]
+            reporter = threading.Thread(target=self._report_stage, name="import-report", daemon=True,
+                                        args=(report, uploads, inserts, started, finished))
+            for thread in stages:
+                thread.start()
+            reporter.start()
+            try:
+                self._insert_stage(inserts, checkpoint, report)
+            except BaseException as e:
+                self._fail(e)
+            finally:
+                self._stop.set()
+                for thread in stages:
+                    thread.join()
+                finished.set()
+                reporter.join()
+                dead_letter.close()
+                if self._failure is not None:
+                    self._discard_uploaded(inserts)
+
+        report.elapsed_seconds = time.monotonic() - started
+        if self._failure is not None:
+            logger.error(f"Catalog import of {csv_path} failed after row {checkpoint.watermark}: "
+                         f"{str(self._failure)}")
+            raise self._failure
+        checkpoint.complete = True
+        checkpoint.save()
+        self.emit(f"[import] done: {report.rows_imported} rows imported ({report.rows_per_second:.1f}/s), "
+                  f"{report.images_uploaded} images ({report.images_per_second:.1f}/s), "
+                  f"{report.rows_rejected} rejected, {report.rows_skipped} skipped from checkpoint")
+        return report
+
+    def _fail(self, error: BaseException):
+        with self._lock:
+            if self._failure is None:
+                self._failure = error
+        self._stop.set()
+
+    def _put(self, q: queue.Queue, item: Any):
+        """Blocking put that gives up once the pipeline is aborted"""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise ImportAborted()
+
+    def _get(self, q: queue.Queue, timeout: Optional[float] = None) -> Any:
+        """Blocking get that gives up once the pipeline is aborted; None on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if deadline is not None and time.monotonic() >= deadline:
+                    return None
+        raise ImportAborted()
+
+    def _reject(self, row_number: int, raw: Dict[str, str], error: str, checkpoint: ImportCheckpoint,
+                dead_letter: DeadLetterFile, report: ImportReport):
+        dead_letter.write(row_number, raw, error)
+        with self._lock:
+            report.rows_rejected += 1
+            checkpoint.mark_done([row_number])
+
+    def _parse_stage(self, reader: csv.DictReader, image_dir: str, checkpoint: ImportCheckpoint,
+                     dead_letter: DeadLetterFile, uploads: queue.Queue, report: ImportReport):
+        try:
+            for row_number, raw in enumerate(reader, start=1):
+                if checkpoint.is_done(row_number):
+                    with self._lock:
+                        report.rows_skipped += 1
+                    continue
+                report.rows_read += 1
+                try:
+                    row = self._validate(row_number, raw, image_dir)
+                except RowRejected as e:
+                    self._reject(row_number, raw, str(e), checkpoint, dead_letter, report)
+                    continue
+                self._put(uploads, row)
+            for _ in range(self.upload_workers):
+                self._put(uploads, _DONE)
+        except ImportAborted:
+            pass
+        except Exception as e:
+            self._fail(e)
+
+    def _validate(self, row_number: int, raw: Dict[str, str], image_dir: str) -> ImportRow:
+        name = (raw.get("name") or "").strip()
+        if not name:
+            raise RowRejected("name is empty")
+        if len(name) > MAX_NAME_LENGTH:
+            raise RowRejected(f"name is longer than {MAX_NAME_LENGTH} characters")
+        price_text = (raw.get("price") or "").strip()
+        try:
+            price = float(price_text)
+        except ValueError:
+            raise RowRejected(f"price {price_text!r} is not a number") from None
+        if not math.isfinite(price) or price < 0 or price >= MAX_PRICE:
+            raise RowRejected(f"price {price_text} is out of range")
+        row = ImportRow(row_number=row_number, raw=raw, name=name,
+                        description=(raw.get("description") or "").strip(), price=round(price, 2))
+
+        image = (raw.get("image") or "").strip()
+        if image:
+            image_path = os.path.realpath(os.path.join(image_dir, image))
+            if os.path.commonpath([image_path, image_dir]) != image_dir:
+                raise RowRejected(f"image {image} is outside the image directory")
+            if not os.path.isfile(image_path):
+                raise RowRejected(f"image {image} not found")
+            content_type = mimetypes.guess_type(image_path)[0]
+            if content_type not in self.blob_manager.ALLOWED_UPLOAD_TYPES:
+                raise RowRejected(f"image {image} has unsupported type {content_type}")
+            if os.path.getsize(image_path) > self.blob_manager.MAX_UPLOAD_BYTES:
+                raise RowRejected(f"image {image} is larger than {self.blob_manager.MAX_UPLOAD_BYTES} bytes")
+            row.image_path, row.content_type = image_path, content_type
+        return row
+
+    def _upload_stage(self, uploads: queue.Queue, inserts: queue.Queue, checkpoint: ImportCheckpoint,
+                      dead_letter: DeadLetterFile, report: ImportReport):
+        try:
+            while True:
+                row = self._get(uploads)
+                if row is _DONE:
+                    self._put(inserts, _DONE)
+                    return
+                if row.image_path:
+                    try:
+                        row.image_url = self.blob_manager.upload_image(0, row.image_path, row.content_type)
+                    except Exception as e:
+                        self._reject(row.row_number, row.raw, f"image upload failed: {str(e)}",
+                                     checkpoint, dead_letter, report)
+                        continue
+                    with self._lock:
+                        report.images_uploaded += 1
+                try:
+                    self._put(inserts, row)
+                except ImportAborted:
+                    self._discard_images([row])
+                    raise
+        except ImportAborted:
+            pass
+        except Exception as e:
+            self._fail(e)
+
+    def _insert_stage(self, inserts: queue.Queue, checkpoint: ImportCheckpoint, report: ImportReport):
+        batch: List[ImportRow] = []
+        running_uploaders = self.upload_workers
+        while running_uploaders:
+            # A partial batch is flushed when uploads pause, so slow images don't hold rows back
+            item = self._get(inserts, timeout=self.flush_interval)
+            if item is _DONE:
+                running_uploaders -= 1
+            elif item is not None:
+                batch.append(item)
+            if len(batch) >= self.batch_size or (batch and item is None):
+                self._insert_batch(batch, checkpoint, report)
+                batch = []
+        if batch:
+            self._insert_batch(batch, checkpoint, report)
+        if self._failure is not None:
+            raise ImportAborted()
+
+    def _insert_batch(self, batch: List[ImportRow], checkpoint: ImportCheckpoint, report: ImportReport):
+        products = [Product(name=row.name, description=row.description, price=row.price, image_url=row.image_url)
+                    for row in batch]
+        try:
+            results = self.db_manager.import_products(products, [checkpoint.import_key(row.row_number)
+                                                                 for row in batch])
+        except Exception:
+            # The batch rolled back; drop its images so a resumed import uploads them once
+            self._discard_images(batch)
+            raise
+        # Rows an earlier, unrecorded commit already inserted keep their first image
+        self._discard_images([row for row, (_, inserted) in zip(batch, results) if not inserted])
+        added = [(product, product_id) for product, (product_id, inserted) in zip(products, results) if inserted]
+        with self._lock:
+            report.rows_imported += len(added)
+            report.rows_skipped += len(batch) - len(added)
+            report.batches += 1
+            report.product_ids.extend(product_id for _, product_id in added)
+            checkpoint.mark_done([row.row_number for row in batch])
+            checkpoint.save()
+        for product, product_id in added:
+            product.product_id = product_id
+            if self.on_added:
+                self.on_added(product)
+
+    def _discard_uploaded(self, inserts: queue.Queue):
+        """Delete images of rows that were uploaded but will not be inserted"""
+        pending = []
+        while True:
+            try:
+                item = inserts.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _DONE:
+                pending.append(item)
+        self._discard_images(pending)
+
+    def _discard_images(self, rows: List[ImportRow]):
+        for row in rows:
+            if row.image_url:
+                self.blob_manager.delete_image(row.image_url)
+
+    def _report_stage(self, report: ImportReport, uploads: queue.Queue, inserts: queue.Queue,
+                      started: float, finished: threading.Event):
+        last_rows, last_images, last_time = 0, 0, started
+        while not finished.wait(self.report_interval):
+            now = time.monotonic()
+            with self._lock:
+                rows, images, rejected = report.rows_imported, report.images_uploaded, report.rows_rejected
+            interval = max(now - last_time, 1e-9)
+            self.emit(f"[import {now - started:6.1f}s] {rows} rows ({(rows - last_rows) / interval:.1f}/s), "
+                      f"{images} images ({(images - last_images) / interval:.1f}/s), {rejected} rejected, "
+                      f"queued: {uploads.qsize()} to upload, {inserts.qsize()} to insert")
+            last_rows, last_images, last_time = rows, images, now
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Import a supplier product CSV and its images")
+    parser.add_argument("csv_path", help="CSV with name, price and optional description and image columns")
+    parser.add_argument("image_dir", help="directory the image column is relative to")
+    parser.add_argument("--backend", choices=("azure", "local", "mock"), default="azure",
+                        help="real Azure settings from the environment, local SQLite/filesystem stand-ins, or mock mode")
+    parser.add_argument("--data-dir", default="local-data", help="directory for the local backend")
+    parser.add_argument("--upload-workers", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--report-interval", type=float, default=5.0, help="seconds between progress reports")
+    parser.add_argument("--restart", action="store_true",
+                        help="ignore an existing checkpoint and start a new dead-letter file")
+    args = parser.parse_args(argv)
+
+    # app configures INFO logging on import; progress lines are enough here
+    logging.basicConfig(level=logging.WARNING, force=True)
+    from app import ECommerceSystem
+    if args.backend == "azure":
+        system = ECommerceSystem()
+    elif args.backend == "mock":
+        system = ECommerceSystem(mock_mode=True)
+    else:
+        from local_backends import create_local_system
+        system = create_local_system(args.data_dir)
+
+    report = system.import_catalog(
+        args.csv_path, args.image_dir, upload_workers=args.upload_workers, batch_size=args.batch_size,
+        report_interval=args.report_interval, resume=not args.restart, emit=print
+    )
+    return 1 if report.rows_rejected else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
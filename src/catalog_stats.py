@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Incrementally maintained catalog statistics for dashboard tiles
+Seeded once from the database, then updated in O(1) per product write
+Author: Gabriel Demetrios Lafis
+"""
+
+import math
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Protocol, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogSource(Protocol):
+    """What CatalogStats needs from a DatabaseManager"""
+
+    def scan_prices(self) -> Iterable[float]: ...
+
+    def list_products(self, limit: int = 50, fields: Any = None) -> List[Any]: ...
+
+
+class PriceHistogram:
+    """Log-scaled price histogram with a bounded relative error.
+
+    Bucket ``i >= 1`` covers ``[min_price * growth**(i-1), min_price * growth**i)``;
+    bucket 0 holds everything below ``min_price``. With the default growth of
+    1.05, quantile estimates are within about 2.5% of the true price.
+    """
+
+    def __init__(self, min_price: float = 0.01, max_price: float = 1e7, growth: float = 1.05):
+        self.min_price = min_price
+        self.growth = growth
+        self._log_growth = math.log(growth)
+        self.counts = [0] * (self._index(max_price) + 1)
+
+    def _index(self, price: float) -> int:
+        if price < self.min_price:
+            return 0
+        return int(math.log(price / self.min_price) / self._log_growth) + 1
+
+    def add(self, price: float, count: int = 1):
+        index = min(self._index(price), len(self.counts) - 1)
+        self.counts[index] += count
+
+    def remove(self, price: float):
+        self.add(price, -1)
+
+    def bucket_bounds(self, index: int):
+        if index == 0:
+            return 0.0, self.min_price
+        return self.min_price * self.growth ** (index - 1), self.min_price * self.growth ** index
+
+    def quantile(self, q: float, total: int) -> Optional[float]:
+        """Estimate the q-quantile by interpolating inside the bucket that contains it"""
+        if total <= 0:
+            return None
+        target = q * total
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count <= 0:
+                continue
+            if seen + count >= target:
+                low, high = self.bucket_bounds(index)
+                return low + (high - low) * ((target - seen) / count)
+            seen += count
+        return self.bucket_bounds(len(self.counts) - 1)[1]
+
+    def lowest_bound(self) -> Optional[float]:
+        for index, count in enumerate(self.counts):
+            if count > 0:
+                return self.bucket_bounds(index)[0]
+        return None
+
+    def highest_bound(self) -> Optional[float]:
+        for index in range(len(self.counts) - 1, -1, -1):
+            if self.counts[index] > 0:
+                return self.bucket_bounds(index)[1]
+        return None
+
+
+class CatalogStats:
+    """Product count, price aggregates, price distribution and newest items.
+
+    ``seed`` scans prices once from the database; afterwards ``on_add``,
+    ``on_update`` and ``on_delete`` adjust the aggregates in constant time.
+    Deleting the current cheapest or most expensive product makes min/max an
+    estimate (the edge of the lowest/highest non-empty bucket) until the next
+    ``reconcile``, which re-seeds from the database and logs any drift.
+
+    Writes reported while a reconcile is scanning are recorded and replayed
+    onto the fresh statistics before they replace the current ones, so they
+    are not lost until the following reconcile.
+    """
+
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, source: CatalogSource, newest_limit: int = 10):
+        self.source = source
+        self.newest_limit = newest_limit
+        self._lock = threading.Lock()
+        self._seed_lock = threading.Lock()
+        # Writes seen while a seed is scanning, as (method, args); None when no seed is running
+        self._pending: Optional[List[Tuple[str, tuple]]] = None
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._reset()
+
+    def _reset(self):
+        self.count = 0
+        self.price_sum = 0.0
+        self.min_price: Optional[float] = None
+        self.max_price: Optional[float] = None
+        self.extremes_exact = True
+        self.histogram = PriceHistogram()
+        self.newest: "deque[Dict[str, Any]]" = deque(maxlen=self.newest_limit)
+        self.seeded_at: Optional[datetime] = None
+        self._snapshot: Optional[Mapping[str, Any]] = None
+
+    def seed(self):
+        """Build the statistics from a full scan of the price column"""
+        with self._seed_lock:
+            with self._lock:
+                self._pending = []
+            try:
+                self._seed()
+            finally:
+                with self._lock:
+                    self._pending = None
+
+    def _seed(self):
+        fresh = CatalogStats(self.source, self.newest_limit)
+        for price in self.source.scan_prices():
+            fresh._add_price(float(price))
+        # The summary projection has every column a tile shows, without descriptions
+        for product in self.source.list_products(self.newest_limit, fields="summary"):
+            fresh.newest.append(self._summary(product))
+        fresh.seeded_at = datetime.now()
+        with self._lock:
+            # A write the scan already saw can be applied twice here; the next reconcile corrects that,
+            # whereas dropping the writes would leave every one of them out until then
+            for method, args in self._pending:
+                getattr(fresh, method)(*args)
+            drift = self.count - fresh.count if self.seeded_at else 0
+            self.count, self.price_sum = fresh.count, fresh.price_sum
+            self.min_price, self.max_price = fresh.min_price, fresh.max_price
+            self.extremes_exact = True
+            self.histogram, self.newest = fresh.histogram, fresh.newest
+            self.seeded_at = fresh.seeded_at
+            self._changed()
+        if drift:
+            logger.warning(f"Catalog stats drifted by {drift} products; reconciled with database")
+        logger.info(f"Catalog stats seeded with {fresh.count} products")
+
+    reconcile = seed
+
+    def on_add(self, product: Any):
+        self._record("_apply_add", product)
+
+    def on_update(self, previous: Any, product: Any):
+        self._record("_apply_update", previous, product)
+
+    def on_delete(self, product: Any):
+        self._record("_apply_delete", product)
+
+    def _record(self, method: str, *args: Any):
+        with self._lock:
+            getattr(self, method)(*args)
+            if self._pending is not None:
+                self._pending.append((method, args))
+
+    def _apply_add(self, product: Any):
+        self._add_price(float(product.price))
+        for item in self.newest:
+            if item["ProductId"] == product.product_id:
+                # Already listed by the seed this write is being replayed onto
+                self.newest.remove(item)
+                break
+        self.newest.appendleft(self._summary(product))
+        self._changed()
+
+    def _apply_update(self, previous: Any, product: Any):
+        self._remove_price(float(previous.price))
+        self._add_price(float(product.price))
+        for index, item in enumerate(self.newest):
+            if item["ProductId"] == product.product_id:
+                self.newest[index] = self._summary(product, created_at=item["CreatedAt"])
+                break
+        self._changed()
+
+    def _apply_delete(self, product: Any):
+        self._remove_price(float(product.price))
+        for item in self.newest:
+            if item["ProductId"] == product.product_id:
+                # The slot stays empty until the next reconcile refills it
+                self.newest.remove(item)
+                break
+        self._changed()
+
+    def snapshot(self) -> Mapping[str, Any]:
+        """Current statistics; built once between writes as a read-only view every caller can share"""
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = MappingProxyType({
+                    "ProductCount": self.count,
+                    "AveragePrice": self.price_sum / self.count if self.count else None,
+                    "MinPrice": self.min_price,
+                    "MaxPrice": self.max_price,
+                    "MinMaxExact": self.extremes_exact,
+                    "PriceQuantiles": MappingProxyType({f"p{int(q * 100)}": self.histogram.quantile(q, self.count)
+                                                        for q in self.QUANTILES}),
+                    "PriceHistogram": tuple(
+                        MappingProxyType({"Low": low, "High": high, "Count": count})
+                        for (low, high), count in (
+                            (self.histogram.bucket_bounds(i), c)
+                            for i, c in enumerate(self.histogram.counts) if c > 0)
+                    ),
+                    "Newest": tuple(MappingProxyType(dict(item)) for item in self.newest),
+                    "SeededAt": self.seeded_at.isoformat() if self.seeded_at else None,
+                })
+            return self._snapshot
+
+    def start(self, reconcile_interval: float = 300.0):
+        """Reconcile against the database periodically in a background thread"""
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+
+        def loop():
+            while not self._stopped.wait(reconcile_interval):
+                try:
+                    self.reconcile()
+                except Exception as e:
+                    logger.error(f"Error reconciling catalog stats: {str(e)}")
+
+        self._thread = threading.Thread(target=loop, name="catalog-stats", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _add_price(self, price: float):
+        self.count += 1
+        self.price_sum += price
+        self.histogram.add(price)
+        if self.min_price is None or price < self.min_price:
+            self.min_price = price
+        if self.max_price is None or price > self.max_price:
+            self.max_price = price
+
+    def _remove_price(self, price: float):
+        self.count -= 1
+        self.price_sum -= price
+        self.histogram.remove(price)
+        if self.count <= 0:
+            self.count, self.price_sum = 0, 0.0
+            self.min_price = self.max_price = None
+            self.extremes_exact = True
+            return
+        if price <= self.min_price:
+            self.min_price = max(self.min_price, self.histogram.lowest_bound())
+            self.extremes_exact = False
+        if price >= self.max_price:
+            self.max_price = min(self.max_price, self.histogram.highest_bound())
+            self.extremes_exact = False
+
+    def _changed(self):
+        self._snapshot = None
+
+    @staticmethod
+    def _summary(product: Any, created_at: Optional[str] = None) -> Dict[str, Any]:
+        if created_at is None:
+            created = getattr(product, "created_at", None) or datetime.now()
+            created_at = created.isoformat()
+        return {
+            "ProductId": product.product_id,
+            "Name": product.name,
+            "Price": float(product.price),
+            "ImageUrl": product.image_url,
+            "CreatedAt": created_at,
+        }
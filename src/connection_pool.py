@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Database connection pool with per-connection prepared statement reuse
+Author: Gabriel Demetrios Lafis
+"""
+
+import time
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sql_statements import Statement
+from query_tracer import QueryTracer, QueryTrace, TracedCursor
+
+# Re-runs a statement on a connection of its own and returns its actual execution plan
+ConnectionPlanCapturer = Callable[[Statement, Sequence[Any]], Optional[str]]
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StatementTiming:
+    """Accumulated timings for one statement.
+
+    The first execution of a statement on a connection includes preparing
+    (compiling) it; later executions on the same connection reuse the prepared
+    handle, so the two are tracked separately.
+    """
+    prepare_count: int = 0
+    prepare_seconds: float = 0.0
+    execute_count: int = 0
+    execute_seconds: float = 0.0
+
+
+class StatementStats:
+    """Thread-safe per-statement timing counters"""
+
+    def __init__(self):
+        self._timings: Dict[str, StatementTiming] = {}
+        self._lock = threading.Lock()
+
+    def record(self, statement_id: str, seconds: float, prepared: bool):
+        with self._lock:
+            timing = self._timings.setdefault(statement_id, StatementTiming())
+            if prepared:
+                timing.prepare_count += 1
+                timing.prepare_seconds += seconds
+            else:
+                timing.execute_count += 1
+                timing.execute_seconds += seconds
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {statement_id: asdict(timing) for statement_id, timing in self._timings.items()}
+
+
+class PooledConnection:
+    """A pooled DB-API connection that keeps one cursor per statement.
+
+    pyodbc re-uses the prepared statement of a cursor when it is executed again
+    with the same SQL text, so pinning a cursor to each statement means every
+    statement is prepared at most once per connection.
+
+    Without MARS, SQL Server allows one open result set per connection, so the
+    unread rest of a statement's results is dropped before the next statement
+    runs and before the connection goes back to the pool.
+    """
+
+    def __init__(self, raw: Any, generation: int, stats: StatementStats,
+                 tracer: Optional[QueryTracer] = None, plan_capturer: Optional[ConnectionPlanCapturer] = None):
+        self.raw = raw
+        self.generation = generation
+        self._stats = stats
+        self._tracer = tracer
+        self._plan_capturer = plan_capturer
+        self._cursors: Dict[str, Any] = {}
+        self._unread: Optional[Any] = None
+        self._open_traces: List[Tuple[QueryTrace, Statement, Sequence[Any]]] = []
+
+    def execute(self, statement: Statement, params: Sequence[Any] = ()) -> Any:
+        """Execute a registered statement and return its cursor"""
+        self.discard_results()
+        cursor = self._cursors.get(statement.statement_id)
+        prepared = cursor is None
+        if prepared:
+            cursor = self.raw.cursor()
+            self._cursors[statement.statement_id] = cursor
+        trace = self._tracer.begin(statement.statement_id, params) if self._tracer else None
+        started = time.perf_counter()
+        try:
+            if params:
+                cursor.execute(statement.sql, tuple(params))
+            else:
+                cursor.execute(statement.sql)
+        except Exception as e:
+            if trace is not None:
+                trace.execute_seconds = time.perf_counter() - started
+                trace.error = type(e).__name__
+                self._tracer.finish(trace)
+            raise
+        self._unread = cursor
+        elapsed = time.perf_counter() - started
+        self._stats.record(statement.statement_id, elapsed, prepared)
+        if trace is None:
+            return cursor
+        trace.execute_seconds = elapsed
+        # Read now: the next execution of this statement reuses the cursor and overwrites it
+        try:
+            trace.rowcount = cursor.rowcount
+        except Exception:
+            trace.rowcount = -1
+        self._open_traces.append((trace, statement, params))
+        return TracedCursor(cursor, trace)
+
+    def discard_results(self):
+        """Skip whatever the last statement's result sets still hold"""
+        cursor, self._unread = self._unread, None
+        # sqlite3 cursors have no nextset and hold nothing on the connection
+        nextset = getattr(cursor, "nextset", None)
+        if nextset is not None:
+            # pyodbc returns a bool; anything else (a mock, say) is not treated as another result set
+            while nextset() is True:
+                pass
+
+    def end_traces(self, error: Optional[BaseException] = None):
+        """Finish the traces of statements executed since the connection was checked out"""
+        traces, self._open_traces = self._open_traces, []
+        for trace, statement, params in traces:
+            if error is not None:
+                trace.error = type(error).__name__
+            capturer = None
+            if self._plan_capturer is not None and error is None:
+                capturer = lambda p, statement=statement: self._plan_capturer(statement, p)
+            self._tracer.finish(trace, plan_capturer=capturer, params=params)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        for cursor in self._cursors.values():
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        self._cursors.clear()
+        try:
+            self.raw.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Bounded pool of PooledConnection objects.
+
+    ``reset`` swaps the connect function (for example after a connection string
+    rotation); idle connections are closed immediately and connections that are
+    checked out are closed when they are returned.
+    """
+
+    def __init__(self, connect: Callable[[], Any], max_size: int = 10, acquire_timeout: float = 30.0,
+                 tracer: Optional[QueryTracer] = None, plan_capturer: Optional[ConnectionPlanCapturer] = None):
+        self._connect = connect
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.stats = StatementStats()
+        self.tracer = tracer
+        self.plan_capturer = plan_capturer
+        self._idle: "queue.LifoQueue[PooledConnection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self) -> Iterator[PooledConnection]:
+        """Check out a connection; it is discarded instead of returned if the block raises.
+
+        That includes GeneratorExit, so a generator holding a connection that is
+        closed before it is exhausted gives its slot back.
+        """
+        conn = self._acquire()
+        try:
+            yield conn
+        except BaseException as e:
+            if self.tracer:
+                conn.end_traces(error=e)
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            self._discard(conn)
+            raise
+        else:
+            try:
+                if self.tracer:
+                    conn.end_traces()
+            finally:
+                self._release(conn)
+
+    def reset(self, connect: Optional[Callable[[], Any]] = None):
+        """Drop all pooled connections, optionally switching to a new connect function"""
+        with self._lock:
+            if connect is not None:
+                self._connect = connect
+            self._generation += 1
+        self._drain()
+
+    def close(self):
+        self.reset()
+
+    def _acquire(self) -> PooledConnection:
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError(f"No database connection available after {self.acquire_timeout}s")
+        try:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                if conn.generation == self._generation:
+                    return conn
+                conn.close()
+            with self._lock:
+                connect, generation = self._connect, self._generation
+            return PooledConnection(connect(), generation, self.stats, self.tracer, self.plan_capturer)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, conn: PooledConnection):
+        if conn.generation == self._generation and self._discard_results(conn):
+            self._idle.put(conn)
+        else:
+            conn.close()
+        self._slots.release()
+
+    @staticmethod
+    def _discard_results(conn: PooledConnection) -> bool:
+        try:
+            conn.discard_results()
+            return True
+        except Exception as e:
+            logger.warning(f"Closing a connection whose results could not be discarded: {str(e)}")
+            return False
+
+    def _discard(self, conn: PooledConnection):
+        conn.close()
+        self._slots.release()
+
+    def _drain(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Local disk cache for product images
+Size-bounded LRU cache with ETag revalidation and memory-mapped reads
+Author: Gabriel Demetrios Lafis
+"""
+
+import os
+import mmap
+import time
+import hashlib
+import tempfile
+import logging
+import itertools
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple, Callable
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory file locks
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Called with the cached ETag (or None); returns (data, etag), or None if the cached copy is still current
+ImageFetcher = Callable[[Optional[str]], Optional[Tuple[bytes, str]]]
+
+# Temp files older than this were left by a writer that died before renaming them into place
+STALE_TMP_SECONDS = 3600
+
+
+@dataclass
+class CacheEntry:
+    """Metadata for one cached image file"""
+    path: str
+    size: int
+    etag: str
+    validated_at: float
+
+
+class ImageCache:
+    """Disk-backed LRU cache of image bytes.
+
+    Entries are revalidated against the origin with their ETag once they are
+    older than ``revalidate_after`` seconds; an unchanged image costs one
+    conditional request and no download. Cached files are handed out as
+    read-only memory maps, so repeated reads never copy the whole file; byte
+    ranges are read straight from the file.
+
+    The index and ``max_bytes`` are per process, so each process caches in a
+    ``worker-<n>`` subdirectory of ``cache_dir`` that it holds a lock on; a
+    restarted process takes over a free one, files included. With N processes
+    the cache can use N x ``max_bytes`` of disk.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 * 1024,
+                 revalidate_after: float = 60.0):
+        self.max_bytes = max_bytes
+        self.revalidate_after = revalidate_after
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._dir_lock = None
+        self.cache_dir = self._claim_dir(cache_dir)
+        self._load_existing()
+
+    def close(self):
+        """Release the cache directory for the next process; cached files stay"""
+        if self._dir_lock is not None:
+            self._dir_lock.close()
+            self._dir_lock = None
+
+    def _claim_dir(self, root: str) -> str:
+        """A subdirectory of root that no other live process is using"""
+        if fcntl is None:
+            path = os.path.join(root, f"pid-{os.getpid()}")
+            os.makedirs(path, exist_ok=True)
+            return path
+        for slot in itertools.count():
+            path = os.path.join(root, f"worker-{slot}")
+            os.makedirs(path, exist_ok=True)
+            lock = open(os.path.join(path, ".lock"), 'a')
+            try:
+                # Released when the process exits, however it exits
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock.close()
+                continue
+            self._dir_lock = lock
+            return path
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def open(self, key: str, fetch: ImageFetcher) -> mmap.mmap:
+        """Return a read-only memory map of the image, downloading or revalidating as needed"""
+        with self._open_file(key, fetch) as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read_range(self, key: str, start: int, end: Optional[int], fetch: ImageFetcher) -> bytes:
+        """Return bytes [start, end) of the image; end=None reads to the end of the file"""
+        if start < 0 or (end is not None and end < start):
+            raise ValueError(f"Invalid byte range {start}-{end}")
+        with self._open_file(key, fetch) as f:
+            f.seek(start)
+            return f.read() if end is None else f.read(end - start)
+
+    def _open_file(self, key: str, fetch: ImageFetcher):
+        entry = self._ensure(key, fetch)
+        try:
+            return open(entry.path, 'rb')
+        except FileNotFoundError:
+            # Evicted by another thread between lookup and open
+            self.invalidate(key)
+            return open(self._ensure(key, fetch).path, 'rb')
+
+    def invalidate(self, key: str):
+        """Drop an image from the cache"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry:
+                self._total_bytes -= entry.size
+        if entry:
+            self._remove_files(entry.path)
+
+    def _ensure(self, key: str, fetch: ImageFetcher) -> CacheEntry:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+                if time.time() - entry.validated_at < self.revalidate_after:
+                    return entry
+
+        result = fetch(entry.etag if entry else None)
+        if result is None:
+            if entry is None:
+                raise ValueError(f"Origin returned no content for {key}")
+            entry.validated_at = time.time()
+            return entry
+
+        data, etag = result
+        if not data:
+            raise ValueError(f"Image {key} is empty")
+        return self._store(key, data, etag)
+
+    def _store(self, key: str, data: bytes, etag: str) -> CacheEntry:
+        name = hashlib.sha256(key.encode()).hexdigest()
+        path = os.path.join(self.cache_dir, name)
+        data_tmp = self._write_tmp(name, data)
+        etag_tmp = self._write_tmp(name, f"{etag}\n{key}".encode())
+        # Readers holding a map of the old file keep their view; new opens see the new file
+        os.replace(etag_tmp, path + ".etag")
+        os.replace(data_tmp, path + ".bin")
+
+        entry = CacheEntry(path=path + ".bin", size=len(data), etag=etag, validated_at=time.time())
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous:
+                self._total_bytes -= previous.size
+            self._entries[key] = entry
+            self._total_bytes += entry.size
+            evicted = self._evict()
+        for old in evicted:
+            self._remove_files(old.path)
+        return entry
+
+    def _write_tmp(self, name: str, data: bytes) -> str:
+        """Write to a uniquely named temp file in the cache directory, safe across threads and processes"""
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{name}.", suffix=".tmp", dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return tmp_path
+
+    def _evict(self):
+        evicted = []
+        # Never evict the most recent entry, even if it alone exceeds the budget
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, entry = self._entries.popitem(last=False)
+            self._total_bytes -= entry.size
+            evicted.append(entry)
+            logger.info(f"Evicted cached image {key} ({entry.size} bytes)")
+        return evicted
+
+    @staticmethod
+    def _remove_files(path: str):
+        for stale in (path, path[:-len(".bin")] + ".etag"):
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+    def _load_existing(self):
+        """Rebuild the index from files left by a previous process, oldest first"""
+        found = []
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith(".tmp"):
+                self._remove_stale_tmp(path, now)
+                continue
+            if not name.endswith(".bin"):
+                continue
+            try:
+                with open(path[:-len(".bin")] + ".etag") as f:
+                    etag, key = f.read().split("\n", 1)
+                stat = os.stat(path)
+            except (OSError, ValueError):
+                self._remove_files(path)
+                continue
+            # validated_at=0 forces revalidation on first use
+            found.append((stat.st_mtime, key, CacheEntry(path=path, size=stat.st_size, etag=etag, validated_at=0.0)))
+        for _, key, entry in sorted(found, key=lambda item: item[0]):
+            self._entries[key] = entry
+            self._total_bytes += entry.size
+        for old in self._evict():
+            self._remove_files(old.path)
+
+    @staticmethod
+    def _remove_stale_tmp(path: str, now: float):
+        # Recent temp files may belong to another process that is still writing them
+        try:
+            if now - os.stat(path).st_mtime > STALE_TMP_SECONDS:
+                os.remove(path)
+                logger.info(f"Removed stale image cache temp file {path}")
+        except OSError:
+            pass
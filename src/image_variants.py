@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Responsive image variants for product images
+Resizes uploads into thumbnail and medium JPEG/WebP copies stored next to the original
+Author: Gabriel Demetrios Lafis
+"""
+
+import io
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it uploads keep only the original
+    Image = None
+    ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+# Blob names are unique per upload and never rewritten, so browsers and CDNs may cache them for good
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# The original of an image with variants is stored as "<folder>/original<ext>"
+ORIGINAL_STEM = "original"
+
+
+@dataclass(frozen=True)
+class VariantSpec:
+    """One resized copy: fits within max_size x max_size, never upscaled"""
+    name: str
+    filename: str
+    max_size: int
+    format: str
+    content_type: str
+    quality: int
+
+
+VARIANTS: Tuple[VariantSpec, ...] = (
+    VariantSpec("thumb", "thumb.jpg", 240, "JPEG", "image/jpeg", 80),
+    VariantSpec("medium", "medium.jpg", 800, "JPEG", "image/jpeg", 85),
+    VariantSpec("thumb_webp", "thumb.webp", 240, "WEBP", "image/webp", 80),
+    VariantSpec("medium_webp", "medium.webp", 800, "WEBP", "image/webp", 80),
+)
+
+
+def variants_available() -> bool:
+    return Image is not None
+
+
+def is_image(data: bytes) -> bool:
+    """Whether Pillow recognizes the data as an image; only parses the header"""
+    try:
+        with Image.open(io.BytesIO(data)):
+            return True
+    except Exception:
+        return False
+
+
+def render_variants(data: bytes, specs: Tuple[VariantSpec, ...] = VARIANTS) -> Dict[str, bytes]:
+    """Encode every variant of an image; runs in a worker process because resizing is CPU-bound"""
+    rendered = {}
+    with Image.open(io.BytesIO(data)) as source:
+        # Apply the camera's orientation so thumbnails are not sideways
+        image = ImageOps.exif_transpose(source)
+        for spec in specs:
+            variant = image.copy()
+            variant.thumbnail((spec.max_size, spec.max_size), Image.LANCZOS)
+            if spec.format == "JPEG" and variant.mode not in ("RGB", "L"):
+                variant = variant.convert("RGB")
+            buffer = io.BytesIO()
+            variant.save(buffer, spec.format, quality=spec.quality)
+            rendered[spec.name] = buffer.getvalue()
+    return rendered
+
+
+def variant_folder(blob_name: str) -> Optional[str]:
+    """Folder holding an image's variants, or None for images stored without them"""
+    folder, _, filename = blob_name.rpartition("/")
+    if folder and filename.rsplit(".", 1)[0] == ORIGINAL_STEM:
+        return folder
+    return None
+
+
+def variant_blob_names(original_blob_name: str) -> Dict[str, str]:
+    """Deterministic blob name of every variant of an original stored as <folder>/original<ext>"""
+    folder = variant_folder(original_blob_name)
+    if folder is None:
+        return {}
+    return {spec.name: f"{folder}/{spec.filename}" for spec in VARIANTS}
+
+
+def variant_urls(image_url: str) -> Dict[str, str]:
+    """Variant URLs derived from the original image URL; empty for images stored without variants"""
+    if not image_url:
+        return {}
+    path = urlsplit(image_url).path
+    if variant_folder(path) is None:
+        return {}
+    base = image_url.split("?")[0].rsplit("/", 1)[0]
+    return {spec.name: f"{base}/{spec.filename}" for spec in VARIANTS}
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Workload generator and load-test CLI for the E-Commerce system
+Drives ECommerceSystem with a configurable operation mix, key distribution and rate
+Author: Gabriel Demetrios Lafis
+"""
+
+import sys
+import math
+import time
+import json
+import queue
+import random
+import bisect
+import logging
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Preset operation mixes; weights are relative
+MIXES: Dict[str, Dict[str, float]] = {
+    "browse": {"get": 65, "list": 25, "multiget": 8, "reprice": 2},
+    "import": {"add": 90, "get": 10},
+    "reprice": {"reprice": 80, "get": 20},
+}
+OPERATIONS = ("get", "list", "multiget", "add", "reprice")
+
+
+@dataclass
+class LoadTestConfig:
+    """Settings shared by every worker; must stay picklable for process mode"""
+    backend: str = "local"
+    data_dir: str = ""
+    mix: Dict[str, float] = field(default_factory=lambda: dict(MIXES["browse"]))
+    distribution: str = "uniform"
+    zipf_s: float = 1.1
+    concurrency: int = 4
+    mode: str = "threads"
+    rate: float = 0.0
+    duration: float = 30.0
+    report_interval: float = 5.0
+    seed_products: int = 1000
+    page_size: int = 50
+    multiget_size: int = 20
+    product_ids: List[int] = field(default_factory=list)
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """Parse a preset name ("browse") or explicit weights ("get=70,list=30")"""
+    if text in MIXES:
+        return dict(MIXES[text])
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS or not weight:
+            raise argparse.ArgumentTypeError(f"Invalid operation weight '{part}'; operations: {', '.join(OPERATIONS)}")
+        mix[name] = float(weight)
+    if not mix or sum(mix.values()) <= 0:
+        raise argparse.ArgumentTypeError("Operation mix needs at least one positive weight")
+    return mix
+
+
+class KeyChooser:
+    """Picks product IDs uniformly or with a Zipf skew (rank 1 is the hottest key)"""
+
+    def __init__(self, keys: List[int], distribution: str = "uniform", s: float = 1.1,
+                 rng: Optional[random.Random] = None):
+        if not keys:
+            raise ValueError("Key chooser needs at least one key")
+        self.keys = list(keys)
+        self.rng = rng or random.Random()
+        self._cdf: Optional[List[float]] = None
+        if distribution == "zipf":
+            weights = [1.0 / (rank ** s) for rank in range(1, len(self.keys) + 1)]
+            total = sum(weights)
+            running, self._cdf = 0.0, []
+            for weight in weights:
+                running += weight / total
+                self._cdf.append(running)
+        elif distribution != "uniform":
+            raise ValueError(f"Unknown key distribution: {distribution}")
+
+    def choose(self) -> int:
+        if self._cdf is None:
+            return self.rng.choice(self.keys)
+        index = bisect.bisect_left(self._cdf, self.rng.random())
+        return self.keys[min(index, len(self.keys) - 1)]
+
+    def add(self, key: int):
+        """New keys join uniformly; the Zipf ranking keeps the seeded keys"""
+        if self._cdf is None:
+            self.keys.append(key)
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def build_system(config: LoadTestConfig):
+    """Create an ECommerceSystem for the configured backend"""
+    from app import ECommerceSystem
+    if config.backend == "azure":
+        return ECommerceSystem()
+    if config.backend == "mock":
+        return ECommerceSystem(mock_mode=True)
+    from local_backends import create_local_system
+    return create_local_system(config.data_dir)
+
+
+class Workload:
+    """Executes one randomly chosen operation against the system"""
+
+    def __init__(self, system: Any, config: LoadTestConfig, rng: random.Random):
+        self.system = system
+        self.config = config
+        self.rng = rng
+        self.keys = KeyChooser(config.product_ids or [1], config.distribution, config.zipf_s, rng)
+        self.names = list(config.mix)
+        self.cum_weights = []
+        running = 0.0
+        for name in self.names:
+            running += config.mix[name]
+            self.cum_weights.append(running)
+
+    def choose(self) -> str:
+        return self.rng.choices(self.names, cum_weights=self.cum_weights)[0]
+
+    def run(self, operation: str):
+        getattr(self, f"op_{operation}")()
+
+    def op_get(self):
+        self.system.get_product_dict(self.keys.choose())
+
+    def op_list(self):
+        self.system.list_products_dict(self.config.page_size)
+
+    def op_multiget(self):
+        self.system.get_products([self.keys.choose() for _ in range(self.config.multiget_size)])
+
+    def op_add(self):
+        product_id = self.system.add_product(
+            name=f"Load test product {self.rng.randrange(10 ** 9)}",
+            description="Generated by loadtest",
+            price=round(self.rng.uniform(1, 2000), 2)
+        )
+        self.keys.add(product_id)
+
+    def op_reprice(self):
+        product = self.system.get_product(self.keys.choose())
+        if product:
+            product.price = round(max(0.01, product.price * self.rng.uniform(0.9, 1.1)), 2)
+            self.system.update_product(product)
+
+
+def run_worker(config: LoadTestConfig, worker_index: int, results: Any, stop: Any, system: Any = None):
+    """Worker loop shared by thread and process mode; threads share one system, processes build their own.
+
+    Sends (operation, [latency seconds], error count) batches to ``results``.
+    With a target rate, operations are scheduled at fixed intervals and latency
+    is measured from the scheduled start, so a stalled backend shows up as
+    latency instead of silently lowering the offered load.
+    """
+    # No-op in thread mode; keeps app's INFO logging out of worker processes
+    logging.basicConfig(level=logging.WARNING)
+    rng = random.Random(worker_index * 7919 + int(time.time()))
+    workload = Workload(system or build_system(config), config, rng)
+    interval = config.concurrency / config.rate if config.rate > 0 else 0.0
+    next_start = time.perf_counter() + rng.uniform(0, interval)
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    last_flush = time.perf_counter()
+
+    while not stop.is_set():
+        if interval:
+            delay = next_start - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            scheduled, next_start = next_start, next_start + interval
+        else:
+            scheduled = time.perf_counter()
+        operation = workload.choose()
+        try:
+            workload.run(operation)
+            latencies.setdefault(operation, []).append(time.perf_counter() - scheduled)
+        except Exception as e:
+            errors[operation] = errors.get(operation, 0) + 1
+            logger.debug(f"Operation {operation} failed: {str(e)}")
+
+        now = time.perf_counter()
+        if now - last_flush >= 0.5:
+            _flush(results, latencies, errors)
+            latencies, errors, last_flush = {}, {}, now
+    _flush(results, latencies, errors)
+
+
+def _flush(results: Any, latencies: Dict[str, List[float]], errors: Dict[str, int]):
+    for operation in set(latencies) | set(errors):
+        results.put((operation, latencies.get(operation, []), errors.get(operation, 0)))
+
+
+@dataclass
+class OperationReport:
+    """Throughput and latency of one operation over one reporting window"""
+    operation: str
+    count: int
+    errors: int
+    throughput: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+
+
+def summarize(samples: Dict[str, List[float]], errors: Dict[str, int], seconds: float) -> List[OperationReport]:
+    reports = []
+    for operation in sorted(set(samples) | set(errors)):
+        values = sorted(samples.get(operation, []))
+        reports.append(OperationReport(
+            operation=operation,
+            count=len(values),
+            errors=errors.get(operation, 0),
+            throughput=len(values) / seconds if seconds > 0 else 0.0,
+            p50_ms=percentile(values, 0.50) * 1000,
+            p95_ms=percentile(values, 0.95) * 1000,
+            p99_ms=percentile(values, 0.99) * 1000,
+            max_ms=(values[-1] * 1000) if values else 0.0,
+        ))
+    return reports
+
+
+def format_reports(label: str, reports: List[OperationReport]) -> str:
+    lines = [f"[{label}]",
+             f"  {'operation':<10}{'ops':>8}{'err':>6}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+    for r in reports:
+        lines.append(f"  {r.operation:<10}{r.count:>8}{r.errors:>6}{r.throughput:>10.1f}"
+                     f"{r.p50_ms:>10.2f}{r.p95_ms:>10.2f}{r.p99_ms:>10.2f}{r.max_ms:>10.2f}")
+    return "\n".join(lines)
+
+
+def seed_catalog(config: LoadTestConfig, system: Any) -> List[int]:
+    """Make sure the catalog has products to read, returning the IDs to use as keys"""
+    existing = [p.product_id for p in system.list_products(max(config.seed_products, 1))]
+    missing = config.seed_products - len(existing)
+    for i in range(max(0, missing)):
+        existing.append(system.add_product(
+            name=f"Seed product {i}", description="Seeded by loadtest", price=round(random.uniform(1, 2000), 2)))
+    return existing
+
+
+def run_load_test(config: LoadTestConfig, emit: Callable[[str], None] = print, as_json: bool = False
+                  ) -> List[OperationReport]:
+    """Run the configured workload and return the whole-run summary"""
+    if config.backend == "local" and not config.data_dir:
+        config.data_dir = tempfile.mkdtemp(prefix="ecommerce-loadtest-")
+    system = build_system(config)
+    config.product_ids = seed_catalog(config, system)
+    emit(f"Seeded {len(config.product_ids)} products; running {config.concurrency} {config.mode} "
+         f"for {config.duration:.0f}s against the {config.backend} backend")
+
+    if config.mode == "processes":
+        ctx = multiprocessing.get_context("spawn")
+        results, stop = ctx.Queue(), ctx.Event()
+        workers = [ctx.Process(target=run_worker, args=(config, i, results, stop), daemon=True)
+                   for i in range(config.concurrency)]
+    else:
+        results, stop = queue.Queue(), threading.Event()
+        workers = [threading.Thread(target=run_worker, args=(config, i, results, stop, system), daemon=True)
+                   for i in range(config.concurrency)]
+
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+
+    total_samples: Dict[str, List[float]] = {}
+    total_errors: Dict[str, int] = {}
+    window_samples: Dict[str, List[float]] = {}
+    window_errors: Dict[str, int] = {}
+    window_started = started
+    deadline = started + config.duration
+
+    def drain(timeout: float):
+        try:
+            operation, latencies, errors = results.get(timeout=timeout)
+        except queue.Empty:
+            return
+        for target_samples, target_errors in ((window_samples, window_errors), (total_samples, total_errors)):
+            target_samples.setdefault(operation, []).extend(latencies)
+            target_errors[operation] = target_errors.get(operation, 0) + errors
+
+    def report_window(now: float):
+        nonlocal window_samples, window_errors, window_started
+        reports = summarize(window_samples, window_errors, now - window_started)
+        if as_json:
+            emit(json.dumps({"elapsed": round(now - started, 1), "operations": [asdict(r) for r in reports]}))
+        else:
+            emit(format_reports(f"t={now - started:6.1f}s", reports))
+        window_samples, window_errors, window_started = {}, {}, now
+
+    while time.perf_counter() < deadline:
+        drain(timeout=0.1)
+        now = time.perf_counter()
+        if now - window_started >= config.report_interval:
+            report_window(now)
+
+    stop.set()
+    for worker in workers:
+        worker.join(timeout=30)
+    elapsed = time.perf_counter() - started
+    # Collect what workers flushed on their way out
+    while True:
+        try:
+            operation, latencies, errors = results.get(timeout=0.2)
+        except queue.Empty:
+            break
+        total_samples.setdefault(operation, []).extend(latencies)
+        total_errors[operation] = total_errors.get(operation, 0) + errors
+
+    summary = summarize(total_samples, total_errors, elapsed)
+    if as_json:
+        emit(json.dumps({"summary": True, "elapsed": round(elapsed, 1), "operations": [asdict(r) for r in summary]}))
+    else:
+        emit(format_reports(f"total {elapsed:.1f}s", summary))
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the E-Commerce system")
+    parser.add_argument("--backend", choices=("local", "azure", "mock"), default="local",
+                        help="local SQLite/filesystem stand-ins, real Azure settings from the environment, or mock mode")
+    parser.add_argument("--data-dir", default="", help="directory for the local backend (default: a new temp dir)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("browse"),
+                        help=f"preset ({', '.join(MIXES)}) or weights such as get=70,list=20,reprice=10")
+    parser.add_argument("--distribution", choices=("uniform", "zipf"), default="uniform")
+    parser.add_argument("--zipf-s", type=float, default=1.1, help="Zipf exponent; higher is more skewed")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--mode", choices=("threads", "processes"), default="threads")
+    parser.add_argument("--rate", type=float, default=0.0, help="target total ops/sec; 0 runs closed-loop")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--report-interval", type=float, default=5.0, help="seconds between reports")
+    parser.add_argument("--seed-products", type=int, default=1000, help="minimum catalog size before the run")
+    parser.add_argument("--json", action="store_true", help="emit one JSON object per report")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    config = LoadTestConfig(
+        backend=args.backend, data_dir=args.data_dir, mix=args.mix, distribution=args.distribution,
+        zipf_s=args.zipf_s, concurrency=args.concurrency, mode=args.mode, rate=args.rate,
+        duration=args.duration, report_interval=args.report_interval, seed_products=args.seed_products
+    )
+    summary = run_load_test(config, as_json=args.json)
+    return 1 if any(r.errors for r in summary) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Local stand-in backends for development and tests
+Filesystem-backed Blob Storage client and SQLite-backed DatabaseManager used instead of Azure
+Author: Gabriel Demetrios Lafis
+"""
+
+import os
+import json
+import base64
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Optional, Any, Dict
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceNotFoundError, ResourceNotModifiedError, ClientAuthenticationError
+from azure.storage.blob import generate_blob_sas
+
+from app import DatabaseManager, BlobStorageManager, ECommerceSystem
+from sql_statements import SQLITE_STATEMENTS
+
+LOCAL_ACCOUNT_NAME = "devstoreaccount1"
+LOCAL_ACCOUNT_KEY = base64.b64encode(b"local-blob-stand-in-account-key!").decode()
+
+
+class LocalBlobDownloader:
+    """Result of LocalBlobClient.download_blob"""
+
+    def __init__(self, data: bytes, properties: SimpleNamespace):
+        self._data = data
+        self.properties = properties
+
+    def readall(self) -> bytes:
+        return self._data
+
+
+class LocalBlobClient:
+    """Stand-in for azure.storage.blob.BlobClient backed by a local directory"""
+
+    def __init__(self, service: "LocalBlobServiceClient", container: str, blob: str):
+        self.service = service
+        self.container_name = container
+        self.blob_name = blob
+        self.url = f"{service.url}/{container}/{blob}"
+        self._path = os.path.join(service.root, container, blob)
+
+    def exists(self) -> bool:
+        return os.path.exists(self._path)
+
+    def upload_blob(self, data: Any, content_settings: Any = None, overwrite: bool = False,
+                    metadata: Optional[Dict[str, str]] = None, **kwargs):
+        if not overwrite and self.exists():
+            raise ValueError(f"Blob {self.blob_name} already exists")
+        payload = data.read() if hasattr(data, "read") else bytes(data)
+        if content_settings is None:
+            settings = {}
+        elif isinstance(content_settings, dict):
+            settings = dict(content_settings)
+        else:
+            settings = {k: v for k, v in vars(content_settings).items() if v is not None}
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        with self.service._lock:
+            with open(self._path, 'wb') as f:
+                f.write(payload)
+            with open(self._path + ".meta", 'w') as f:
+                json.dump({"etag": f'"{hashlib.md5(payload).hexdigest()}"',
+                           "content_settings": settings,
+                           "metadata": metadata or {},
+                           "last_modified": datetime.now(timezone.utc).isoformat()}, f)
+
+    def get_blob_properties(self, **kwargs) -> SimpleNamespace:
+        if not self.exists():
+            raise ResourceNotFoundError(f"Blob {self.blob_name} not found")
+        with open(self._path + ".meta") as f:
+            meta = json.load(f)
+        settings = meta["content_settings"]
+        return SimpleNamespace(
+            name=self.blob_name,
+            size=os.path.getsize(self._path),
+            etag=meta["etag"],
+            last_modified=datetime.fromisoformat(meta["last_modified"]),
+            metadata=meta.get("metadata", {}),
+            content_settings=SimpleNamespace(
+                content_type=settings.get("content_type"),
+                cache_control=settings.get("cache_control")
+            )
+        )
+
+    def set_blob_metadata(self, metadata: Optional[Dict[str, str]] = None, **kwargs):
+        if not self.exists():
+            raise ResourceNotFoundError(f"Blob {self.blob_name} not found")
+        with self.service._lock:
+            with open(self._path + ".meta") as f:
+                meta = json.load(f)
+            meta["metadata"] = dict(metadata or {})
+            meta["last_modified"] = datetime.now(timezone.utc).isoformat()
+            with open(self._path + ".meta", 'w') as f:
+                json.dump(meta, f)
+
+    def download_blob(self, offset: Optional[int] = None, length: Optional[int] = None,
+                      etag: Optional[str] = None, match_condition: Optional[MatchConditions] = None, **kwargs):
+        properties = self.get_blob_properties()
+        if match_condition == MatchConditions.IfModified and etag == properties.etag:
+            raise ResourceNotModifiedError("Not modified")
+        with open(self._path, 'rb') as f:
+            f.seek(offset or 0)
+            data = f.read() if length is None else f.read(length)
+        return LocalBlobDownloader(data, properties)
+
+    def delete_blob(self, **kwargs):
+        if not self.exists():
+            raise ResourceNotFoundError(f"Blob {self.blob_name} not found")
+        os.remove(self._path)
+        os.remove(self._path + ".meta")
+        # Like Azure, a "folder" exists only while some blob name has its prefix
+        folder = os.path.dirname(self._path)
+        container = os.path.join(self.service.root, self.container_name)
+        while folder != container and not os.listdir(folder):
+            os.rmdir(folder)
+            folder = os.path.dirname(folder)
+
+
+class LocalContainerClient:
+    """Stand-in for azure.storage.blob.ContainerClient"""
+
+    def __init__(self, service: "LocalBlobServiceClient", name: str):
+        self.service = service
+        self.container_name = name
+        self._path = os.path.join(service.root, name)
+
+    def exists(self) -> bool:
+        return os.path.isdir(self._path)
+
+    def create_container(self, **kwargs):
+        os.makedirs(self._path, exist_ok=True)
+
+    def list_blobs(self, name_starts_with: Optional[str] = None, **kwargs):
+        names = []
+        for root, _, files in os.walk(self._path):
+            prefix = os.path.relpath(root, self._path).replace(os.sep, "/")
+            names.extend(name if prefix == "." else f"{prefix}/{name}" for name in files)
+        for name in sorted(names):
+            if name.endswith(".meta") or (name_starts_with and not name.startswith(name_starts_with)):
+                continue
+            yield LocalBlobClient(self.service, self.container_name, name).get_blob_properties()
+
+
+class LocalBlobServiceClient:
+    """Stand-in for azure.storage.blob.BlobServiceClient.
+
+    Blob URLs follow the Azurite layout, and SAS tokens are signed with a fixed
+    local account key so the real ``generate_blob_sas`` can be used against it.
+    """
+
+    def __init__(self, root: str, account_name: str = LOCAL_ACCOUNT_NAME, account_key: str = LOCAL_ACCOUNT_KEY):
+        self.root = root
+        self.account_name = account_name
+        self.credential = SimpleNamespace(account_name=account_name, account_key=account_key)
+        self.url = f"http://127.0.0.1:10000/{account_name}"
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def get_container_client(self, container: str) -> LocalContainerClient:
+        return LocalContainerClient(self, container)
+
+    def get_blob_client(self, container: str, blob: str) -> LocalBlobClient:
+        return LocalBlobClient(self, container, blob)
+
+    def upload_with_sas(self, sas_url: str, data: bytes, content_type: str):
+        """Upload the way a browser would with a pre-signed URL, validating the SAS first"""
+        parts = urlsplit(sas_url)
+        _, _, container, blob = parts.path.split("/", 3)
+        params = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        expected = parse_qs(generate_blob_sas(
+            self.account_name, container, unquote(blob),
+            account_key=self.credential.account_key,
+            permission=params.get("sp"),
+            expiry=params.get("se"),
+            start=params.get("st")
+        ))["sig"][0]
+        if params.get("sig") != expected:
+            raise ClientAuthenticationError("SAS signature mismatch")
+        if not set(params.get("sp", "")) & {"c", "w"}:
+            raise ClientAuthenticationError("SAS does not grant write access")
+        expiry = datetime.strptime(params["se"], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+        if expiry < datetime.now(timezone.utc):
+            raise ClientAuthenticationError("SAS has expired")
+        self.get_blob_client(container, unquote(blob)).upload_blob(
+            data, content_settings={"content_type": content_type}, overwrite=True)
+
+
+class LocalDatabaseManager(DatabaseManager):
+    """DatabaseManager backed by a local SQLite file instead of Azure SQL.
+
+    The connection string is the database path; ``:memory:`` is not supported
+    because every pooled connection would get its own empty database.
+    """
+
+    statements = SQLITE_STATEMENTS
+
+    def _connect(self):
+        conn = sqlite3.connect(self.connection_string, timeout=30,
+                               detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _capture_plan(self, statement, params) -> Optional[str]:
+        if not statement.sql.lstrip().upper().startswith("SELECT"):
+            return None
+        raw_conn = self._connect()
+        try:
+            rows = raw_conn.execute(f"EXPLAIN QUERY PLAN {statement.sql}", tuple(params)).fetchall()
+        finally:
+            raw_conn.close()
+        return "\n".join(row[-1] for row in rows)
+
+
+def create_local_system(data_dir: str, container_name: str = "product-images") -> ECommerceSystem:
+    """ECommerceSystem wired to the SQLite and filesystem stand-ins under data_dir"""
+    os.makedirs(data_dir, exist_ok=True)
+    db_manager = LocalDatabaseManager(os.path.join(data_dir, "catalog.db"))
+    blob_manager = BlobStorageManager(
+        "local",
+        container_name=container_name,
+        image_cache_dir=os.path.join(data_dir, "image-cache"),
+        blob_service_client=LocalBlobServiceClient(os.path.join(data_dir, "blobs"))
+    )
+    return ECommerceSystem(db_manager=db_manager, blob_manager=blob_manager)
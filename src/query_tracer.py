@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Query tracing and slow-query logging for database statements
+Records statement id, parameter shapes and timings, never parameter values
+Author: Gabriel Demetrios Lafis
+"""
+
+import json
+import time
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("slow_query")
+
+# Re-runs a statement with the given parameters and returns its actual execution plan
+PlanCapturer = Callable[[Sequence[Any]], Optional[str]]
+
+
+def describe_param(value: Any) -> str:
+    """Describe a parameter by type and size only, e.g. 'str(24)' or 'bytes(1024)'"""
+    type_name = type(value).__name__
+    if isinstance(value, (str, bytes, bytearray)):
+        return f"{type_name}({len(value)})"
+    return type_name
+
+
+@dataclass
+class QueryTrace:
+    """Timings and shape of one statement execution"""
+    statement_id: str
+    param_shapes: List[str]
+    execute_seconds: float = 0.0
+    fetch_seconds: float = 0.0
+    rows_fetched: int = 0
+    rowcount: int = -1
+    error: Optional[str] = None
+    plan: Optional[str] = None
+    started_at: float = field(default_factory=time.time)
+
+    @property
+    def total_seconds(self) -> float:
+        return self.execute_seconds + self.fetch_seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        record = asdict(self)
+        record["total_ms"] = round(self.total_seconds * 1000, 3)
+        record["execute_ms"] = round(record.pop("execute_seconds") * 1000, 3)
+        record["fetch_ms"] = round(record.pop("fetch_seconds") * 1000, 3)
+        return record
+
+
+class TracedCursor:
+    """Cursor proxy that attributes fetch time and fetched rows to a trace"""
+
+    def __init__(self, cursor: Any, trace: QueryTrace):
+        self.cursor = cursor
+        self.trace = trace
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self.cursor.fetchone()
+        self.trace.fetch_seconds += time.perf_counter() - started
+        if row is not None:
+            self.trace.rows_fetched += 1
+        return row
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self.cursor.fetchall()
+        self.trace.fetch_seconds += time.perf_counter() - started
+        self.trace.rows_fetched += len(rows)
+        return rows
+
+    def fetchmany(self, size: int):
+        started = time.perf_counter()
+        rows = self.cursor.fetchmany(size)
+        self.trace.fetch_seconds += time.perf_counter() - started
+        self.trace.rows_fetched += len(rows)
+        return rows
+
+    def __getattr__(self, name: str):
+        return getattr(self.cursor, name)
+
+
+class QueryTracer:
+    """Collects query traces and logs the slow ones.
+
+    Traces over ``slow_threshold_ms`` are written as one JSON object per line
+    to the ``slow_query`` logger and kept in a bounded in-memory ring. A
+    ``plan_sample_rate`` fraction of slow read-only statements is re-run to
+    capture the SQL Server actual execution plan. Plans are captured on a
+    background thread, at most ``max_pending_plans`` at a time, and those
+    traces are logged once their plan is in; requests never wait for them.
+    """
+
+    def __init__(self, slow_threshold_ms: float = 500.0, plan_sample_rate: float = 0.0,
+                 max_recent: int = 100, max_pending_plans: int = 2):
+        self.slow_threshold_ms = slow_threshold_ms
+        self.plan_sample_rate = plan_sample_rate
+        self.max_pending_plans = max_pending_plans
+        self._recent_slow: "deque[QueryTrace]" = deque(maxlen=max_recent)
+        self._lock = threading.Lock()
+        self._plan_executor: Optional[ThreadPoolExecutor] = None
+        self._pending_plans = 0
+        self.traced = 0
+        self.slow = 0
+
+    def begin(self, statement_id: str, params: Sequence[Any]) -> QueryTrace:
+        return QueryTrace(statement_id=statement_id, param_shapes=[describe_param(p) for p in params])
+
+    def finish(self, trace: QueryTrace, rowcount: Optional[int] = None, plan_capturer: Optional[PlanCapturer] = None,
+               params: Sequence[Any] = ()):
+        """Complete a trace; params are only used to re-run the statement for a plan and are not stored"""
+        if rowcount is not None:
+            trace.rowcount = rowcount
+        is_slow = trace.total_seconds * 1000 >= self.slow_threshold_ms
+        with self._lock:
+            self.traced += 1
+            if is_slow:
+                self.slow += 1
+        if not is_slow:
+            return
+
+        if (plan_capturer is not None and trace.error is None and random.random() < self.plan_sample_rate
+                and self._reserve_plan_slot()):
+            self._plan_executor.submit(self._capture_plan, trace, plan_capturer, tuple(params))
+            return
+        self._record_slow(trace)
+
+    def _reserve_plan_slot(self) -> bool:
+        """Claim a background capture; False when enough are already queued, so the plan is skipped"""
+        with self._lock:
+            if self._pending_plans >= self.max_pending_plans:
+                return False
+            self._pending_plans += 1
+            if self._plan_executor is None:
+                self._plan_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="plan-capture")
+            return True
+
+    def _capture_plan(self, trace: QueryTrace, plan_capturer: PlanCapturer, params: Sequence[Any]):
+        try:
+            trace.plan = plan_capturer(params)
+        except Exception as e:
+            logger.warning(f"Could not capture plan for {trace.statement_id}: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending_plans -= 1
+        self._record_slow(trace)
+
+    def _record_slow(self, trace: QueryTrace):
+        with self._lock:
+            self._recent_slow.append(trace)
+        slow_query_logger.warning(json.dumps(trace.to_dict(), default=str))
+
+    def recent_slow(self) -> List[Dict[str, Any]]:
+        """Most recent slow queries, oldest first"""
+        with self._lock:
+            return [trace.to_dict() for trace in self._recent_slow]
+
+    def close(self):
+        """Wait for pending plan captures and stop the background thread"""
+        with self._lock:
+            executor, self._plan_executor = self._plan_executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
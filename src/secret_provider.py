@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Cached secret provider for connection strings
+Resolves secrets from Azure Key Vault or the environment and keeps them warm in memory
+Author: Gabriel Demetrios Lafis
+"""
+
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Optional, Dict, List, Callable
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:  # pragma: no cover - cryptography ships with azure-identity
+    Fernet = None
+    InvalidToken = Exception
+
+logger = logging.getLogger(__name__)
+
+SecretSource = Callable[[str], Optional[str]]
+
+
+def env_source(name: str) -> Optional[str]:
+    """Resolve a secret from the process environment"""
+    return os.getenv(name)
+
+
+@dataclass
+class CachedSecret:
+    """A secret value together with the time it was fetched"""
+    value: str
+    fetched_at: float
+
+
+class SecretProvider:
+    """Process-local secret cache with TTL and background refresh-ahead.
+
+    Only the first lookup of a secret that is neither in memory nor in the
+    encrypted disk cache goes to the sources synchronously. After that, ``get``
+    always answers from memory and a background thread refreshes entries once
+    they reach ``refresh_ahead`` of their TTL. Expired entries keep being served
+    until a refresh succeeds, so request paths never wait on Key Vault.
+    """
+
+    def __init__(self, sources: List[SecretSource], ttl_seconds: float = 300.0,
+                 refresh_ahead: float = 0.8, disk_cache_path: Optional[str] = None,
+                 disk_cache_key: Optional[str] = None):
+        if not sources:
+            raise ValueError("At least one secret source is required.")
+        if not 0 < refresh_ahead <= 1:
+            raise ValueError("refresh_ahead must be in (0, 1].")
+        self.sources = sources
+        self.ttl_seconds = ttl_seconds
+        self.refresh_ahead = refresh_ahead
+        self._cache: Dict[str, CachedSecret] = {}
+        self._subscribers: Dict[str, List[Callable[[str], None]]] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.disk_cache_path = disk_cache_path
+        self._fernet = None
+        if disk_cache_path:
+            if Fernet is None:
+                logger.warning("cryptography is not installed; secret disk cache disabled.")
+            elif not disk_cache_key:
+                logger.warning("No secret cache key configured; secret disk cache disabled.")
+            else:
+                self._fernet = Fernet(disk_cache_key.encode())
+                self._load_disk_cache()
+
+    def get(self, name: str) -> Optional[str]:
+        """Return the cached value of a secret, fetching it only on a cold start"""
+        with self._lock:
+            entry = self._cache.get(name)
+        if entry is not None:
+            if self._age(entry) >= self.ttl_seconds * self.refresh_ahead:
+                self._wakeup.set()
+            return entry.value
+
+        value = self._fetch(name)
+        if value is not None:
+            self._store(name, value)
+        return value
+
+    def subscribe(self, name: str, callback: Callable[[str], None]):
+        """Register a callback invoked with the new value when a secret changes"""
+        with self._lock:
+            self._subscribers.setdefault(name, []).append(callback)
+
+    def refresh(self, name: str) -> bool:
+        """Re-fetch a secret from the sources. Returns True if its value changed."""
+        value = self._fetch(name)
+        if value is None:
+            logger.warning(f"Secret {name} could not be refreshed; keeping cached value")
+            return False
+        with self._lock:
+            previous = self._cache.get(name)
+        self._store(name, value)
+        if previous is not None and previous.value != value:
+            logger.info(f"Secret {name} changed; notifying subscribers")
+            with self._lock:
+                callbacks = list(self._subscribers.get(name, []))
+            for callback in callbacks:
+                try:
+                    callback(value)
+                except Exception as e:
+                    logger.error(f"Error applying rotated secret {name}: {str(e)}")
+            return True
+        return False
+
+    def start(self):
+        """Start the background refresh thread"""
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._refresh_loop, name="secret-refresh", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop the background refresh thread"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _refresh_loop(self):
+        interval = max(1.0, self.ttl_seconds * (1 - self.refresh_ahead))
+        while not self._stopped.is_set():
+            self._wakeup.wait(timeout=interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            with self._lock:
+                due = [name for name, entry in self._cache.items()
+                       if self._age(entry) >= self.ttl_seconds * self.refresh_ahead]
+            for name in due:
+                try:
+                    self.refresh(name)
+                except Exception as e:
+                    logger.error(f"Error refreshing secret {name}: {str(e)}")
+
+    def _fetch(self, name: str) -> Optional[str]:
+        for source in self.sources:
+            try:
+                value = source(name)
+            except Exception as e:
+                logger.warning(f"Secret source failed for {name}: {str(e)}")
+                continue
+            if value:
+                return value
+        return None
+
+    def _store(self, name: str, value: str):
+        with self._lock:
+            self._cache[name] = CachedSecret(value=value, fetched_at=time.time())
+        self._save_disk_cache()
+
+    @staticmethod
+    def _age(entry: CachedSecret) -> float:
+        return time.time() - entry.fetched_at
+
+    def _load_disk_cache(self):
+        if not self._fernet or not os.path.exists(self.disk_cache_path):
+            return
+        try:
+            with open(self.disk_cache_path, 'rb') as f:
+                payload = json.loads(self._fernet.decrypt(f.read()))
+            with self._lock:
+                for name, entry in payload.items():
+                    self._cache[name] = CachedSecret(value=entry["value"], fetched_at=entry["fetched_at"])
+            logger.info(f"Loaded {len(payload)} secrets from disk cache")
+        except (InvalidToken, ValueError, KeyError, OSError) as e:
+            logger.warning(f"Ignoring unreadable secret disk cache: {str(e)}")
+
+    def _save_disk_cache(self):
+        if not self._fernet:
+            return
+        with self._lock:
+            payload = {name: {"value": entry.value, "fetched_at": entry.fetched_at}
+                       for name, entry in self._cache.items()}
+        tmp_path = None
+        try:
+            # A unique owner-only temp file per writer, so processes refreshing at once never share one
+            fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(self.disk_cache_path)}.", suffix=".tmp",
+                                            dir=os.path.dirname(os.path.abspath(self.disk_cache_path)))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self._fernet.encrypt(json.dumps(payload).encode()))
+            os.replace(tmp_path, self.disk_cache_path)
+        except OSError as e:
+            logger.warning(f"Could not write secret disk cache: {str(e)}")
+            if tmp_path:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Shard map for hash-sharded product storage
+Maps ProductId slots to shard databases and reloads the mapping online
+Author: Gabriel Demetrios Lafis
+"""
+
+import os
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ShardConfig:
+    """One shard database.
+
+    ``slot`` is the shard's home slot: every ProductId it allocates satisfies
+    ``product_id % stride == slot``. A shard stops receiving inserts when it is
+    not ``writable`` (e.g. while its slot is being moved to another database).
+
+    ``connection_secret`` names the secret holding the connection string (e.g.
+    SHARD_0_CONNECTION_STRING, resolved through Key Vault like the unsharded
+    one); an inline ``connection_string`` is meant for local development only.
+    """
+    name: str
+    connection_string: str
+    slot: int
+    writable: bool = True
+    connection_secret: Optional[str] = None
+
+
+class ShardMap:
+    """Routes a ProductId to a shard via its slot (ProductId modulo stride).
+
+    ``stride`` is the maximum number of slots and is fixed for the life of the
+    catalog. ``routes`` overrides the owner of a slot; a slot without a route
+    belongs to the shard whose home slot it is.
+    """
+
+    def __init__(self, stride: int, shards: List[ShardConfig], routes: Optional[Dict[int, str]] = None):
+        if stride < 1:
+            raise ValueError("Shard map stride must be at least 1.")
+        if not shards:
+            raise ValueError("Shard map must contain at least one shard.")
+        self.stride = stride
+        self.shards = {shard.name: shard for shard in shards}
+        if len(self.shards) != len(shards):
+            raise ValueError("Shard names must be unique.")
+
+        self.routes: Dict[int, str] = {}
+        for shard in shards:
+            if not 0 <= shard.slot < stride:
+                raise ValueError(f"Shard {shard.name} slot {shard.slot} is outside 0..{stride - 1}.")
+            if not (shard.connection_string or shard.connection_secret):
+                raise ValueError(f"Shard {shard.name} needs a connection_secret or connection_string.")
+            if shard.slot in self.routes:
+                raise ValueError(f"Slot {shard.slot} is the home slot of more than one shard.")
+            self.routes[shard.slot] = shard.name
+        for slot, name in (routes or {}).items():
+            if name not in self.shards:
+                raise ValueError(f"Slot {slot} routes to unknown shard {name}.")
+            self.routes[int(slot)] = name
+
+        if not self.writable_shards():
+            raise ValueError("Shard map must contain at least one writable shard.")
+
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any]) -> "ShardMap":
+        return cls(
+            stride=int(config["stride"]),
+            shards=[ShardConfig(name=s["name"], connection_string=s.get("connection_string", ""),
+                                slot=int(s["slot"]), writable=bool(s.get("writable", True)),
+                                connection_secret=s.get("connection_secret"))
+                    for s in config["shards"]],
+            routes={int(slot): name for slot, name in config.get("routes", {}).items()}
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "ShardMap":
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def slot_for_id(self, product_id: int) -> int:
+        return int(product_id) % self.stride
+
+    def shard_for_id(self, product_id: int) -> str:
+        slot = self.slot_for_id(product_id)
+        try:
+            return self.routes[slot]
+        except KeyError:
+            raise KeyError(f"No shard owns slot {slot} (ProductId {product_id})") from None
+
+    def writable_shards(self) -> List[str]:
+        return [name for name, shard in self.shards.items() if shard.writable]
+
+    def identity_seed(self, shard_name: str) -> int:
+        """First ProductId a shard allocates; IDENTITY seeds must be positive"""
+        slot = self.shards[shard_name].slot
+        return slot if slot > 0 else self.stride
+
+
+class ShardMapWatcher:
+    """Reloads a shard map file when it changes, checking at most every ``check_interval`` seconds.
+
+    An invalid file is logged and ignored so a bad edit never takes routing down.
+    """
+
+    def __init__(self, path: str, check_interval: float = 5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime = os.path.getmtime(path)
+        self._map = ShardMap.load(path)
+        self._next_check = time.monotonic() + check_interval
+
+    def current(self) -> ShardMap:
+        now = time.monotonic()
+        if now < self._next_check:
+            return self._map
+        with self._lock:
+            if now >= self._next_check:
+                self._next_check = now + self.check_interval
+                self._reload_if_changed()
+        return self._map
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+            if mtime == self._mtime:
+                return
+            self._map = ShardMap.load(self.path)
+            self._mtime = mtime
+            logger.info(f"Shard map reloaded from {self.path}")
+        except Exception as e:
+            logger.error(f"Ignoring invalid shard map {self.path}: {str(e)}")
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Node-local cache shared by all worker processes on a host
+Memory-mapped hash table of serialized values with versioned invalidation and ring-buffer eviction
+Author: Gabriel Demetrios Lafis
+"""
+
+import os
+import mmap
+import time
+import fcntl
+import struct
+import hashlib
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SHRCACH1"
+# magic, slot count, stripe count, arena size, head position, tail position
+HEADER = struct.Struct("<8sIIQQQ")
+HEADER_SIZE = 64
+# seq (odd while being written), key hash, version, arena position, expiry (epoch seconds), value length, stripe
+SLOT = struct.Struct("<QQQQdII")
+SEQ = struct.Struct("<Q")
+# Arena record header: owning slot, key length, value length
+RECORD = struct.Struct("<III")
+PADDING = 0xFFFFFFFF
+# Each key hashes to a bucket of this many slots
+WAYS = 4
+
+
+def default_cache_path(name: str = "ecommerce-product-cache") -> str:
+    """A path in shared memory (/dev/shm) when available, otherwise the temp directory"""
+    root = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(root, name)
+
+
+class SharedCache:
+    """Byte-string cache in a memory-mapped file that every process on the host maps.
+
+    Values live in a ring-buffer arena of ``max_bytes``; when it is full the
+    oldest records are overwritten, so memory stays bounded without any
+    bookkeeping per read. Reads take no lock: each slot carries a sequence
+    number that writers make odd while they change it, and a reader that sees
+    it change discards what it copied. Writes are serialized across processes
+    with ``flock``.
+
+    Invalidation is versioned. Every key maps to a version stripe (by default
+    the key's own; related keys can share one ``version_key``). Callers take
+    ``version()`` before loading from the source and pass it to ``put``, which
+    drops the value if ``invalidate`` ran in between, so a slow reader can
+    never re-cache data a writer just replaced. Invalidation only reaches this
+    host; ``ttl`` bounds staleness from writes made on other hosts.
+
+    Open the cache after forking worker processes, or let the first write in a
+    new process reopen the lock descriptor (the mapping itself is shared).
+    """
+
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024, slot_count: int = 65536,
+                 stripe_count: int = 4096, default_ttl: float = 60.0):
+        if slot_count % WAYS:
+            raise ValueError(f"slot_count must be a multiple of {WAYS}")
+        self.path = path
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self._thread_lock = threading.Lock()
+        self._pid = os.getpid()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._write_lock():
+            self._attach(max_bytes, slot_count, stripe_count)
+
+    def _attach(self, arena_size: int, slot_count: int, stripe_count: int):
+        """Map an existing cache file, or initialize it when it is missing or unreadable"""
+        size = os.fstat(self._fd).st_size
+        if size >= HEADER_SIZE:
+            magic, slots, stripes, arena, _, _ = HEADER.unpack(os.pread(self._fd, HEADER.size, 0))
+            if magic == MAGIC and size == self._file_size(slots, stripes, arena):
+                if (slots, stripes, arena) != (slot_count, stripe_count, arena_size):
+                    logger.warning(f"Shared cache {self.path} already exists with a different size; using it as is")
+                self._map(slots, stripes, arena)
+                return
+        os.ftruncate(self._fd, 0)
+        os.ftruncate(self._fd, self._file_size(slot_count, stripe_count, arena_size))
+        os.pwrite(self._fd, HEADER.pack(MAGIC, slot_count, stripe_count, arena_size, 0, 0), 0)
+        self._map(slot_count, stripe_count, arena_size)
+        logger.info(f"Shared cache {self.path} initialized with {arena_size} bytes")
+
+    @staticmethod
+    def _file_size(slot_count: int, stripe_count: int, arena_size: int) -> int:
+        return HEADER_SIZE + 8 * stripe_count + SLOT.size * slot_count + arena_size
+
+    def _map(self, slot_count: int, stripe_count: int, arena_size: int):
+        self.slot_count = slot_count
+        self.stripe_count = stripe_count
+        self.arena_size = arena_size
+        self._stripes_offset = HEADER_SIZE
+        self._slots_offset = self._stripes_offset + 8 * stripe_count
+        self._arena_offset = self._slots_offset + SLOT.size * slot_count
+        self._mm = mmap.mmap(self._fd, self._file_size(slot_count, stripe_count, arena_size))
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[None]:
+        with self._thread_lock:
+            if os.getpid() != self._pid:
+                # flock is per open file description, which a forked child shares with its parent
+                self._fd = os.open(self.path, os.O_RDWR)
+                self._pid = os.getpid()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _hash(data: bytes) -> int:
+        return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+    def _stripe(self, version_key: str) -> int:
+        return self._hash(version_key.encode()) % self.stripe_count
+
+    def _stripe_version(self, stripe: int) -> int:
+        return SEQ.unpack_from(self._mm, self._stripes_offset + 8 * stripe)[0]
+
+    def _slot_offset(self, index: int) -> int:
+        return self._slots_offset + SLOT.size * index
+
+    def _bucket(self, key_hash: int) -> range:
+        start = (key_hash % (self.slot_count // WAYS)) * WAYS
+        return range(start, start + WAYS)
+
+    def version(self, version_key: str) -> int:
+        """Current version of a key's stripe; take it before loading the value from the source"""
+        return self._stripe_version(self._stripe(version_key))
+
+    def get(self, key: str) -> Optional[bytes]:
+        """The cached value, or None if it is missing, invalidated, expired or being rewritten"""
+        key_bytes = key.encode()
+        key_hash = self._hash(key_bytes)
+        for index in self._bucket(key_hash):
+            offset = self._slot_offset(index)
+            seq, slot_hash, version, position, expires_at, length, stripe = SLOT.unpack_from(self._mm, offset)
+            if seq & 1 or slot_hash != key_hash or length == 0:
+                continue
+            if expires_at < time.time() or self._stripe_version(stripe) != version:
+                break
+            record = self._arena_offset + position % self.arena_size
+            _, key_length, value_length = RECORD.unpack_from(self._mm, record)
+            if key_length != len(key_bytes) or value_length != length:
+                break
+            start = record + RECORD.size
+            data = self._mm[start:start + key_length + value_length]
+            # Anything copied while a writer touched the slot may be torn
+            if SEQ.unpack_from(self._mm, offset)[0] != seq or data[:key_length] != key_bytes:
+                break
+            self.hits += 1
+            return data[key_length:]
+        self.misses += 1
+        return None
+
+    def put(self, key: str, value: bytes, version: int, version_key: Optional[str] = None,
+            ttl: Optional[float] = None) -> bool:
+        """Store a value loaded at ``version``; returns False if it was invalidated since or is too large"""
+        key_bytes = key.encode()
+        size = RECORD.size + len(key_bytes) + len(value)
+        if not value or size > self.arena_size // 4:
+            return False
+        key_hash = self._hash(key_bytes)
+        stripe = self._stripe(version_key or key)
+        expires_at = time.time() + (self.default_ttl if ttl is None else ttl)
+        with self._write_lock():
+            if self._stripe_version(stripe) != version:
+                return False
+            index = self._choose_slot(key_hash)
+            position = self._allocate(size)
+            record = self._arena_offset + position % self.arena_size
+            RECORD.pack_into(self._mm, record, index, len(key_bytes), len(value))
+            start = record + RECORD.size
+            self._mm[start:start + len(key_bytes)] = key_bytes
+            self._mm[start + len(key_bytes):start + size - RECORD.size] = value
+            self._write_slot(index, key_hash, version, position, expires_at, len(value), stripe)
+        return True
+
+    def invalidate(self, version_key: str):
+        """Make every value stored under this version key stale in all processes"""
+        stripe = self._stripe(version_key)
+        with self._write_lock():
+            SEQ.pack_into(self._mm, self._stripes_offset + 8 * stripe, self._stripe_version(stripe) + 1)
+
+    def _choose_slot(self, key_hash: int) -> int:
+        """Slot already holding the key, else a free or expired one, else the bucket's oldest"""
+        now = time.time()
+        victim, victim_rank = None, None
+        for index in self._bucket(key_hash):
+            _, slot_hash, _, position, expires_at, length, _ = SLOT.unpack_from(self._mm, self._slot_offset(index))
+            if length and slot_hash == key_hash:
+                return index
+            rank = -1 if not length or expires_at < now else position
+            if victim is None or rank < victim_rank:
+                victim, victim_rank = index, rank
+        return victim
+
+    def _write_slot(self, index: int, key_hash: int, version: int, position: int, expires_at: float,
+                    length: int, stripe: int):
+        offset = self._slot_offset(index)
+        seq = SEQ.unpack_from(self._mm, offset)[0]
+        SEQ.pack_into(self._mm, offset, seq + 1)
+        SLOT.pack_into(self._mm, offset, seq + 1, key_hash, version, position, expires_at, length, stripe)
+        SEQ.pack_into(self._mm, offset, seq + 2)
+
+    def _allocate(self, size: int) -> int:
+        """Reserve ``size`` contiguous arena bytes at the head, evicting the oldest records"""
+        magic, slots, stripes, arena, head, tail = HEADER.unpack_from(self._mm, 0)
+        offset = head % self.arena_size
+        start = head if offset + size <= self.arena_size else head + self.arena_size - offset
+        while tail < start + size - self.arena_size:
+            tail = self._evict(tail)
+        if start != head and self.arena_size - offset >= RECORD.size:
+            RECORD.pack_into(self._mm, self._arena_offset + offset, PADDING, 0, 0)
+        HEADER.pack_into(self._mm, 0, magic, slots, stripes, arena, start + size, tail)
+        return start
+
+    def _evict(self, position: int) -> int:
+        """Invalidate the record at ``position`` if its slot still points there; returns the next position"""
+        offset = position % self.arena_size
+        lap_end = position + self.arena_size - offset
+        if self.arena_size - offset < RECORD.size:
+            return lap_end
+        index, key_length, value_length = RECORD.unpack_from(self._mm, self._arena_offset + offset)
+        if index == PADDING:
+            return lap_end
+        slot = SLOT.unpack_from(self._mm, self._slot_offset(index))
+        if slot[3] == position and slot[5]:
+            self._write_slot(index, 0, 0, 0, 0.0, 0, 0)
+        return position + RECORD.size + key_length + value_length
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit and miss counts of this process and the arena bytes in use across all processes"""
+        _, _, _, _, head, tail = HEADER.unpack_from(self._mm, 0)
+        return {"hits": self.hits, "misses": self.misses, "used_bytes": head - tail,
+                "capacity_bytes": self.arena_size}
+
+    def close(self):
+        self._mm.close()
+        os.close(self._fd)
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Central registry of SQL statements used by DatabaseManager
+Every statement is fully parameterized so SQL Server caches one plan per statement
+Author: Gabriel Demetrios Lafis
+"""
+
+from dataclasses import dataclass, replace
+from typing import Dict, Iterable, Tuple, Union
+
+# Multi-gets are padded up to one of these IN-list sizes so they share a few cached plans
+GET_MANY_BATCH_SIZES = (8, 32, 128)
+
+# Column sets listings and multi-gets can fetch; each has its own statements so plans stay cached.
+# "summary" leaves out Description (NVARCHAR(MAX)) and is covered by IX_Products_Listing.
+PROJECTIONS: Dict[str, Tuple[str, ...]] = {
+    "summary": ("ProductId", "Name", "Price", "ImageUrl", "CreatedAt"),
+    "full": ("ProductId", "Name", "Description", "Price", "ImageUrl", "CreatedAt"),
+}
+
+# Product attribute for each column; fields can be requested by either name
+FIELD_COLUMNS: Dict[str, str] = {
+    "product_id": "ProductId",
+    "name": "Name",
+    "description": "Description",
+    "price": "Price",
+    "image_url": "ImageUrl",
+    "created_at": "CreatedAt",
+}
+
+
+@dataclass(frozen=True)
+class Statement:
+    """A named SQL statement; the text must never be built from request data.
+
+    ``{identity_seed}`` and ``{identity_increment}`` placeholders are filled once per
+    DatabaseManager from its fixed configuration (see render_statements).
+    """
+    statement_id: str
+    sql: str
+
+
+def _registry(*statements: Statement) -> Dict[str, Statement]:
+    return {statement.statement_id: statement for statement in statements}
+
+
+def _get_many_statements(projection: str = "full") -> tuple:
+    prefix = "products.get_many" if projection == "full" else f"products.get_many_{projection}"
+    return tuple(
+        Statement(f"{prefix}.{size}", f"""
+        SELECT {", ".join(PROJECTIONS[projection])}
+        FROM Products
+        WHERE ProductId IN ({", ".join("?" * size)})
+    """)
+        for size in GET_MANY_BATCH_SIZES
+    )
+
+
+def requested_columns(fields: Union[str, Iterable[str], None]) -> Tuple[str, ...]:
+    """Columns for a projection name or a list of field names, in table order; ProductId is always included"""
+    if fields is None:
+        return PROJECTIONS["full"]
+    if isinstance(fields, str):
+        if fields in PROJECTIONS:
+            return PROJECTIONS[fields]
+        fields = [fields]
+    wanted = {"ProductId"}
+    for field_name in fields:
+        column = FIELD_COLUMNS.get(field_name, field_name)
+        if column not in PROJECTIONS["full"]:
+            raise ValueError(f"Unknown product field: {field_name}")
+        wanted.add(column)
+    return tuple(column for column in PROJECTIONS["full"] if column in wanted)
+
+
+def projection_for(fields: Union[str, Iterable[str], None]) -> str:
+    """Smallest registered projection that contains every requested field"""
+    if isinstance(fields, str) and fields in PROJECTIONS:
+        return fields
+    columns = set(requested_columns(fields))
+    return next(name for name, projection in PROJECTIONS.items() if columns <= set(projection))
+
+
+def render_statements(statements: Dict[str, Statement], identity_seed: int = 1,
+                      identity_increment: int = 1) -> Dict[str, Statement]:
+    """Fill the per-database identity settings into a registry"""
+    settings = {"identity_seed": int(identity_seed), "identity_increment": int(identity_increment)}
+    return {statement_id: replace(statement, sql=statement.sql.format(**settings))
+            for statement_id, statement in statements.items()}
+
+
+MSSQL_STATEMENTS: Dict[str, Statement] = _registry(
+    Statement("schema.create_products", """
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='Products' AND xtype='U')
+        CREATE TABLE Products (
+            ProductId INT PRIMARY KEY IDENTITY({identity_seed},{identity_increment}),
+            Name NVARCHAR(100) NOT NULL,
+            Description NVARCHAR(MAX),
+            Price DECIMAL(18,2) NOT NULL,
+            ImageUrl NVARCHAR(255),
+            CreatedAt DATETIME DEFAULT GETDATE()
+        );
+    """),
+    Statement("schema.create_indexes", """
+        IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_Products_Name')
+        CREATE INDEX IX_Products_Name ON Products(Name);
+
+        IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_Products_Price')
+        CREATE INDEX IX_Products_Price ON Products(Price);
+    """),
+    # Covers the summary listing: ordered like products.list and carries every summary column
+    Statement("schema.create_listing_index", """
+        IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_Products_Listing')
+        CREATE INDEX IX_Products_Listing ON Products(CreatedAt DESC, ProductId DESC)
+        INCLUDE (Name, Price, ImageUrl);
+    """),
+    # Rows created by the catalog import, keyed by import run and CSV row, so a replayed batch inserts nothing twice
+    Statement("schema.create_import_keys", """
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='ProductImports' AND xtype='U')
+        CREATE TABLE ProductImports (
+            ImportKey NVARCHAR(64) PRIMARY KEY,
+            ProductId INT NOT NULL
+        );
+    """),
+    Statement("products.insert", """
+        INSERT INTO Products (Name, Description, Price, ImageUrl)
+        OUTPUT INSERTED.ProductId
+        VALUES (?, ?, ?, ?)
+    """),
+    Statement("imports.find", """
+        SELECT ProductId FROM ProductImports WHERE ImportKey = ?
+    """),
+    Statement("imports.record", """
+        INSERT INTO ProductImports (ImportKey, ProductId) VALUES (?, ?)
+    """),
+    Statement("products.get", """
+        SELECT ProductId, Name, Description, Price, ImageUrl, CreatedAt
+        FROM Products
+        WHERE ProductId = ?
+    """),
+    # TOP (?) keeps a single cached plan for every page size
+    Statement("products.list", """
+        SELECT TOP (?) ProductId, Name, Description, Price, ImageUrl, CreatedAt
+        FROM Products
+        ORDER BY CreatedAt DESC, ProductId DESC
+    """),
+    Statement("products.list_summary", """
+        SELECT TOP (?) ProductId, Name, Price, ImageUrl, CreatedAt
+        FROM Products
+        ORDER BY CreatedAt DESC, ProductId DESC
+    """),
+    *_get_many_statements("full"),
+    *_get_many_statements("summary"),
+    Statement("products.update", """
+        UPDATE Products
+        SET Name = ?, Description = ?, Price = ?, ImageUrl = ?
+        WHERE ProductId = ?
+    """),
+    Statement("products.delete", """
+        DELETE FROM Products WHERE ProductId = ?
+    """),
+    # Served from IX_Products_Price without touching the table
+    Statement("products.prices", """
+        SELECT Price FROM Products
+    """),
+)
+
+# Dialect used by the local SQLite stand-in (local_backends.LocalDatabaseManager)
+SQLITE_STATEMENTS: Dict[str, Statement] = _registry(
+    Statement("schema.create_products", """
+        CREATE TABLE IF NOT EXISTS Products (
+            ProductId INTEGER PRIMARY KEY,
+            Name TEXT NOT NULL,
+            Description TEXT,
+            Price REAL NOT NULL,
+            ImageUrl TEXT,
+            CreatedAt TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+        )
+    """),
+    Statement("schema.create_indexes", """
+        CREATE INDEX IF NOT EXISTS IX_Products_Name ON Products(Name)
+    """),
+    Statement("schema.create_price_index", """
+        CREATE INDEX IF NOT EXISTS IX_Products_Price ON Products(Price)
+    """),
+    # SQLite has no INCLUDE; trailing key columns make the index covering instead
+    Statement("schema.create_listing_index", """
+        CREATE INDEX IF NOT EXISTS IX_Products_Listing
+        ON Products(CreatedAt DESC, ProductId DESC, Name, Price, ImageUrl)
+    """),
+    # SQLite has no IDENTITY increment, so ids come from a persistent counter. Like IDENTITY it only
+    # moves forward: deleting the newest product never frees its id for reuse.
+    Statement("schema.create_id_sequence", """
+        CREATE TABLE IF NOT EXISTS ProductIdSequence (
+            Id INTEGER PRIMARY KEY CHECK (Id = 1),
+            LastId INTEGER NOT NULL
+        )
+    """),
+    Statement("schema.seed_id_sequence", """
+        INSERT OR IGNORE INTO ProductIdSequence (Id, LastId)
+        SELECT 1, COALESCE(MAX(ProductId), {identity_seed} - {identity_increment}) FROM Products
+    """),
+    Statement("schema.create_id_sequence_trigger", """
+        CREATE TRIGGER IF NOT EXISTS TR_Products_AdvanceIdSequence AFTER INSERT ON Products
+        BEGIN
+            UPDATE ProductIdSequence SET LastId = NEW.ProductId WHERE Id = 1 AND LastId < NEW.ProductId;
+        END
+    """),
+    Statement("schema.create_import_keys", """
+        CREATE TABLE IF NOT EXISTS ProductImports (
+            ImportKey TEXT PRIMARY KEY,
+            ProductId INTEGER NOT NULL
+        )
+    """),
+    Statement("products.insert", """
+        INSERT INTO Products (ProductId, Name, Description, Price, ImageUrl)
+        SELECT LastId + {identity_increment}, ?, ?, ?, ?
+        FROM ProductIdSequence
+        WHERE Id = 1
+        RETURNING ProductId
+    """),
+    Statement("imports.find", """
+        SELECT ProductId FROM ProductImports WHERE ImportKey = ?
+    """),
+    Statement("imports.record", """
+        INSERT INTO ProductImports (ImportKey, ProductId) VALUES (?, ?)
+    """),
+    Statement("products.get", """
+        SELECT ProductId, Name, Description, Price, ImageUrl, CreatedAt
+        FROM Products
+        WHERE ProductId = ?
+    """),
+    Statement("products.list", """
+        SELECT ProductId, Name, Description, Price, ImageUrl, CreatedAt
+        FROM Products
+        ORDER BY CreatedAt DESC, ProductId DESC
+        LIMIT ?
+    """),
+    Statement("products.list_summary", """
+        SELECT ProductId, Name, Price, ImageUrl, CreatedAt
+        FROM Products
+        ORDER BY CreatedAt DESC, ProductId DESC
+        LIMIT ?
+    """),
+    *_get_many_statements("full"),
+    *_get_many_statements("summary"),
+    Statement("products.update", """
+        UPDATE Products
+        SET Name = ?, Description = ?, Price = ?, ImageUrl = ?
+        WHERE ProductId = ?
+    """),
+    Statement("products.delete", """
+        DELETE FROM Products WHERE ProductId = ?
+    """),
+    # Served from IX_Products_Price without touching the table
+    Statement("products.prices", """
+        SELECT Price FROM Products
+    """),
+)
@@ -1,7 +1,9 @@
+import tempfile
 import unittest
 from unittest.mock import MagicMock, patch
-from datetime import datetime
+from datetime import datetime, timedelta
 from app import ECommerceSystem, Product, DatabaseManager, BlobStorageManager
+from local_backends import LocalBlobServiceClient
 
 class TestECommerceSystem(unittest.TestCase):
 
@@ -78,5 +80,93 @@ class TestECommerceSystem(unittest.TestCase):
         self.assertTrue(result)
         print(f"Image deleted: {image_url}")
 
+class TestDirectUpload(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.service = LocalBlobServiceClient(self.tmp.name)
+        self.blob_manager = BlobStorageManager("local", container_name="images",
+                                               blob_service_client=self.service)
+        self.db_manager = DatabaseManager("mock_sql_connection_string", mock_mode=True)
+        self.system = ECommerceSystem(db_manager=self.db_manager, blob_manager=self.blob_manager)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_upload_slot_round_trip(self):
+        slot = self.system.create_upload_slot(1, "image/png", 1024)
+        self.assertTrue(slot.blob_name.startswith("uploads/product-1-"))
+        self.assertIn("sp=c", slot.upload_url)
+
+        self.service.upload_with_sas(slot.upload_url, b"png-bytes", "image/png")
+        # Any worker sharing the storage account can finalize; slots are not kept in memory
+        other_worker = ECommerceSystem(db_manager=self.db_manager, blob_manager=BlobStorageManager(
+            "local", container_name="images", blob_service_client=self.service))
+        with patch.object(self.db_manager, 'update_product', return_value=True) as update:
+            image_url = other_worker.finalize_upload(1, slot.token)
+
+        self.assertTrue(image_url.endswith(slot.blob_name))
+        self.assertEqual(update.call_args[0][0].image_url, image_url)
+        self.assertEqual(self.blob_manager.sweep_expired_uploads(older_than=timedelta(0)), 0)
+
+    def test_finalize_keeps_previous_image_when_update_fails(self):
+        slot = self.system.create_upload_slot(1, "image/png", 1024)
+        self.service.upload_with_sas(slot.upload_url, b"png-bytes", "image/png")
+        existing = Product(product_id=1, name="Lamp", image_url="http://127.0.0.1:10000/x/images/old.png")
+
+        with patch.object(self.db_manager, 'get_product', return_value=existing), \
+                patch.object(self.db_manager, 'update_product', return_value=False), \
+                patch.object(self.blob_manager, 'delete_image', return_value=True) as delete_image:
+            with self.assertRaises(ValueError):
+                self.system.finalize_upload(1, slot.token)
+
+        deleted = [call[0][0] for call in delete_image.call_args_list]
+        self.assertEqual(len(deleted), 1)
+        self.assertTrue(deleted[0].endswith(slot.blob_name))
+
+    def test_finalize_rejects_oversized_upload(self):
+        slot = self.system.create_upload_slot(1, "image/jpeg", 4)
+        self.service.upload_with_sas(slot.upload_url, b"too large", "image/jpeg")
+
+        with self.assertRaises(ValueError):
+            self.system.finalize_upload(1, slot.token)
+        blob = self.service.get_blob_client("images", slot.blob_name)
+        self.assertFalse(blob.exists())
+
+    def test_finalize_rejects_wrong_content_type_and_unknown_slot(self):
+        slot = self.system.create_upload_slot(1, "image/jpeg", 1024)
+        self.service.upload_with_sas(slot.upload_url, b"gif-bytes", "image/gif")
+
+        with self.assertRaises(ValueError):
+            self.system.finalize_upload(1, slot.token)
+        with self.assertRaises(ValueError):
+            self.system.finalize_upload(2, slot.token)
+        payload, signature = slot.token.split(".")
+        with self.assertRaises(ValueError):
+            self.system.finalize_upload(1, payload[:-4] + "AAAA." + signature)
+
+    @patch.object(BlobStorageManager, '_maybe_sweep_uploads')
+    def test_expired_slot_is_rejected_and_abandoned_uploads_are_swept(self, _background_sweep):
+        # Sweeps run explicitly here; a background one would use whichever TTL is patched in at the time
+        with patch.object(BlobStorageManager, 'UPLOAD_SLOT_TTL', timedelta(seconds=-1)):
+            expired = self.system.create_upload_slot(1, "image/png", 1024)
+        self.service.get_blob_client("images", expired.blob_name).upload_blob(
+            b"late", content_settings={"content_type": "image/png"})
+        with self.assertRaises(ValueError):
+            self.system.finalize_upload(1, expired.token)
+        self.assertFalse(self.service.get_blob_client("images", expired.blob_name).exists())
+
+        abandoned = self.system.create_upload_slot(1, "image/png", 1024)
+        self.service.upload_with_sas(abandoned.upload_url, b"png-bytes", "image/png")
+        self.assertEqual(self.blob_manager.sweep_expired_uploads(), 0)
+        self.assertEqual(self.blob_manager.sweep_expired_uploads(older_than=timedelta(0)), 1)
+        self.assertFalse(self.service.get_blob_client("images", abandoned.blob_name).exists())
+
+    def test_create_upload_slot_validates_request(self):
+        with self.assertRaises(ValueError):
+            self.system.create_upload_slot(1, "application/pdf", 1024)
+        with self.assertRaises(ValueError):
+            self.system.create_upload_slot(1, "image/png", BlobStorageManager.MAX_UPLOAD_BYTES + 1)
+
 if __name__ == '__main__':
     unittest.main()
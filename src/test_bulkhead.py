@@ -0,0 +1,150 @@
+import time
+import threading
+import unittest
+from unittest.mock import patch
+
+from app import ECommerceSystem
+from bulkhead import Bulkhead, GuardedBackend, OverloadedError
+
+
+def hold(bulkhead, bulk, entered, release, order=None, tag=None):
+    with bulkhead.slot(bulk=bulk):
+        if order is not None:
+            order.append(tag)
+        entered.set()
+        release.wait(5)
+
+
+class TestBulkhead(unittest.TestCase):
+
+    def start_holder(self, bulkhead, bulk=False, order=None, tag=None):
+        entered, release = threading.Event(), threading.Event()
+        thread = threading.Thread(target=hold, args=(bulkhead, bulk, entered, release, order, tag))
+        thread.start()
+        return thread, entered, release
+
+    def test_limits_concurrency(self):
+        bulkhead = Bulkhead("sql_read", max_concurrent=2, max_queue_time=5)
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def call():
+            with bulkhead.slot():
+                with lock:
+                    running[0] += 1
+                    peak[0] = max(peak[0], running[0])
+                time.sleep(0.01)
+                with lock:
+                    running[0] -= 1
+
+        threads = [threading.Thread(target=call) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(bulkhead.stats()["admitted"], 10)
+
+    def test_sheds_after_queue_deadline(self):
+        bulkhead = Bulkhead("blob", max_concurrent=1, max_queue_time=0.05)
+        thread, entered, release = self.start_holder(bulkhead)
+        entered.wait(5)
+        started = time.monotonic()
+        with self.assertRaises(OverloadedError) as caught:
+            with bulkhead.slot():
+                pass
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(caught.exception.bulkhead, "blob")
+        release.set()
+        thread.join()
+        stats = bulkhead.stats()
+        self.assertEqual((stats["shed"], stats["queued"], stats["in_use"]), (1, 0, 0))
+
+    def test_full_queue_sheds_without_waiting(self):
+        bulkhead = Bulkhead("sql_write", max_concurrent=1, max_queue_time=5, max_queue=0)
+        thread, entered, release = self.start_holder(bulkhead)
+        entered.wait(5)
+        with self.assertRaises(OverloadedError):
+            with bulkhead.slot():
+                pass
+        release.set()
+        thread.join()
+
+    def test_interactive_calls_go_ahead_of_bulk_work(self):
+        bulkhead = Bulkhead("sql_read", max_concurrent=1, max_queue_time=5)
+        order = []
+        holder, entered, release = self.start_holder(bulkhead)
+        entered.wait(5)
+        bulk, bulk_entered, bulk_release = self.start_holder(bulkhead, bulk=True, order=order, tag="bulk")
+        while bulkhead.stats()["queued"] < 1:
+            time.sleep(0.001)
+        page, page_entered, page_release = self.start_holder(bulkhead, order=order, tag="page")
+        while bulkhead.stats()["queued"] < 2:
+            time.sleep(0.001)
+        release.set()
+        page_entered.wait(5)
+        page_release.set()
+        bulk_entered.wait(5)
+        bulk_release.set()
+        for thread in (holder, bulk, page):
+            thread.join()
+        self.assertEqual(order, ["page", "bulk"])
+
+    def test_bulk_work_keeps_slots_free_for_pages(self):
+        bulkhead = Bulkhead("sql_read", max_concurrent=2, max_queue_time=0.05, max_bulk=1)
+        thread, entered, release = self.start_holder(bulkhead, bulk=True)
+        entered.wait(5)
+        with self.assertRaises(OverloadedError):
+            with bulkhead.slot(bulk=True):
+                pass
+        with bulkhead.slot():
+            self.assertEqual(bulkhead.stats()["in_use"], 2)
+        release.set()
+        thread.join()
+
+    def test_guarded_generator_holds_slot_while_iterating(self):
+        bulkhead = Bulkhead("sql_read", max_concurrent=1, max_queue_time=1)
+
+        class Source:
+            def scan(self):
+                yield bulkhead.stats()["in_use"]
+
+            name = "source"
+
+        guarded = GuardedBackend(Source(), {"scan": bulkhead})
+        self.assertEqual(list(guarded.scan()), [1])
+        self.assertEqual(guarded.name, "source")
+        self.assertEqual(bulkhead.stats()["in_use"], 0)
+
+
+class TestSystemBulkheads(unittest.TestCase):
+
+    def test_slow_uploads_do_not_block_page_reads(self):
+        bulkheads = {"sql_read": Bulkhead("sql_read", 2, 1.0),
+                     "sql_write": Bulkhead("sql_write", 2, 1.0),
+                     "blob": Bulkhead("blob", 1, 0.05)}
+        system = ECommerceSystem(mock_mode=True, bulkheads=bulkheads)
+        uploading, finish = threading.Event(), threading.Event()
+
+        def slow_upload(*args):
+            uploading.set()
+            finish.wait(5)
+            return "http://mockimage.com/slow.jpg"
+
+        with patch.object(system.blob_manager, "upload_image", side_effect=slow_upload):
+            thread = threading.Thread(target=system.upload_image, args=(1, "a.jpg"))
+            thread.start()
+            uploading.wait(5)
+            self.assertEqual(system.get_product(1).product_id, 1)
+            with self.assertRaises(OverloadedError):
+                system.upload_image(2, "b.jpg")
+            finish.set()
+            thread.join()
+
+        stats = system.bulkhead_stats()
+        self.assertEqual(stats["blob"]["shed"], 1)
+        self.assertEqual(stats["sql_read"]["admitted"], 1)
+        self.assertEqual(stats["sql_read"]["shed"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+import os
+import csv
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+from catalog_import import CatalogImporter, ImportCheckpoint
+from app import ShardedDatabaseManager
+from local_backends import LocalDatabaseManager, create_local_system
+from shard_map import ShardConfig, ShardMap
+
+
+class FlakyInserts:
+    """Wraps a DatabaseManager so one import_products call fails"""
+
+    def __init__(self, manager, fail_on_call):
+        self.manager = manager
+        self.fail_on_call = fail_on_call
+        self.calls = 0
+
+    def import_products(self, products, import_keys):
+        self.calls += 1
+        if self.calls == self.fail_on_call:
+            raise ConnectionError("database went away")
+        return self.manager.import_products(products, import_keys)
+
+
+class TestImportCheckpoint(unittest.TestCase):
+
+    def test_watermark_advances_over_contiguous_rows(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            checkpoint = ImportCheckpoint(os.path.join(tmp, "cp.json"), "/data/products.csv")
+            checkpoint.mark_done([2, 3, 5])
+            self.assertEqual(checkpoint.watermark, 0)
+            checkpoint.mark_done([1])
+            self.assertEqual((checkpoint.watermark, checkpoint.done), (3, {5}))
+            checkpoint.save()
+
+            reloaded = ImportCheckpoint(checkpoint.path, "/data/products.csv")
+            reloaded.load()
+            self.assertTrue(reloaded.is_done(5))
+            self.assertFalse(reloaded.is_done(4))
+            with self.assertRaises(ValueError):
+                ImportCheckpoint(checkpoint.path, "/data/other.csv").load()
+
+
+class FirstImportFails(LocalDatabaseManager):
+    """Shard database whose first import_products call fails"""
+
+    failed = False
+
+    def import_products(self, products, import_keys):
+        if not self.failed:
+            self.failed = True
+            raise ConnectionError("shard went away")
+        return super().import_products(products, import_keys)
+
+
+class TestCatalogImport(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.system = create_local_system(os.path.join(self.tmp.name, "data"))
+        self.image_dir = os.path.join(self.tmp.name, "images")
+        os.makedirs(self.image_dir)
+        for name in ("a.jpg", "b.png"):
+            with open(os.path.join(self.image_dir, name), 'wb') as f:
+                f.write(b"image-" + name.encode())
+        with open(os.path.join(self.tmp.name, "secret.jpg"), 'wb') as f:
+            f.write(b"outside")
+        self.csv_path = os.path.join(self.tmp.name, "products.csv")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_csv(self, rows):
+        with open(self.csv_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["Name", "Description", "Price", "Image"])
+            writer.writerows(rows)
+
+    def blob_count(self):
+        container = os.path.join(self.tmp.name, "data", "blobs", "product-images")
+        return len([name for name in os.listdir(container) if not name.endswith(".meta")])
+
+    def test_imports_valid_rows_and_dead_letters_the_rest(self):
+        self.write_csv([
+            ["Laptop", "Fast", "1299.99", "a.jpg"],
+            ["Phone", "", "799", "b.png"],
+            ["Cable", "USB-C", "9.5", ""],
+            ["", "no name", "1", ""],
+            ["Mouse", "", "cheap", ""],
+            ["Ghost", "", "5", "missing.jpg"],
+            ["Sneaky", "", "5", "../secret.jpg"],
+        ])
+        report = self.system.import_catalog(self.csv_path, self.image_dir, batch_size=2, upload_workers=3)
+
+        self.assertEqual((report.rows_read, report.rows_imported, report.rows_rejected), (7, 3, 4))
+        self.assertEqual(report.images_uploaded, 2)
+        products = {p.name: p for p in self.system.get_products(report.product_ids)}
+        self.assertEqual(set(products), {"Laptop", "Phone", "Cable"})
+        self.assertEqual(products["Laptop"].price, 1299.99)
+        self.assertEqual(self.system.read_image_range(products["Phone"].image_url, 0), b"image-b.png")
+        self.assertEqual(products["Cable"].image_url, "")
+
+        with open(self.csv_path + ".rejected.csv", newline='') as f:
+            rejected = {row["row"]: row["error"] for row in csv.DictReader(f)}
+        self.assertEqual(set(rejected), {"4", "5", "6", "7"})
+        self.assertIn("not a number", rejected["5"])
+        self.assertIn("outside the image directory", rejected["7"])
+        with open(self.csv_path + ".checkpoint.json") as f:
+            self.assertEqual(json.load(f)["watermark"], 7)
+
+    def test_resume_after_failed_batch_imports_each_row_once(self):
+        self.write_csv([[f"Item {i}", "", str(i), "a.jpg"] for i in range(1, 11)])
+        flaky = FlakyInserts(self.system.db_manager, fail_on_call=2)
+        importer = CatalogImporter(flaky, self.system.blob_manager, batch_size=3, upload_workers=2)
+        with self.assertRaises(ConnectionError):
+            importer.run(self.csv_path, self.image_dir)
+        # Only images of committed rows are left behind
+        self.assertEqual(self.blob_count(), 3)
+
+        report = self.system.import_catalog(self.csv_path, self.image_dir, batch_size=3)
+        self.assertEqual(report.rows_skipped, 3)
+        self.assertEqual(report.rows_imported, 7)
+        names = sorted(p.name for p in self.system.list_products(100))
+        self.assertEqual(names, sorted(f"Item {i}" for i in range(1, 11)))
+        self.assertEqual(self.blob_count(), 10)
+
+        # A completed import is a no-op unless restarted
+        self.assertEqual(self.system.import_catalog(self.csv_path, self.image_dir).rows_imported, 0)
+
+    def test_batch_committed_before_a_crash_is_not_inserted_again(self):
+        self.write_csv([[f"Item {i}", "", str(i), "a.jpg"] for i in range(1, 8)])
+        save = ImportCheckpoint.save
+        saves = []
+
+        def crash_before_second_batch_is_recorded(checkpoint):
+            saves.append(checkpoint.watermark)
+            if len(saves) == 3:
+                raise SystemExit("killed")
+            save(checkpoint)
+
+        with mock.patch.object(ImportCheckpoint, "save", crash_before_second_batch_is_recorded):
+            with self.assertRaises(SystemExit):
+                self.system.import_catalog(self.csv_path, self.image_dir, batch_size=3)
+
+        report = self.system.import_catalog(self.csv_path, self.image_dir, batch_size=3)
+        self.assertEqual((report.rows_imported, report.rows_skipped), (1, 6))
+        names = sorted(p.name for p in self.system.list_products(100))
+        self.assertEqual(names, sorted(f"Item {i}" for i in range(1, 8)))
+        self.assertEqual(self.blob_count(), 7)
+
+        # Restarting begins a new run, which imports every row again
+        self.assertEqual(self.system.import_catalog(self.csv_path, self.image_dir, resume=False).rows_imported, 7)
+
+    def test_failed_shard_rolls_back_the_whole_batch(self):
+        shard_map = ShardMap(stride=2, shards=[ShardConfig(name, os.path.join(self.tmp.name, f"{name}.db"), slot)
+                                                for slot, name in enumerate(["a", "b"])])
+        # Whichever shard the run lands on fails its first batch
+        sharded = ShardedDatabaseManager(shard_map, manager_factory=lambda shard, shards: FirstImportFails(
+            shard.connection_string, identity_seed=shards.identity_seed(shard.name),
+            identity_increment=shards.stride))
+        self.write_csv([[f"Item {i}", "", str(i), "a.jpg"] for i in range(1, 7)])
+        importer = CatalogImporter(sharded, self.system.blob_manager, batch_size=6, upload_workers=2)
+        with self.assertRaises(ConnectionError):
+            importer.run(self.csv_path, self.image_dir)
+        self.assertEqual((sharded.list_products(100), self.blob_count()), ([], 0))
+
+        report = importer.run(self.csv_path, self.image_dir)
+        self.assertEqual(report.rows_imported, 6)
+        products = sharded.list_products(100)
+        self.assertEqual(len({product.product_id % 2 for product in products}), 1)
+        for product in products:
+            self.assertTrue(self.system.blob_manager.read_image_range(product.image_url, 0))
+
+    def test_new_file_under_the_same_name_is_imported_from_the_start(self):
+        self.write_csv([["Old 1", "", "1", ""], ["Old 2", "", "2", ""]])
+        self.assertEqual(self.system.import_catalog(self.csv_path, self.image_dir).rows_imported, 2)
+        with open(self.csv_path + ".checkpoint.json") as f:
+            self.assertTrue(json.load(f)["complete"])
+
+        self.write_csv([["New 1", "", "1", ""], ["New 2", "", "2", ""], ["New 3", "", "3", ""]])
+        report = self.system.import_catalog(self.csv_path, self.image_dir)
+        self.assertEqual((report.rows_imported, report.rows_skipped), (3, 0))
+
+    def test_missing_required_column(self):
+        with open(self.csv_path, 'w') as f:
+            f.write("name,description\nLaptop,Fast\n")
+        with self.assertRaises(ValueError):
+            self.system.import_catalog(self.csv_path, self.image_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
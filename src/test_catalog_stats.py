@@ -0,0 +1,127 @@
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+
+from catalog_stats import CatalogStats, PriceHistogram
+
+
+def product(product_id, price, name=None):
+    return SimpleNamespace(product_id=product_id, name=name or f"p{product_id}", price=price,
+                           image_url="", created_at=datetime(2026, 1, 1, 0, 0, product_id % 60))
+
+
+class FakeSource:
+    """In-memory stand-in for DatabaseManager"""
+
+    def __init__(self, products):
+        self.products = {p.product_id: p for p in products}
+
+    def scan_prices(self):
+        return [p.price for p in self.products.values()]
+
+    def list_products(self, limit=50, fields=None):
+        newest = sorted(self.products.values(), key=lambda p: p.created_at, reverse=True)
+        return newest[:limit]
+
+
+class TestPriceHistogram(unittest.TestCase):
+
+    def test_quantiles_are_within_bucket_error(self):
+        histogram = PriceHistogram()
+        prices = [float(p) for p in range(1, 1001)]
+        for price in prices:
+            histogram.add(price)
+        for q, expected in ((0.5, 500), (0.9, 900), (0.99, 990)):
+            self.assertAlmostEqual(histogram.quantile(q, len(prices)), expected, delta=expected * 0.05)
+
+    def test_empty_histogram(self):
+        self.assertIsNone(PriceHistogram().quantile(0.5, 0))
+        self.assertIsNone(PriceHistogram().lowest_bound())
+
+
+class TestCatalogStats(unittest.TestCase):
+
+    def setUp(self):
+        self.source = FakeSource([product(1, 10.0), product(2, 20.0), product(3, 30.0)])
+        self.stats = CatalogStats(self.source, newest_limit=2)
+        self.stats.seed()
+
+    def test_seed(self):
+        snapshot = self.stats.snapshot()
+        self.assertEqual(snapshot["ProductCount"], 3)
+        self.assertAlmostEqual(snapshot["AveragePrice"], 20.0)
+        self.assertEqual((snapshot["MinPrice"], snapshot["MaxPrice"]), (10.0, 30.0))
+        self.assertEqual([p["ProductId"] for p in snapshot["Newest"]], [3, 2])
+        self.assertEqual(sum(b["Count"] for b in snapshot["PriceHistogram"]), 3)
+
+    def test_incremental_updates(self):
+        self.stats.on_add(product(4, 100.0))
+        self.stats.on_update(product(2, 20.0), product(2, 40.0, name="renamed"))
+        snapshot = self.stats.snapshot()
+        self.assertEqual(snapshot["ProductCount"], 4)
+        self.assertAlmostEqual(snapshot["AveragePrice"], (10 + 40 + 30 + 100) / 4)
+        self.assertEqual(snapshot["MaxPrice"], 100.0)
+        self.assertEqual([p["ProductId"] for p in snapshot["Newest"]], [4, 3])
+
+        self.stats.on_delete(product(4, 100.0))
+        self.assertEqual(self.stats.snapshot()["ProductCount"], 3)
+
+    def test_deleting_extreme_makes_min_max_an_estimate_until_reconcile(self):
+        self.stats.on_delete(product(1, 10.0))
+        del self.source.products[1]
+        snapshot = self.stats.snapshot()
+        self.assertFalse(snapshot["MinMaxExact"])
+        self.assertLessEqual(snapshot["MinPrice"], 20.0)
+
+        self.stats.reconcile()
+        snapshot = self.stats.snapshot()
+        self.assertTrue(snapshot["MinMaxExact"])
+        self.assertEqual(snapshot["MinPrice"], 20.0)
+
+    def test_reconcile_corrects_drift(self):
+        self.source.products[9] = product(9, 50.0)
+        with self.assertLogs("catalog_stats", level="WARNING"):
+            self.stats.reconcile()
+        self.assertEqual(self.stats.snapshot()["ProductCount"], 4)
+
+    def test_snapshot_is_cached_between_writes_and_read_only(self):
+        first = self.stats.snapshot()
+        self.assertIs(self.stats.snapshot(), first)
+        with self.assertRaises(TypeError):
+            first["ProductCount"] = 0
+        with self.assertRaises(TypeError):
+            first["Newest"][0]["Price"] = 0.0
+        with self.assertRaises(AttributeError):
+            first["PriceHistogram"].clear()
+        self.stats.on_add(product(5, 5.0))
+        self.assertEqual(self.stats.snapshot()["ProductCount"], 4)
+        self.assertEqual(first["ProductCount"], 3)
+
+    def test_writes_during_reconcile_are_replayed(self):
+        scan = self.source.scan_prices
+
+        def scan_with_concurrent_writes():
+            prices = scan()
+            # Both writes land after the scan read the table
+            self.stats.on_add(product(7, 70.0))
+            self.stats.on_delete(product(1, 10.0))
+            return prices
+
+        self.source.scan_prices = scan_with_concurrent_writes
+        self.stats.reconcile()
+        snapshot = self.stats.snapshot()
+        self.assertEqual(snapshot["ProductCount"], 3)
+        self.assertEqual((snapshot["MinPrice"] <= 20.0, snapshot["MaxPrice"]), (True, 70.0))
+        self.assertEqual(snapshot["Newest"][0]["ProductId"], 7)
+
+    def test_deleting_everything_resets(self):
+        for p in list(self.source.products.values()):
+            self.stats.on_delete(p)
+        snapshot = self.stats.snapshot()
+        self.assertEqual(snapshot["ProductCount"], 0)
+        self.assertIsNone(snapshot["AveragePrice"])
+        self.assertIsNone(snapshot["MinPrice"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from app import Product
+from connection_pool import ConnectionPool
+from local_backends import LocalDatabaseManager
+from sql_statements import Statement, MSSQL_STATEMENTS, SQLITE_STATEMENTS, render_statements
+
+SELECT_ONE = Statement("test.select", "SELECT ? + 1")
+
+
+class SingleResultSetConnection:
+    """Fake connection that, like SQL Server without MARS, refuses a statement while another has unread results"""
+
+    def __init__(self):
+        self.busy = None
+
+    def cursor(self):
+        return SingleResultSetCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SingleResultSetCursor:
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+        self.rowcount = -1
+
+    def execute(self, sql, params=()):
+        if self.conn.busy not in (None, self):
+            raise RuntimeError("Connection is busy with results for another hstmt")
+        self.rows = [(1,), (2,)]
+        self.conn.busy = self
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def nextset(self):
+        self.rows = []
+        self.conn.busy = None
+        return False
+
+    def close(self):
+        pass
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.opened = []
+
+        def connect():
+            conn = sqlite3.connect(":memory:", check_same_thread=False)
+            self.opened.append(conn)
+            return conn
+
+        self.pool = ConnectionPool(connect, max_size=2, acquire_timeout=0.2)
+
+    def test_connections_are_reused(self):
+        with self.pool.connection() as conn:
+            first = conn
+        with self.pool.connection() as conn:
+            self.assertIs(conn, first)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_statement_prepared_once_per_connection(self):
+        with self.pool.connection() as conn:
+            cursor = conn.execute(SELECT_ONE, (1,))
+            self.assertEqual(cursor.fetchone()[0], 2)
+            self.assertIs(conn.execute(SELECT_ONE, (5,)), cursor)
+        with self.pool.connection() as conn:
+            self.assertEqual(conn.execute(SELECT_ONE, (9,)).fetchone()[0], 10)
+
+        stats = self.pool.stats.snapshot()["test.select"]
+        self.assertEqual(stats["prepare_count"], 1)
+        self.assertEqual(stats["execute_count"], 2)
+
+    def test_failed_block_discards_connection(self):
+        with self.assertRaises(RuntimeError):
+            with self.pool.connection():
+                raise RuntimeError("boom")
+        with self.pool.connection():
+            pass
+        self.assertEqual(len(self.opened), 2)
+
+    def test_acquire_times_out_when_exhausted(self):
+        release = threading.Event()
+        held = threading.Barrier(3)
+
+        def hold():
+            with self.pool.connection():
+                held.wait()
+                release.wait()
+
+        threads = [threading.Thread(target=hold) for _ in range(2)]
+        for t in threads:
+            t.start()
+        held.wait()
+        try:
+            with self.assertRaises(TimeoutError):
+                with self.pool.connection():
+                    pass
+        finally:
+            release.set()
+            for t in threads:
+                t.join()
+
+    def test_reset_retires_checked_out_connections(self):
+        with self.pool.connection() as conn:
+            self.pool.reset()
+            old = conn
+        with self.pool.connection() as conn:
+            self.assertIsNot(conn, old)
+        self.assertEqual(len(self.opened), 2)
+
+    def test_closed_generator_returns_its_slot(self):
+        def stream():
+            with self.pool.connection() as conn:
+                yield conn.execute(SELECT_ONE, (1,)).fetchone()[0]
+                yield 0
+
+        for _ in range(3):
+            rows = stream()
+            next(rows)
+            rows.close()
+        with self.pool.connection() as conn:
+            self.assertEqual(conn.execute(SELECT_ONE, (2,)).fetchone()[0], 3)
+
+    def test_partially_consumed_price_scan_does_not_leak_connections(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = LocalDatabaseManager(os.path.join(tmp, "catalog.db"), pool_size=2)
+            db.pool.acquire_timeout = 0.5
+            for i in range(5):
+                db.add_product(Product(name=f"Item {i}", price=float(i)))
+            for _ in range(5):
+                prices = db.scan_prices(batch_size=2)
+                next(prices)
+                prices.close()
+            self.assertEqual(sorted(db.scan_prices()), [0.0, 1.0, 2.0, 3.0, 4.0])
+            db.pool.close()
+
+    def test_unread_results_are_discarded_between_statements(self):
+        raw = SingleResultSetConnection()
+        pool = ConnectionPool(lambda: raw, max_size=1)
+        other = Statement("test.other", "SELECT 2")
+        with pool.connection() as conn:
+            self.assertEqual(conn.execute(SELECT_ONE, (1,)).fetchone(), (1,))
+            self.assertEqual(conn.execute(other).fetchone(), (1,))
+        self.assertIsNone(raw.busy)
+        with pool.connection() as conn:
+            self.assertEqual(conn.execute(SELECT_ONE, (1,)).fetchone(), (1,))
+
+
+class TestStatementRegistry(unittest.TestCase):
+
+    def test_statement_ids_match_keys(self):
+        for statement_id, statement in MSSQL_STATEMENTS.items():
+            self.assertEqual(statement.statement_id, statement_id)
+
+    def test_list_is_parameterized(self):
+        self.assertIn("TOP (?)", MSSQL_STATEMENTS["products.list"].sql)
+        for registry in (MSSQL_STATEMENTS, SQLITE_STATEMENTS):
+            for statement in render_statements(registry).values():
+                self.assertNotIn("{", statement.sql)
+
+    def test_render_fills_identity_settings(self):
+        rendered = render_statements(MSSQL_STATEMENTS, identity_seed=3, identity_increment=16)
+        self.assertIn("IDENTITY(3,16)", rendered["schema.create_products"].sql)
+
+    def test_dialects_define_the_same_statements(self):
+        data_ids = lambda registry: {k for k in registry if not k.startswith("schema.")}
+        self.assertEqual(data_ids(MSSQL_STATEMENTS), data_ids(SQLITE_STATEMENTS))
+
+
+if __name__ == '__main__':
+    unittest.main()
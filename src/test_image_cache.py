@@ -0,0 +1,129 @@
+import os
+import tempfile
+import unittest
+
+from image_cache import ImageCache, fcntl
+
+
+class FakeOrigin:
+    """Blob stand-in that honours conditional requests by ETag"""
+
+    def __init__(self, data: bytes, etag: str = '"v1"'):
+        self.data = data
+        self.etag = etag
+        self.downloads = 0
+        self.not_modified = 0
+
+    def fetch(self, etag):
+        if etag == self.etag:
+            self.not_modified += 1
+            return None
+        self.downloads += 1
+        return self.data, self.etag
+
+
+class TestImageCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_open_downloads_once_and_maps_file(self):
+        origin = FakeOrigin(b"image-bytes")
+        cache = ImageCache(self.cache_dir)
+
+        with cache.open("product-1.jpg", origin.fetch) as mapped:
+            self.assertEqual(mapped[:], b"image-bytes")
+        with cache.open("product-1.jpg", origin.fetch) as mapped:
+            self.assertEqual(mapped[:5], b"image")
+        self.assertEqual(origin.downloads, 1)
+
+    def test_read_range(self):
+        origin = FakeOrigin(b"0123456789")
+        cache = ImageCache(self.cache_dir)
+
+        self.assertEqual(cache.read_range("a.jpg", 2, 5, origin.fetch), b"234")
+        self.assertEqual(cache.read_range("a.jpg", 7, None, origin.fetch), b"789")
+        with self.assertRaises(ValueError):
+            cache.read_range("a.jpg", 5, 2, origin.fetch)
+
+    def test_revalidation_uses_etag(self):
+        origin = FakeOrigin(b"old")
+        cache = ImageCache(self.cache_dir, revalidate_after=0)
+
+        self.assertEqual(cache.read_range("a.jpg", 0, None, origin.fetch), b"old")
+        self.assertEqual(cache.read_range("a.jpg", 0, None, origin.fetch), b"old")
+        self.assertEqual(origin.downloads, 1)
+        self.assertEqual(origin.not_modified, 1)
+
+        origin.data, origin.etag = b"new", '"v2"'
+        self.assertEqual(cache.read_range("a.jpg", 0, None, origin.fetch), b"new")
+        self.assertEqual(origin.downloads, 2)
+
+    def test_lru_eviction_respects_size_bound(self):
+        cache = ImageCache(self.cache_dir, max_bytes=10)
+        first, second, third = FakeOrigin(b"aaaa"), FakeOrigin(b"bbbb"), FakeOrigin(b"cccc")
+
+        cache.read_range("first", 0, None, first.fetch)
+        cache.read_range("second", 0, None, second.fetch)
+        cache.read_range("first", 0, None, first.fetch)  # first becomes most recent
+        cache.read_range("third", 0, None, third.fetch)
+
+        self.assertLessEqual(cache.total_bytes, 10)
+        cache.read_range("first", 0, None, first.fetch)
+        cache.read_range("second", 0, None, second.fetch)
+        self.assertEqual(first.downloads, 1)
+        self.assertEqual(second.downloads, 2)
+
+    def test_index_is_rebuilt_and_revalidated_after_restart(self):
+        origin = FakeOrigin(b"persisted")
+        previous = ImageCache(self.cache_dir)
+        previous.read_range("a.jpg", 0, None, origin.fetch)
+        previous.close()
+
+        cache = ImageCache(self.cache_dir)
+        self.assertEqual(cache.cache_dir, previous.cache_dir)
+        self.assertEqual(cache.total_bytes, len(b"persisted"))
+        self.assertEqual(cache.read_range("a.jpg", 0, None, origin.fetch), b"persisted")
+        self.assertEqual(origin.downloads, 1)
+        self.assertEqual(origin.not_modified, 1)
+
+    def test_invalidate_removes_files(self):
+        origin = FakeOrigin(b"data")
+        cache = ImageCache(self.cache_dir)
+        cache.read_range("a.jpg", 0, None, origin.fetch)
+
+        cache.invalidate("a.jpg")
+        self.assertEqual(cache.total_bytes, 0)
+        self.assertEqual(os.listdir(cache.cache_dir), [".lock"])
+
+    def test_stale_temp_files_are_swept_at_startup(self):
+        worker_dir = os.path.join(self.cache_dir, "worker-0")
+        os.makedirs(worker_dir)
+        stale, fresh = os.path.join(worker_dir, "a.1.tmp"), os.path.join(worker_dir, "b.2.tmp")
+        for path in (stale, fresh):
+            with open(path, 'wb') as f:
+                f.write(b"partial")
+        os.utime(stale, (0, 0))
+
+        cache = ImageCache(self.cache_dir)
+        self.assertEqual(sorted(os.listdir(worker_dir)), [".lock", "b.2.tmp"])
+        cache.read_range("a.jpg", 0, None, FakeOrigin(b"data").fetch)
+        self.assertFalse([name for name in os.listdir(worker_dir) if name.endswith(".tmp") and name != "b.2.tmp"])
+
+    @unittest.skipUnless(fcntl, "needs advisory file locks")
+    def test_live_caches_never_share_a_directory_or_budget(self):
+        first, second = ImageCache(self.cache_dir, max_bytes=10), ImageCache(self.cache_dir, max_bytes=10)
+        self.assertNotEqual(first.cache_dir, second.cache_dir)
+        first.read_range("a.jpg", 0, None, FakeOrigin(b"aaaaaaaa").fetch)
+        second.read_range("b.jpg", 0, None, FakeOrigin(b"bbbbbbbb").fetch)
+        # Neither evicts the other's files
+        self.assertEqual(first.read_range("a.jpg", 0, None, FakeOrigin(b"changed").fetch), b"aaaaaaaa")
+        self.assertEqual((first.total_bytes, second.total_bytes), (8, 8))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+import io
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from image_variants import (IMMUTABLE_CACHE_CONTROL, VARIANTS, Image, is_image, render_variants,
+                            variant_blob_names, variant_urls)
+from local_backends import create_local_system
+
+
+def make_image(width, height, fmt="PNG"):
+    buffer = io.BytesIO()
+    Image.new("RGBA" if fmt == "PNG" else "RGB", (width, height), (200, 40, 40, 255)).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+class TestVariantNames(unittest.TestCase):
+
+    def test_variant_urls_follow_the_original(self):
+        url = "http://127.0.0.1:10000/devstoreaccount1/product-images/product-0-abc/original.png"
+        self.assertEqual(variant_urls(url), {
+            "thumb": "http://127.0.0.1:10000/devstoreaccount1/product-images/product-0-abc/thumb.jpg",
+            "medium": "http://127.0.0.1:10000/devstoreaccount1/product-images/product-0-abc/medium.jpg",
+            "thumb_webp": "http://127.0.0.1:10000/devstoreaccount1/product-images/product-0-abc/thumb.webp",
+            "medium_webp": "http://127.0.0.1:10000/devstoreaccount1/product-images/product-0-abc/medium.webp",
+        })
+        self.assertEqual(variant_blob_names("product-0-abc/original.png")["thumb"], "product-0-abc/thumb.jpg")
+
+    def test_images_without_variants(self):
+        self.assertEqual(variant_urls(""), {})
+        self.assertEqual(variant_urls("http://example.com/product-images/product-1-abc.jpg"), {})
+        self.assertEqual(variant_blob_names("product-1-abc.jpg"), {})
+
+
+@unittest.skipUnless(Image, "Pillow is not installed")
+class TestRenderVariants(unittest.TestCase):
+
+    def test_variants_fit_their_bounds_without_upscaling(self):
+        rendered = render_variants(make_image(1600, 400))
+        sizes = {name: Image.open(io.BytesIO(data)).size for name, data in rendered.items()}
+        self.assertEqual(sizes, {"thumb": (240, 60), "medium": (800, 200),
+                                 "thumb_webp": (240, 60), "medium_webp": (800, 200)})
+        self.assertEqual(Image.open(io.BytesIO(rendered["thumb_webp"])).format, "WEBP")
+
+        small = render_variants(make_image(100, 50, "JPEG"))
+        self.assertEqual(Image.open(io.BytesIO(small["medium"])).size, (100, 50))
+
+
+def exit_worker(data):
+    os._exit(1)
+
+
+def hang_worker(data):
+    time.sleep(60)
+
+
+@unittest.skipUnless(Image, "Pillow is not installed")
+class TestUploadVariants(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.system = create_local_system(os.path.join(cls.tmp.name, "data"))
+        cls.system.blob_manager.variant_workers = 1
+        cls.container = os.path.join(cls.tmp.name, "data", "blobs", "product-images")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.system.blob_manager.close()
+        cls.tmp.cleanup()
+
+    def write_file(self, name, data):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_upload_stores_variants_and_delete_removes_them(self):
+        image_path = self.write_file("photo.png", make_image(1200, 900))
+        product_id = self.system.add_product("Lamp", "", 49.0, image_path)
+
+        product = self.system.get_product(product_id)
+        self.assertTrue(product.image_url.endswith("/original.png"))
+        variants = self.system.get_product_dict(product_id)["ImageVariants"]
+        self.assertEqual(variants, product.image_variants)
+        self.assertEqual(set(variants), {spec.name for spec in VARIANTS})
+        thumb = self.system.read_image_range(variants["thumb_webp"], 0)
+        self.assertEqual(Image.open(io.BytesIO(thumb)).size, (240, 180))
+
+        blob_service = self.system.blob_manager.blob_service_client
+        folder = product.image_url.split("/")[-2]
+        for name in ("original.png", "thumb.jpg", "medium.webp"):
+            properties = blob_service.get_blob_client("product-images", f"{folder}/{name}").get_blob_properties()
+            self.assertEqual(properties.content_settings.cache_control, IMMUTABLE_CACHE_CONTROL)
+
+        self.assertTrue(self.system.delete_product(product_id))
+        self.assertFalse(os.path.exists(os.path.join(self.container, folder)))
+
+    def test_unreadable_image_is_stored_without_variants(self):
+        image_path = self.write_file("broken.jpg", b"not really a jpeg")
+        product_id = self.system.add_product("Mystery", "", 1.0, image_path)
+        product = self.system.get_product(product_id)
+        self.assertNotIn("/original", product.image_url)
+        self.assertEqual(product.image_variants, {})
+        self.assertEqual(self.system.read_image_range(product.image_url, 0), b"not really a jpeg")
+        self.assertTrue(self.system.delete_image(product.image_url))
+
+    def test_unreadable_image_never_starts_the_workers(self):
+        blob_manager = self.system.blob_manager
+        blob_manager.close()
+        self.assertFalse(is_image(b"not really a jpeg"))
+        self.assertIsNone(blob_manager._render_variants(b"not really a jpeg", "broken.jpg"))
+        self.assertIsNone(blob_manager._variant_pool)
+
+    def test_crashed_worker_is_replaced(self):
+        blob_manager = self.system.blob_manager
+        image_path = self.write_file("crash.png", make_image(300, 300))
+        with mock.patch("app.render_variants", exit_worker):
+            image_url = blob_manager.upload_image(5, image_path, "image/png")
+        self.assertNotIn("/original", image_url)
+        self.assertTrue(blob_manager.delete_image(image_url))
+
+        image_url = blob_manager.upload_image(5, image_path, "image/png")
+        self.assertTrue(image_url.endswith("/original.png"))
+        self.assertTrue(blob_manager.delete_image(image_url))
+
+    def test_stuck_workers_time_out_and_are_terminated(self):
+        blob_manager = self.system.blob_manager
+        image_path = self.write_file("slow.png", make_image(300, 300))
+        pool = blob_manager.variant_pool
+        submit, workers = pool.submit, []
+
+        def submit_and_record_workers(*args):
+            future = submit(*args)
+            workers.extend(pool._processes.values())
+            return future
+
+        with mock.patch.object(pool, "submit", submit_and_record_workers), \
+                mock.patch("app.render_variants", hang_worker), \
+                mock.patch.object(type(blob_manager), "VARIANT_TIMEOUT", 0.5):
+            image_url = blob_manager.upload_image(5, image_path, "image/png")
+        self.assertNotIn("/original", image_url)
+        self.assertIsNot(blob_manager._variant_pool, pool)
+        self.assertTrue(workers)
+        for worker in workers:
+            worker.join(5)
+            self.assertFalse(worker.is_alive())
+        self.assertTrue(blob_manager.delete_image(image_url))
+
+    def test_failed_upload_removes_the_partial_folder(self):
+        blob_manager = self.system.blob_manager
+        image_path = self.write_file("partial.png", make_image(300, 300))
+        upload_blob = blob_manager._upload_blob
+        calls = []
+
+        def fail_third_upload(*args):
+            calls.append(args[0])
+            if len(calls) == 3:
+                raise ConnectionError("storage went away")
+            return upload_blob(*args)
+
+        with mock.patch.object(blob_manager, "_upload_blob", fail_third_upload):
+            with self.assertRaises(ConnectionError):
+                blob_manager.upload_image(6, image_path, "image/png")
+        folder = calls[0].split("/")[0]
+        self.assertFalse(os.path.exists(os.path.join(self.container, folder)))
+
+
+if __name__ == '__main__':
+    unittest.main()
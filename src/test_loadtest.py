@@ -0,0 +1,50 @@
+import argparse
+import random
+import unittest
+from collections import Counter
+
+from loadtest import KeyChooser, LoadTestConfig, parse_mix, percentile, run_load_test, summarize
+
+
+class TestWorkloadPieces(unittest.TestCase):
+
+    def test_parse_mix(self):
+        self.assertIn("get", parse_mix("browse"))
+        self.assertEqual(parse_mix("get=70,list=30"), {"get": 70.0, "list": 30.0})
+        with self.assertRaises(argparse.ArgumentTypeError):
+            parse_mix("explode=1")
+        with self.assertRaises(argparse.ArgumentTypeError):
+            parse_mix("get=0")
+
+    def test_zipf_is_skewed_towards_first_keys(self):
+        chooser = KeyChooser(list(range(100)), "zipf", s=1.2, rng=random.Random(1))
+        counts = Counter(chooser.choose() for _ in range(5000))
+        self.assertGreater(counts[0], counts[50] * 10)
+
+    def test_uniform_covers_keys(self):
+        chooser = KeyChooser([1, 2, 3], rng=random.Random(1))
+        self.assertEqual({chooser.choose() for _ in range(200)}, {1, 2, 3})
+
+    def test_percentile_and_summary(self):
+        values = [i / 1000 for i in range(1, 101)]
+        self.assertEqual(percentile(values, 0.5), 0.05)
+        self.assertEqual(percentile(values, 0.99), 0.099)
+        report = summarize({"get": values}, {"get": 2}, seconds=2.0)[0]
+        self.assertEqual((report.count, report.errors, report.throughput), (100, 2, 50.0))
+        self.assertAlmostEqual(report.max_ms, 100.0)
+
+
+class TestLoadTestRun(unittest.TestCase):
+
+    def test_short_run_against_mock_backend(self):
+        lines = []
+        config = LoadTestConfig(backend="mock", mix={"get": 1, "list": 1}, concurrency=2,
+                                duration=0.5, report_interval=0.2, seed_products=2, rate=200)
+        summary = run_load_test(config, emit=lines.append)
+        self.assertEqual({r.operation for r in summary}, {"get", "list"})
+        self.assertTrue(all(r.errors == 0 for r in summary))
+        self.assertTrue(any(line.startswith("[total") for line in lines))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from app import Product, LazyProduct
+from local_backends import create_local_system
+from sql_statements import SQLITE_STATEMENTS, projection_for, requested_columns
+
+
+class TestProjectionResolution(unittest.TestCase):
+
+    def test_fields_map_to_smallest_projection(self):
+        self.assertEqual(projection_for(None), "full")
+        self.assertEqual(projection_for("summary"), "summary")
+        self.assertEqual(projection_for(["name", "Price"]), "summary")
+        self.assertEqual(projection_for(["description"]), "full")
+        self.assertEqual(requested_columns(["price", "name"]), ("ProductId", "Name", "Price"))
+        with self.assertRaises(ValueError):
+            requested_columns(["Name; DROP TABLE Products"])
+
+
+class TestSummaryProjection(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.system = create_local_system(os.path.join(self.tmp.name, "data"))
+        self.ids = [self.system.add_product(f"Item {i}", "x" * 10000, 10.0 + i) for i in range(3)]
+        self.db = self.system.db_manager
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_summary_listing_leaves_out_description_until_accessed(self):
+        with patch.object(self.db, "get_product", wraps=self.db.get_product) as get_product:
+            products = self.system.list_products(10, fields="summary")
+            self.assertEqual([p.product_id for p in products], self.ids[::-1])
+            self.assertIsInstance(products[0], LazyProduct)
+            self.assertNotIn("description", products[0].__dict__)
+            self.assertEqual(products[0].price, 12.0)
+            get_product.assert_not_called()
+
+            self.assertEqual(products[0].description, "x" * 10000)
+            self.assertEqual(products[0].description, "x" * 10000)
+        get_product.assert_called_once_with(self.ids[2])
+        self.assertIn("products.list_summary", self.db.statement_stats())
+
+    def test_lazy_loads_go_through_the_read_bulkhead_and_are_counted(self):
+        products = self.system.get_products(self.ids, fields="summary")
+        admitted = self.system.bulkhead_stats()["sql_read"]["admitted"]
+        loads = LazyProduct.lazy_loads()
+        with self.assertLogs("app", level="DEBUG") as logs:
+            self.assertEqual(products[1].description, "x" * 10000)
+        self.assertEqual(self.system.bulkhead_stats()["sql_read"]["admitted"], admitted + 1)
+        self.assertEqual(LazyProduct.lazy_loads(), loads + 1)
+        self.assertIn(f"product {self.ids[1]}", logs.output[0])
+
+    def test_multi_get_with_fields(self):
+        products = self.system.get_products([self.ids[1], self.ids[0]], fields=["name", "price"])
+        self.assertEqual([p.name for p in products], ["Item 1", "Item 0"])
+        self.assertIn("products.get_many_summary.8", self.db.statement_stats())
+
+    def test_dict_listing_returns_only_requested_fields(self):
+        with patch.object(self.db, "get_product", side_effect=AssertionError("lazy load")):
+            rows = self.system.list_products_dict(10, fields=["Name", "Price"])
+        self.assertEqual(rows[0], {"ProductId": self.ids[2], "Name": "Item 2", "Price": 12.0})
+        self.assertEqual(set(self.system.list_products_dict(1)[0]),
+                         {"ProductId", "Name", "Description", "Price", "ImageUrl", "ImageVariants", "CreatedAt"})
+
+    def test_product_deleted_before_lazy_load(self):
+        product = self.system.list_products(1, fields="summary")[0]
+        self.db.delete_product(product.product_id)
+        self.assertEqual(product.description, "")
+        self.assertEqual(product.name, "Item 2")
+
+    def test_summary_listing_is_served_from_covering_index(self):
+        conn = sqlite3.connect(self.db.connection_string)
+        try:
+            plan = conn.execute("EXPLAIN QUERY PLAN " + SQLITE_STATEMENTS["products.list_summary"].sql,
+                                (10,)).fetchall()
+        finally:
+            conn.close()
+        self.assertIn("COVERING INDEX IX_Products_Listing", " ".join(row[-1] for row in plan))
+
+
+class TestLazyProduct(unittest.TestCase):
+
+    def test_loaded_fields_do_not_trigger_loader(self):
+        def loader(product_id):
+            raise AssertionError("should not load")
+        product = LazyProduct.partial(loader, product_id=1, name="Laptop", price=5.0)
+        self.assertEqual((product.name, product.price), ("Laptop", 5.0))
+        self.assertEqual(repr(product), "LazyProduct(product_id=1, name='Laptop', price=5.0)")
+
+    def test_missing_fields_load_once(self):
+        calls = []
+
+        def loader(product_id):
+            calls.append(product_id)
+            return Product(product_id=product_id, name="Full", description="Long", price=9.0)
+        product = LazyProduct.partial(loader, product_id=7, name="Listed")
+        self.assertEqual((product.description, product.image_url, product.name), ("Long", "", "Listed"))
+        self.assertEqual(calls, [7])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import json
+import sqlite3
+import threading
+import unittest
+
+from connection_pool import ConnectionPool
+from query_tracer import QueryTracer, describe_param
+from sql_statements import Statement
+
+CREATE = Statement("test.create", "CREATE TABLE t (id INTEGER, name TEXT)")
+INSERT = Statement("test.insert", "INSERT INTO t VALUES (?, ?)")
+SELECT = Statement("test.select", "SELECT id, name FROM t WHERE id >= ?")
+BROKEN = Statement("test.broken", "SELECT * FROM missing_table")
+
+
+class TestQueryTracer(unittest.TestCase):
+
+    def setUp(self):
+        self.tracer = QueryTracer(slow_threshold_ms=0)
+        raw = sqlite3.connect(":memory:", check_same_thread=False)
+        self.pool = ConnectionPool(lambda: raw, max_size=1, tracer=self.tracer)
+        with self.pool.connection() as conn:
+            conn.execute(CREATE)
+            conn.execute(INSERT, (1, "secret-name"))
+            conn.execute(INSERT, (2, "other"))
+
+    def test_describe_param_hides_values(self):
+        self.assertEqual(describe_param("secret"), "str(6)")
+        self.assertEqual(describe_param(b"abc"), "bytes(3)")
+        self.assertEqual(describe_param(12), "int")
+        self.assertEqual(describe_param(None), "NoneType")
+
+    def test_records_shape_rows_and_timings(self):
+        with self.assertLogs("slow_query", level="WARNING") as logs:
+            with self.pool.connection() as conn:
+                rows = conn.execute(SELECT, (1,)).fetchall()
+        self.assertEqual(len(rows), 2)
+
+        record = json.loads(logs.output[-1].split(":", 2)[2])
+        self.assertEqual(record["statement_id"], "test.select")
+        self.assertEqual(record["param_shapes"], ["int"])
+        self.assertEqual(record["rows_fetched"], 2)
+        self.assertGreaterEqual(record["fetch_ms"], 0)
+        self.assertNotIn("secret-name", json.dumps(self.tracer.recent_slow()))
+
+    def test_fast_queries_are_not_logged(self):
+        self.tracer.slow_threshold_ms = 10_000
+        before = len(self.tracer.recent_slow())
+        with self.pool.connection() as conn:
+            conn.execute(SELECT, (1,)).fetchall()
+        self.assertEqual(len(self.tracer.recent_slow()), before)
+        self.assertGreater(self.tracer.traced, 0)
+
+    def test_failed_statement_is_traced_with_error(self):
+        with self.assertRaises(sqlite3.OperationalError):
+            with self.pool.connection() as conn:
+                conn.execute(BROKEN)
+        self.assertEqual(self.tracer.recent_slow()[-1]["error"], "OperationalError")
+
+    def test_rowcount_is_recorded_per_execution(self):
+        update = Statement("test.update", "UPDATE t SET name = ? WHERE id >= ?")
+        with self.pool.connection() as conn:
+            conn.execute(update, ("a", 1))
+            conn.execute(update, ("b", 2))
+        self.assertEqual([record["rowcount"] for record in self.tracer.recent_slow()[-2:]], [2, 1])
+
+    def test_plan_is_sampled_for_slow_queries_off_the_request_thread(self):
+        tracer = QueryTracer(slow_threshold_ms=0, plan_sample_rate=1.0)
+        captured = []
+
+        def capture(statement, params):
+            captured.append((statement.statement_id, tuple(params), threading.current_thread()))
+            return "<ShowPlanXML/>"
+
+        raw = sqlite3.connect(":memory:", check_same_thread=False)
+        pool = ConnectionPool(lambda: raw, tracer=tracer, plan_capturer=capture)
+        with pool.connection() as conn:
+            conn.execute(Statement("test.one", "SELECT ?"), (7,)).fetchone()
+        tracer.close()
+
+        self.assertEqual([c[:2] for c in captured], [("test.one", (7,))])
+        self.assertIsNot(captured[0][2], threading.current_thread())
+        self.assertEqual(tracer.recent_slow()[-1]["plan"], "<ShowPlanXML/>")
+
+
+if __name__ == '__main__':
+    unittest.main()
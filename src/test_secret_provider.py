@@ -0,0 +1,114 @@
+import os
+import time
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from cryptography.fernet import Fernet
+
+from secret_provider import SecretProvider
+
+
+class TestSecretProvider(unittest.TestCase):
+
+    def test_get_fetches_once_then_serves_from_cache(self):
+        source = MagicMock(return_value="Server=one")
+        provider = SecretProvider(sources=[source])
+
+        self.assertEqual(provider.get("SQL_CONNECTION_STRING"), "Server=one")
+        self.assertEqual(provider.get("SQL_CONNECTION_STRING"), "Server=one")
+        source.assert_called_once_with("SQL_CONNECTION_STRING")
+
+    def test_falls_back_to_next_source(self):
+        failing = MagicMock(side_effect=Exception("vault unavailable"))
+        provider = SecretProvider(sources=[failing, lambda name: "from-env"])
+
+        self.assertEqual(provider.get("BLOB_CONNECTION_STRING"), "from-env")
+
+    def test_missing_secret_returns_none(self):
+        provider = SecretProvider(sources=[lambda name: None])
+        self.assertIsNone(provider.get("SQL_CONNECTION_STRING"))
+
+    def test_expired_entry_is_served_stale_without_blocking(self):
+        source = MagicMock(return_value="Server=one")
+        provider = SecretProvider(sources=[source], ttl_seconds=10)
+        provider.get("SQL_CONNECTION_STRING")
+        provider._cache["SQL_CONNECTION_STRING"].fetched_at = time.time() - 60
+
+        source.return_value = "Server=two"
+        self.assertEqual(provider.get("SQL_CONNECTION_STRING"), "Server=one")
+        self.assertEqual(source.call_count, 1)
+
+    def test_refresh_notifies_subscribers_on_change(self):
+        source = MagicMock(return_value="Server=one")
+        provider = SecretProvider(sources=[source])
+        callback = MagicMock()
+        provider.get("SQL_CONNECTION_STRING")
+        provider.subscribe("SQL_CONNECTION_STRING", callback)
+
+        self.assertFalse(provider.refresh("SQL_CONNECTION_STRING"))
+        callback.assert_not_called()
+
+        source.return_value = "Server=two"
+        self.assertTrue(provider.refresh("SQL_CONNECTION_STRING"))
+        callback.assert_called_once_with("Server=two")
+        self.assertEqual(provider.get("SQL_CONNECTION_STRING"), "Server=two")
+
+    def test_background_thread_refreshes_due_entries(self):
+        source = MagicMock(return_value="Server=one")
+        provider = SecretProvider(sources=[source], ttl_seconds=1, refresh_ahead=0.5)
+        callback = MagicMock()
+        provider.get("SQL_CONNECTION_STRING")
+        provider.subscribe("SQL_CONNECTION_STRING", callback)
+        source.return_value = "Server=two"
+
+        provider.start()
+        try:
+            deadline = time.time() + 5
+            while not callback.called and time.time() < deadline:
+                time.sleep(0.05)
+        finally:
+            provider.close()
+        callback.assert_called_with("Server=two")
+
+    def test_encrypted_disk_cache_survives_restart(self):
+        key = Fernet.generate_key().decode()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "secrets.bin")
+            SecretProvider(sources=[lambda name: "Server=one"], disk_cache_path=path,
+                           disk_cache_key=key).get("SQL_CONNECTION_STRING")
+
+            with open(path, 'rb') as f:
+                self.assertNotIn(b"Server=one", f.read())
+
+            source = MagicMock(return_value="Server=two")
+            provider = SecretProvider(sources=[source], disk_cache_path=path, disk_cache_key=key)
+            self.assertEqual(provider.get("SQL_CONNECTION_STRING"), "Server=one")
+            source.assert_not_called()
+
+    def test_concurrent_disk_cache_writers_use_their_own_temp_files(self):
+        key = Fernet.generate_key().decode()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "secrets.bin")
+            providers = [SecretProvider(sources=[lambda name, i=i: f"Server={i}"], disk_cache_path=path,
+                                        disk_cache_key=key) for i in range(2)]
+            temp_files = []
+            replace = os.replace
+
+            def replace_after_both_wrote(src, dst):
+                temp_files.append(src)
+                if len(temp_files) == 1:
+                    # The second process writes while the first has not renamed its file yet
+                    providers[1].get("SQL_CONNECTION_STRING")
+                replace(src, dst)
+
+            with patch("secret_provider.os.replace", replace_after_both_wrote):
+                providers[0].get("SQL_CONNECTION_STRING")
+            self.assertEqual(len(set(temp_files)), 2)
+            self.assertEqual(os.listdir(tmp), ["secrets.bin"])
+            reader = SecretProvider(sources=[MagicMock(return_value=None)], disk_cache_path=path, disk_cache_key=key)
+            self.assertEqual(reader.get("SQL_CONNECTION_STRING"), "Server=0")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import tempfile
+import threading
+import unittest
+
+from app import Product, ShardedDatabaseManager
+from local_backends import LocalDatabaseManager
+from secret_provider import SecretProvider
+from shard_map import ShardMap, ShardConfig, ShardMapWatcher
+
+
+def local_factory(shard, shard_map):
+    return LocalDatabaseManager(shard.connection_string,
+                                identity_seed=shard_map.identity_seed(shard.name),
+                                identity_increment=shard_map.stride)
+
+
+class TestShardMap(unittest.TestCase):
+
+    def test_routes_by_slot(self):
+        shard_map = ShardMap(stride=4, shards=[ShardConfig("a", "db-a", 0), ShardConfig("b", "db-b", 1)])
+        self.assertEqual(shard_map.shard_for_id(8), "a")
+        self.assertEqual(shard_map.shard_for_id(9), "b")
+        self.assertEqual(shard_map.identity_seed("a"), 4)
+        self.assertEqual(shard_map.identity_seed("b"), 1)
+        with self.assertRaises(KeyError):
+            shard_map.shard_for_id(10)
+
+    def test_route_overrides_home_slot(self):
+        shard_map = ShardMap.from_dict({
+            "stride": 4,
+            "shards": [{"name": "a", "connection_string": "db-a", "slot": 0, "writable": False},
+                       {"name": "b", "connection_string": "db-b", "slot": 1}],
+            "routes": {"0": "b"}
+        })
+        self.assertEqual(shard_map.shard_for_id(4), "b")
+        self.assertEqual(shard_map.writable_shards(), ["b"])
+
+    def test_shards_can_name_a_connection_secret(self):
+        shard_map = ShardMap.from_dict({
+            "stride": 2,
+            "shards": [{"name": "a", "connection_secret": "SHARD_A_CONNECTION_STRING", "slot": 0}]
+        })
+        self.assertEqual(shard_map.shards["a"].connection_secret, "SHARD_A_CONNECTION_STRING")
+        with self.assertRaises(ValueError):
+            ShardMap.from_dict({"stride": 2, "shards": [{"name": "a", "slot": 0}]})
+
+    def test_invalid_maps_are_rejected(self):
+        with self.assertRaises(ValueError):
+            ShardMap(stride=2, shards=[ShardConfig("a", "db", 2)])
+        with self.assertRaises(ValueError):
+            ShardMap(stride=2, shards=[ShardConfig("a", "db", 0), ShardConfig("b", "db", 0)])
+        with self.assertRaises(ValueError):
+            ShardMap(stride=2, shards=[ShardConfig("a", "db", 0)], routes={1: "missing"})
+
+    def test_watcher_reloads_and_ignores_bad_edits(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "shards.json")
+            config = {"stride": 2, "shards": [{"name": "a", "connection_string": "db", "slot": 0}]}
+            with open(path, 'w') as f:
+                json.dump(config, f)
+            watcher = ShardMapWatcher(path, check_interval=0)
+            self.assertEqual(list(watcher.current().shards), ["a"])
+
+            config["shards"].append({"name": "b", "connection_string": "db2", "slot": 1})
+            with open(path, 'w') as f:
+                json.dump(config, f)
+            os.utime(path, (time.time() + 5, time.time() + 5))
+            self.assertEqual(sorted(watcher.current().shards), ["a", "b"])
+
+            with open(path, 'w') as f:
+                f.write("{not json")
+            os.utime(path, (time.time() + 10, time.time() + 10))
+            self.assertEqual(sorted(watcher.current().shards), ["a", "b"])
+
+
+class TestShardedDatabaseManager(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.shard_map = ShardMap(stride=8, shards=[
+            ShardConfig(name, os.path.join(self.tmp.name, f"{name}.db"), slot)
+            for slot, name in enumerate(["s0", "s1", "s2"])
+        ])
+        self.db = ShardedDatabaseManager(self.shard_map, manager_factory=local_factory)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def add(self, name, price=1.0):
+        return self.db.add_product(Product(name=name, description="d", price=price))
+
+    def test_ids_encode_their_shard(self):
+        ids = [self.add(f"p{i}") for i in range(6)]
+        self.assertEqual(len(set(ids)), 6)
+        self.assertEqual(sorted({product_id % 8 for product_id in ids}), [0, 1, 2])
+        for product_id in ids:
+            shard = self.shard_map.shard_for_id(product_id)
+            self.assertIsNotNone(self.db._managers[shard].get_product(product_id))
+
+    def test_ids_of_deleted_products_are_never_reused(self):
+        manager = self.db.manager_for_id(8)
+        first = manager.add_product(Product(name="a", price=1.0))
+        newest = manager.add_product(Product(name="b", price=1.0))
+        self.assertTrue(manager.delete_product(newest))
+        self.assertEqual(manager.add_product(Product(name="c", price=1.0)), newest + 8)
+
+        # The counter survives a restart of the manager
+        reopened = local_factory(self.shard_map.shards["s0"], self.shard_map)
+        self.assertTrue(reopened.delete_product(newest + 8))
+        self.assertEqual(reopened.add_product(Product(name="d", price=1.0)), newest + 16)
+        self.assertEqual(first % 8, 0)
+
+    def test_crud_routes_to_owning_shard(self):
+        product_id = self.add("laptop", 10.0)
+        product = self.db.get_product(product_id)
+        self.assertEqual(product.name, "laptop")
+
+        product.price = 12.5
+        self.assertTrue(self.db.update_product(product))
+        self.assertEqual(self.db.get_product(product_id).price, 12.5)
+        self.assertTrue(self.db.delete_product(product_id))
+        self.assertIsNone(self.db.get_product(product_id))
+
+    def test_list_products_merges_newest_first(self):
+        ids = []
+        for i in range(7):
+            ids.append(self.add(f"p{i}"))
+            time.sleep(0.002)
+        listed = self.db.list_products(limit=5)
+        self.assertEqual([p.product_id for p in listed], list(reversed(ids))[:5])
+
+    def test_get_products_preserves_request_order(self):
+        ids = [self.add(f"p{i}") for i in range(5)]
+        wanted = [ids[3], 999, ids[0], ids[4]]
+        self.assertEqual([p.product_id for p in self.db.get_products(wanted)], [ids[3], ids[0], ids[4]])
+
+    def test_read_only_shard_receives_no_inserts(self):
+        shards = list(self.shard_map.shards.values())
+        self.db.reload_shard_map(ShardMap(stride=8, shards=[
+            ShardConfig(s.name, s.connection_string, s.slot, writable=(s.name != "s0")) for s in shards
+        ]))
+        ids = [self.add(f"p{i}") for i in range(4)]
+        self.assertNotIn(0, {product_id % 8 for product_id in ids})
+
+    def test_import_batch_commits_on_one_shard(self):
+        products = [Product(name=f"p{i}", price=1.0) for i in range(6)]
+        keys = [f"run-1:{i}" for i in range(6)]
+        results = self.db.import_products(products, keys)
+        self.assertTrue(all(inserted for _, inserted in results))
+        self.assertEqual(len({product_id % 8 for product_id, _ in results}), 1)
+        self.assertEqual(self.db.import_products(products, keys), [(product_id, False) for product_id, _ in results])
+        with self.assertRaises(ValueError):
+            self.db.import_products(products[:2], ["run-1:7", "run-2:7"])
+
+    def test_connection_strings_come_from_secrets_and_rotate(self):
+        values = {name: os.path.join(self.tmp.name, f"{name}-v1.db") for name in ("SHARD_0", "SHARD_1")}
+        secrets = SecretProvider(sources=[values.get])
+        db = ShardedDatabaseManager(ShardMap(stride=2, shards=[
+            ShardConfig("s0", "", 0, connection_secret="SHARD_0"),
+            ShardConfig("s1", "", 1, connection_secret="SHARD_1"),
+        ]), manager_factory=local_factory, secrets=secrets)
+        self.assertEqual(db.manager_for_id(1).connection_string, values["SHARD_1"])
+
+        values["SHARD_1"] = os.path.join(self.tmp.name, "SHARD_1-v2.db")
+        self.assertTrue(secrets.refresh("SHARD_1"))
+        self.assertEqual(db.manager_for_id(1).connection_string, values["SHARD_1"])
+        self.assertEqual(db.manager_for_id(2).connection_string, values["SHARD_0"])
+
+        with self.assertRaises(ValueError):
+            ShardedDatabaseManager(ShardMap(stride=2, shards=[ShardConfig("s0", "", 0, connection_secret="MISSING")]),
+                                   manager_factory=local_factory, secrets=secrets)
+
+    def test_shard_that_fails_to_start_does_not_take_routing_down(self):
+        path = os.path.join(self.tmp.name, "shards.json")
+        config = {"stride": 2, "shards": [{"name": "a", "connection_string": os.path.join(self.tmp.name, "a.db"),
+                                           "slot": 0}]}
+        with open(path, 'w') as f:
+            json.dump(config, f)
+
+        def factory(shard, shard_map):
+            if shard.name == "b":
+                raise ConnectionError("shard b is unreachable")
+            return local_factory(shard, shard_map)
+
+        db = ShardedDatabaseManager(path, manager_factory=factory, check_interval=0)
+        product_id = db.add_product(Product(name="laptop", price=1.0))
+        config["shards"].append({"name": "b", "connection_string": "unreachable", "slot": 1})
+        with open(path, 'w') as f:
+            json.dump(config, f)
+        os.utime(path, (time.time() + 5, time.time() + 5))
+
+        with self.assertLogs("app", level="ERROR") as logs:
+            for _ in range(3):
+                self.assertEqual(db.get_product(product_id).name, "laptop")
+            for thread in threading.enumerate():
+                if thread.name == "shard-map-reload":
+                    thread.join(5)
+        self.assertIn("shard b is unreachable", logs.output[0])
+        self.assertEqual(list(db.shard_map.shards), ["a"])
+        self.assertEqual(db.get_product(product_id).name, "laptop")
+
+    def test_routing_stays_consistent_during_reloads(self):
+        removed = self.db.manager_for_id(2)
+        closing, resume = threading.Event(), threading.Event()
+        close_pool = removed.pool.close
+
+        def slow_close():
+            closing.set()
+            resume.wait(5)
+            close_pool()
+
+        removed.pool.close = slow_close
+        reload = threading.Thread(target=self.db.reload_shard_map,
+                                  args=(ShardMap(stride=8, shards=list(self.shard_map.shards.values())[:2]),))
+        reload.start()
+        try:
+            self.assertTrue(closing.wait(5))
+            # Mid-reload, slot 2 is either still routed to its manager or not routed at all
+            self.assertIsNone(self.db.manager_for_id(2))
+        finally:
+            resume.set()
+            reload.join()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import os
+import json
+import tempfile
+import unittest
+import multiprocessing
+
+from local_backends import create_local_system
+from shared_cache import SharedCache
+
+
+def write_from_child(path, key, value):
+    cache = SharedCache(path, max_bytes=64 * 1024, slot_count=256, stripe_count=64)
+    cache.put(key, value, cache.version(key))
+    cache.invalidate("other")
+    cache.close()
+
+
+class TestSharedCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cache")
+        self.cache = SharedCache(self.path, max_bytes=64 * 1024, slot_count=256, stripe_count=64)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def test_put_get_and_invalidate(self):
+        self.assertIsNone(self.cache.get("product:1"))
+        self.assertTrue(self.cache.put("product:1", b'{"a": 1}', self.cache.version("product:1")))
+        self.assertEqual(self.cache.get("product:1"), b'{"a": 1}')
+        self.cache.invalidate("product:1")
+        self.assertIsNone(self.cache.get("product:1"))
+
+    def test_put_is_dropped_after_concurrent_invalidation(self):
+        version = self.cache.version("products:list")
+        self.cache.invalidate("products:list")
+        self.assertFalse(self.cache.put("products:list:50", b"[]", version, "products:list"))
+        self.assertIsNone(self.cache.get("products:list:50"))
+
+    def test_shared_version_key_invalidates_all_pages(self):
+        for limit in (10, 50):
+            self.cache.put(f"list:{limit}", b"[]", self.cache.version("list"), "list")
+        self.cache.invalidate("list")
+        self.assertIsNone(self.cache.get("list:10"))
+        self.assertIsNone(self.cache.get("list:50"))
+
+    def test_expired_entries_are_misses(self):
+        self.cache.put("k", b"v", self.cache.version("k"), ttl=-1)
+        self.assertIsNone(self.cache.get("k"))
+
+    def test_eviction_keeps_memory_bounded(self):
+        value = b"x" * 1000
+        for i in range(500):
+            self.assertTrue(self.cache.put(f"product:{i}", value, self.cache.version(f"product:{i}")))
+        self.assertLessEqual(self.cache.stats()["used_bytes"], self.cache.arena_size)
+        self.assertEqual(os.path.getsize(self.path),
+                         self.cache._arena_offset + self.cache.arena_size)
+        self.assertIsNone(self.cache.get("product:0"))
+        self.assertEqual(self.cache.get("product:499"), value)
+        hits = sum(self.cache.get(f"product:{i}") == value for i in range(500))
+        self.assertGreater(hits, 30)
+        self.assertLessEqual(hits, 64)
+
+    def test_values_written_by_another_process_are_visible(self):
+        process = multiprocessing.get_context("spawn").Process(
+            target=write_from_child, args=(self.path, "product:7", b"from child"))
+        process.start()
+        process.join(30)
+        self.assertEqual(process.exitcode, 0)
+        self.assertEqual(self.cache.get("product:7"), b"from child")
+        self.assertEqual(self.cache.version("other"), 1)
+
+    def test_reopen_keeps_existing_geometry_and_data(self):
+        self.cache.put("k", b"v", self.cache.version("k"))
+        reopened = SharedCache(self.path, max_bytes=1024 * 1024)
+        try:
+            self.assertEqual(reopened.arena_size, 64 * 1024)
+            self.assertEqual(reopened.get("k"), b"v")
+        finally:
+            reopened.close()
+
+
+class TestProductCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.system = create_local_system(os.path.join(self.tmp.name, "data"))
+        self.system.enable_product_cache(os.path.join(self.tmp.name, "cache"), max_bytes=1024 * 1024)
+        self.product_id = self.system.add_product("Laptop", "Fast", 1299.99)
+
+    def tearDown(self):
+        self.system.product_cache.close()
+        self.tmp.cleanup()
+
+    def test_product_page_is_served_from_cache_until_updated(self):
+        first = self.system.get_product_json(self.product_id)
+        self.assertEqual(json.loads(first)["Name"], "Laptop")
+        self.assertEqual(self.system.get_product_json(self.product_id), first)
+        self.assertEqual(self.system.product_cache.hits, 1)
+
+        product = self.system.get_product(self.product_id)
+        product.price = 999.0
+        self.system.update_product(product)
+        self.assertEqual(self.system.get_product_dict(self.product_id)["Price"], 999.0)
+        self.assertEqual(self.system.list_products_dict()[0]["Price"], 999.0)
+
+    def test_listing_is_invalidated_by_add_and_delete(self):
+        self.assertEqual(len(self.system.list_products_dict()), 1)
+        other = self.system.add_product("Phone", "", 799.0)
+        self.assertEqual(len(self.system.list_products_dict()), 2)
+        self.system.delete_product(other)
+        self.assertEqual([p["Name"] for p in self.system.list_products_dict()], ["Laptop"])
+        self.assertIsNone(self.system.get_product_dict(other))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -105,7 +105,7 @@ class TestDatabaseManager(unittest.TestCase):
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
         mock_conn.cursor.return_value = mock_cursor
-        mock_connect.return_value.__enter__.return_value = mock_conn
+        mock_connect.return_value = mock_conn
         
         connection_string = "test-connection-string"
         db_manager = DatabaseManager(connection_string)
@@ -122,7 +122,7 @@ class TestDatabaseManager(unittest.TestCase):
         mock_cursor = MagicMock()
         mock_cursor.fetchone.return_value = [123]  # Mock product ID
         mock_conn.cursor.return_value = mock_cursor
-        mock_connect.return_value.__enter__.return_value = mock_conn
+        mock_connect.return_value = mock_conn
         
         db_manager = DatabaseManager("test-connection-string")
         product = Product(name="Test Product", description="Test", price=99.99)
@@ -143,7 +143,7 @@ class TestDatabaseManager(unittest.TestCase):
             "https://example.com/image.jpg", datetime.now()
         ]
         mock_conn.cursor.return_value = mock_cursor
-        mock_connect.return_value.__enter__.return_value = mock_conn
+        mock_connect.return_value = mock_conn
         
         db_manager = DatabaseManager("test-connection-string")
         product = db_manager.get_product(1)
@@ -160,7 +160,7 @@ class TestDatabaseManager(unittest.TestCase):
         mock_cursor = MagicMock()
         mock_cursor.fetchone.return_value = None
         mock_conn.cursor.return_value = mock_cursor
-        mock_connect.return_value.__enter__.return_value = mock_conn
+        mock_connect.return_value = mock_conn
         
         db_manager = DatabaseManager("test-connection-string")
         product = db_manager.get_product(999)
@@ -177,7 +177,7 @@ class TestDatabaseManager(unittest.TestCase):
             [2, "Product 2", "Description 2", 149.99, "url2", datetime.now()]
         ]
         mock_conn.cursor.return_value = mock_cursor
-        mock_connect.return_value.__enter__.return_value = mock_conn
+        mock_connect.return_value = mock_conn
         
         db_manager = DatabaseManager("test-connection-string")
         products = db_manager.list_products()
@@ -193,7 +193,7 @@ class TestDatabaseManager(unittest.TestCase):
         mock_cursor = MagicMock()
         mock_cursor.rowcount = 1  # One row affected
         mock_conn.cursor.return_value = mock_cursor
-        mock_connect.return_value.__enter__.return_value = mock_conn
+        mock_connect.return_value = mock_conn
         
         db_manager = DatabaseManager("test-connection-string")
         product = Product(
@@ -214,7 +214,7 @@ class TestDatabaseManager(unittest.TestCase):
         mock_cursor = MagicMock()
         mock_cursor.rowcount = 1  # One row affected
         mock_conn.cursor.return_value = mock_cursor
-        mock_connect.return_value.__enter__.return_value = mock_conn
+        mock_connect.return_value = mock_conn
         
         db_manager = DatabaseManager("test-connection-string")
         result = db_manager.delete_product(1)
@@ -397,7 +397,7 @@ class TestIntegration(unittest.TestCase):
         mock_cursor.fetchone.return_value = [1]  # Product ID for add
         mock_cursor.rowcount = 1  # For update/delete operations
         mock_conn.cursor.return_value = mock_cursor
-        mock_db_connect.return_value.__enter__.return_value = mock_conn
+        mock_db_connect.return_value = mock_conn
         
         # Mock blob storage
         mock_container_client = MagicMock()